@@ -1,110 +1,686 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import pandas as pd
 import joblib
+import json
 import os
+import time
 import numpy as np
-import requests
 from utils.gtfs_loader import GTFSLoader
+from utils.features import build_model_input
+from utils.prediction_cache import PredictionCache, parse_quantize
+from utils.delay_propagation import propagate_feed
+from utils.model_manager import ModelManager
+from utils.ors_client import ORSClient, ORSError
+from utils.delay_stats import DIMENSIONS, StatsStore
+from utils.heatmap import HeatmapStore
+from utils.payloads import Listing, dumps
+from utils.metrics import CONTENT_TYPE, REGISTRY, current_endpoint, observe_request, phase
+from utils.profiler import SlowRequestProfiler
+from utils.observation_store import ObservationStore
+from utils.live_delays import LiveDelays
+from utils.realtime import (DEFAULT_CITY, Ingestor, RouteNames, observations_from_json, trip_updates_from_json,
+                            trip_updates_from_pb)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() that records its encoding time as the json_serialize phase"""
+
+    def dumps(self, obj, **kwargs):
+        with phase('json_serialize'):
+            return super().dumps(obj, **kwargs)
+
 
 app = Flask(__name__)
-CORS(app)
+app.json = TimedJSONProvider(app)
+# Let browsers read the paging headers of /api/routes and /api/stops
+CORS(app, expose_headers=['ETag', 'X-Total-Count', 'X-Next-Offset'])
 
-loader = GTFSLoader(os.path.join(os.path.dirname(__file__), 'utils'))
+loader = GTFSLoader(os.path.join(os.path.dirname(__file__), 'utils'), warm_listings=True)
 
 MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/models/delay_predictor.pkl')
-model = None
+# Route vocabulary written by train.py next to the model
+VOCAB_PATH = os.path.join(os.path.dirname(MODEL_PATH), 'route_vocab.json')
+
+# Upper bound on rows per /api/predict/batch request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 10000))
+
+# Repeated requests are answered from here; PREDICTION_CACHE_SIZE=0 disables it.
+# PREDICTION_CACHE_QUANTIZE buckets continuous inputs, e.g. "temperature_c=1,traffic_factor=0.05"
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PREDICTION_CACHE_TTL', 300)),
+    quantize=parse_quantize(os.environ.get('PREDICTION_CACHE_QUANTIZE', ''))
+)
+
+# Loads the model off the request path and hot-swaps new versions written by train.py.
+# MODEL_POLL_INTERVAL=0 loads once without watching for changes.
+model_manager = ModelManager(
+    MODEL_PATH, VOCAB_PATH,
+    # Cached outputs belong to the previous model
+    on_swap=lambda version: prediction_cache.invalidate(),
+    poll_interval=float(os.environ.get('MODEL_POLL_INTERVAL', 5))
+)
+
+# OpenRouteService directions, shared by all requests (pooled connections, cache, rate limit).
+# Note: You'll need to sign up at https://openrouteservice.org/ to get a free API key
+# ORS_BASE_URL can point at a local stub (benchmarks/ors_stub.py); ORS_CACHE_PATH persists the cache.
+ORS_SETTINGS = dict(
+    api_key=os.environ.get('ORS_API_KEY') or 'eyJvcmciOiI1YjNjZTM1OTc4NTExMTAwMDFjZjYyNDgiLCJpZCI6IjNhODM2NDM0YjI0YjQ1ZmFiNzFlMTdiZGQ0NjQxNTAyIiwiaCI6Im11cm11cjY0In0=',
+    base_url=os.environ.get('ORS_BASE_URL', 'https://api.openrouteservice.org'),
+    timeout=(float(os.environ.get('ORS_CONNECT_TIMEOUT', 3)), float(os.environ.get('ORS_TIMEOUT', 8))),
+    cache_size=int(os.environ.get('ORS_CACHE_SIZE', 1000)),
+    cache_ttl=float(os.environ.get('ORS_CACHE_TTL', 3600)),
+    cache_path=os.environ.get('ORS_CACHE_PATH') or None,
+    rate_per_minute=float(os.environ.get('ORS_RATE_PER_MINUTE', 40)),
+    max_wait=float(os.environ.get('ORS_MAX_WAIT', 2))
+)
+ors_client = ORSClient(**ORS_SETTINGS)
+
+# Delay statistics for /api/stats, materialized from the training CSV and kept up to
+# date with rows appended to it (checked at most every STATS_REFRESH_INTERVAL seconds)
+stats_store = StatsStore(
+    data_path=os.environ.get('STATS_DATA_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/raw/transit_data.csv'),
+    stats_path=os.environ.get('STATS_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/processed/delay_stats.npz'),
+    refresh_interval=float(os.environ.get('STATS_REFRESH_INTERVAL', 30))
+)
+
+# Multi-zoom delay heatmap written by utils/heatmap.py; reloaded when the file changes
+heatmap_store = HeatmapStore(
+    path=os.environ.get('HEATMAP_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/processed/delay_heatmap.json'),
+    check_interval=float(os.environ.get('STATS_REFRESH_INTERVAL', 30))
+)
+
+# PROFILE_SLOW_MS=<ms> samples the stacks of in-flight requests every PROFILE_INTERVAL_MS
+# and writes a collapsed-stack (flamegraph) file to PROFILE_DIR for each request slower than that
+profiler = SlowRequestProfiler(
+    threshold_ms=float(os.environ['PROFILE_SLOW_MS']),
+    interval_ms=float(os.environ.get('PROFILE_INTERVAL_MS', 5)),
+    output_dir=os.environ.get('PROFILE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/profiles')
+) if float(os.environ.get('PROFILE_SLOW_MS') or 0) > 0 else None
+
+# Realtime delay observations (POST /api/observations, or utils/realtime.py polling a GTFS-RT feed)
+# are appended to an hour-partitioned store under REALTIME_DIR. Every process tails the store
+# every REALTIME_REFRESH_INTERVAL seconds into rolling per-route/per-stop aggregates over
+# REALTIME_WINDOWS minutes, returned as `live` by /api/predict and by /api/live.
+observation_store = ObservationStore(
+    os.environ.get('REALTIME_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/realtime')
+)
+live_delays = LiveDelays(
+    observation_store,
+    windows=[int(w) for w in os.environ.get('REALTIME_WINDOWS', '15,60').split(',')],
+    max_keys=int(os.environ.get('REALTIME_MAX_KEYS', 50000)),
+    refresh_interval=float(os.environ.get('REALTIME_REFRESH_INTERVAL', 1))
+)
+route_names = RouteNames(loader)
+ingestor = Ingestor(
+    observation_store, route_names,
+    flush_rows=int(os.environ.get('REALTIME_FLUSH_ROWS', 10000)),
+    flush_interval=float(os.environ.get('REALTIME_FLUSH_INTERVAL', 1))
+)
+
+def start_background_threads():
+    """Model watcher, observation flusher and live aggregate refresher (per process: threads don't survive fork)"""
+    model_manager.start()
+    ingestor.start()
+    live_delays.start()
 
 def load_model():
-    global model
-    if os.path.exists(MODEL_PATH):
-        try:
-            model = joblib.load(MODEL_PATH)
-            print("Model loaded successfully.")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-    else:
+    """Synchronously (re)load the model artifact; returns True if a version went live"""
+    if not os.path.exists(MODEL_PATH):
         print(f"Model not found at {MODEL_PATH}")
+        return False
+    return model_manager.reload(force=True)
+
+# MODEL_PRELOAD=1 (set by gunicorn.conf.py): load the model now, in the master, so forked
+# workers share it. The background threads are then started per worker by the post_fork hook.
+if os.environ.get('MODEL_PRELOAD') == '1':
+    load_model()
+else:
+    start_background_threads()
+
+def model_unavailable():
+    if os.path.exists(MODEL_PATH):
+        return jsonify({'error': 'Model is loading, retry shortly'}), 503
+    return jsonify({'error': 'Model not trained yet'}), 503
+
+def predict_inputs(active, model_inputs):
+    """Predict feature dicts with one model version, answering repeats from prediction_cache; returns floats in input order"""
+    generation = prediction_cache.generation
+    model_inputs = [prediction_cache.canonicalize(m) for m in model_inputs]
+    keys = [prediction_cache.key(m, active.version) for m in model_inputs]
+    results = [prediction_cache.get(k) for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        with phase('model_predict'):
+            predictions = active.predict([model_inputs[i] for i in missing])
+        for i, prediction in zip(missing, predictions):
+            results[i] = float(prediction)
+            prediction_cache.put(keys[i], results[i], generation)
+    return results
+
+@app.before_request
+def start_request_metrics():
+    # Label by URL rule, not path, so /api/heatmap/<z>/<x>/<y> is one series
+    g.metrics_token = current_endpoint.set(request.url_rule.rule if request.url_rule else 'unmatched')
+    g.request_start = time.perf_counter()
+    if profiler is not None:
+        profiler.start()
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'request_start' not in g:
+        return
+    seconds = time.perf_counter() - g.request_start
+    endpoint = current_endpoint.get()
+    observe_request(endpoint, request.method, g.get('response_status', 500), seconds)
+    if profiler is not None:
+        profiler.finish(f'{request.method} {endpoint}', seconds * 1000)
+    current_endpoint.reset(g.metrics_token)
+
+def collect_service_metrics():
+    """Gauges and counters read from the model, caches and feeds at scrape time"""
+    model = model_manager.stats()
+    active = model['active']
+    yield 'model_loaded', 'gauge', 'Whether a model version is serving', {}, active is not None
+    if active is not None:
+        yield 'model_version', 'gauge', 'Version number of the serving model', {'source': active['source']}, active['version']
+        yield 'model_load_seconds', 'gauge', 'Time taken to load the serving model', {}, active['load_seconds']
+    vocab = model_manager.active.route_vocab if active is not None else None
+    if vocab is not None:
+        # Per model version: the counters restart when a new version is swapped in
+        vocab_stats = vocab.stats()
+        yield 'route_vocab_size', 'gauge', 'Routes known to the serving model', {}, vocab_stats['size']
+        yield 'route_lookups_total', 'counter', 'Route ids encoded for prediction', {}, vocab_stats['lookups']
+        yield 'route_unknown_total', 'counter', 'Route ids the serving model does not know', {}, vocab_stats['unknown']
+    yield 'model_loads_total', 'counter', 'Model versions loaded', {}, model['loads']
+    yield 'model_failed_loads_total', 'counter', 'Model loads that failed', {}, model['failed_loads']
+    prediction, ors = prediction_cache.stats(), ors_client.stats()
+    for cache_name, cache, size in (('prediction', prediction, prediction['size']), ('ors', ors, ors['cache_size'])):
+        labels = {'cache': cache_name}
+        yield 'cache_hits_total', 'counter', 'Cache lookups answered from the cache', labels, cache['hits']
+        yield 'cache_misses_total', 'counter', 'Cache lookups that missed', labels, cache['misses']
+        yield 'cache_entries', 'gauge', 'Entries currently cached', labels, size
+    yield 'cache_evictions_total', 'counter', 'Entries evicted to stay under max size', {'cache': 'prediction'}, prediction['evictions']
+    yield 'cache_expirations_total', 'counter', 'Entries dropped after their TTL', {'cache': 'prediction'}, prediction['expirations']
+    yield 'ors_upstream_calls_total', 'counter', 'Requests sent to OpenRouteService', {}, ors['upstream_calls']
+    yield 'ors_upstream_errors_total', 'counter', 'OpenRouteService requests that failed', {}, ors['upstream_errors']
+    yield 'ors_rate_limited_total', 'counter', 'Route lookups refused by the local rate limit', {}, ors['rate_limited']
+    yield 'ors_stale_served_total', 'counter', 'Expired cached routes served because ORS failed', {}, ors['stale_served']
+    yield 'gtfs_feeds_loaded', 'gauge', 'GTFS feeds resident in memory', {}, len(loader.feeds)
+    realtime, live = ingestor.stats(), live_delays.stats()
+    yield 'realtime_observations_accepted_total', 'counter', 'Realtime observations accepted for ingestion', {}, realtime['accepted']
+    yield 'realtime_observations_rejected_total', 'counter', 'Realtime observations rejected as invalid', {}, realtime['rejected']
+    yield 'realtime_observations_buffered', 'gauge', 'Accepted observations not yet flushed to the store', {}, realtime['buffered']
+    yield 'realtime_store_bytes_written_total', 'counter', 'Bytes of observation segments written', {}, realtime['bytes_written']
+    yield 'realtime_segments_read_total', 'counter', 'Observation segments folded into the live aggregates', {}, live['segments_read']
+    for level in ('routes', 'stops'):
+        labels = {'level': level}
+        yield 'realtime_live_keys', 'gauge', 'Keys with live delay aggregates', labels, live[level]['keys']
+        yield 'realtime_live_bytes', 'gauge', 'Memory held by the live delay aggregates', labels, live[level]['bytes']
+        yield 'realtime_dropped_total', 'counter', 'Observations outside the window or beyond max keys', labels, \
+            live[level]['dropped_late'] + live[level]['dropped_future'] + live[level]['dropped_full']
+    if profiler is not None:
+        yield 'slow_request_profiles_total', 'counter', 'Stack files written for slow requests', {}, profiler.written
+
+REGISTRY.add_collector(collect_service_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this process's request, phase, model and cache metrics"""
+    return REGISTRY.render(), 200, {'Content-Type': CONTENT_TYPE}
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy', 'model_loaded': model is not None})
+    active = model_manager.active
+    return jsonify({
+        'status': 'healthy',
+        'model_loaded': active is not None,
+        'model': model_manager.stats(),
+        'prediction_cache': prediction_cache.stats(),
+        'route_vocab': active.route_vocab.stats() if active is not None and active.route_vocab is not None else None,
+        'route_service': ors_client.stats()
+    })
+
+@app.route('/api/model/rollback', methods=['POST'])
+def rollback_model():
+    """Swap the previous model version back in. Disabled unless MODEL_ADMIN_TOKEN is set."""
+    token = os.environ.get('MODEL_ADMIN_TOKEN')
+    if not token or request.headers.get('X-Admin-Token') != token:
+        return jsonify({'error': 'Forbidden'}), 403
+    if not model_manager.rollback():
+        return jsonify({'error': 'No previous model version'}), 409
+    return jsonify(model_manager.stats())
+
+def predict_response(active, data):
+    """Body and status for /api/predict (shared with the ASGI app)"""
+    try:
+        with phase('feature_build'):
+            model_input = build_model_input(data, active.route_vocab, active.schedule)
+        prediction = predict_inputs(active, [model_input])[0]
+        body = {'delay_minutes': prediction}
+        # Recent observed delays ride along with the (cached) prediction; they aren't model inputs
+        live = live_features(data)
+        if live is not None:
+            body['live'] = live
+        return body, 200
+    except Exception as e:
+        return {'error': str(e)}, 400
+
+def live_features(data):
+    city = data.get('city') or DEFAULT_CITY
+    route_id, stop_id = data.get('route_id'), data.get('stop_id')
+    route = route_names.name(city, route_id) if route_id not in (None, '') else None
+    return live_delays.features(city, route, str(stop_id) if stop_id not in (None, '') else None)
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
-    if not model:
-        load_model()
-        if not model:
-            return jsonify({'error': 'Model not trained yet'}), 503
+    # One model version for the whole request, even if a new one is swapped in meanwhile
+    active = model_manager.active
+    if active is None:
+        return model_unavailable()
+    body, status = predict_response(active, request.json)
+    return jsonify(body), status
 
-    data = request.json
+def observations_response(body, content_type, city):
+    """Body and status for POST /api/observations: GTFS-RT protobuf or JSON, or plain JSON observations"""
     try:
-        # Extract only the features the model expects
-        # Convert route_id from text to a numeric hash (for demo purposes)
-        route_id_str = data.get('route_id', '')
-        route_id = hash(route_id_str) % 10000  # Simple hash to numeric
-        
-        # Calculate day_of_week from date if provided
-        if 'date' in data:
-            from datetime import datetime
-            date_obj = datetime.strptime(data['date'], '%Y-%m-%d')
-            days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            day_of_week = days[date_obj.weekday()]
+        if 'protobuf' in content_type or 'octet-stream' in content_type:
+            rows, errors = trip_updates_from_pb(body, city)
         else:
-            day_of_week = data.get('day_of_week', 'Monday')
-        
-        # Build model input with exact features expected
-        model_input = {
-            'route_id': route_id,
-            'day_of_week': day_of_week,
-            'weather_condition': data.get('weather_condition', 'Clear'),
-            'event_type': data.get('event_type', 'None'),
-            'temperature_c': float(data.get('temperature_c', 20)),
-            'precipitation_mm': float(data.get('precipitation_mm', 0)),
-            'event_attendance': int(data.get('event_attendance', 0)),
-            'traffic_factor': float(data.get('traffic_factor', 1.0))
-        }
-        
-        input_data = pd.DataFrame([model_input])
-        prediction = model.predict(input_data)
-        return jsonify({'delay_minutes': float(prediction[0])})
+            data = json.loads(body)
+            if isinstance(data, dict) and 'entity' in data:
+                rows, errors = trip_updates_from_json(data, city)
+            else:
+                items = data.get('observations') if isinstance(data, dict) else data
+                if not isinstance(items, list):
+                    return {'error': 'Expected a GTFS-Realtime FeedMessage, a list of observations or {"observations": [...]}'}, 400
+                rows, errors = observations_from_json(items, city)
     except Exception as e:
-        return jsonify({'error': str(e)}), 400
+        return {'error': f'Malformed feed: {e}'}, 400
+    accepted = ingestor.ingest(rows, rejected=len(errors))
+    result = {'accepted': accepted, 'rejected': len(rows['observed_at']) - accepted + len(errors)}
+    if errors:
+        result['errors'] = errors[:20]
+    return result, 202
+
+@app.route('/api/observations', methods=['POST'])
+def post_observations():
+    """Ingest realtime delay observations; they reach /api/live within the flush + refresh intervals"""
+    body, status = observations_response(request.get_data(), request.content_type or '',
+                                         request.args.get('city', DEFAULT_CITY))
+    return jsonify(body), status
+
+@app.route('/api/live', methods=['GET'])
+def get_live():
+    """Rolling observed delays for ?route_id= and/or ?stop_id= in ?city="""
+    data = request.args.to_dict()
+    if not data.get('route_id') and not data.get('stop_id'):
+        return jsonify({'error': 'route_id or stop_id is required'}), 400
+    return jsonify({'windows_minutes': list(live_delays.windows), 'live': live_features(data)})
+
+@app.route('/api/live/stats', methods=['GET'])
+def live_stats():
+    return jsonify({'ingest': ingestor.stats(), 'aggregates': live_delays.stats()})
+
+def predict_rows(active, payloads):
+    """
+    Predict a list of request payloads with a single vectorised model.predict call.
+    Returns one result per payload, in input order: either
+    {'index', 'delay_minutes'} or {'index', 'error'} for rows that could not be built.
+    """
+    results = [None] * len(payloads)
+    valid_rows = []
+    model_inputs = []
+    with phase('feature_build'):
+        for i, payload in enumerate(payloads):
+            try:
+                if not isinstance(payload, dict):
+                    raise ValueError('each input must be an object')
+                model_inputs.append(build_model_input(payload, active.route_vocab, active.schedule))
+                valid_rows.append(i)
+            except (ValueError, TypeError) as e:
+                results[i] = {'index': i, 'error': str(e)}
+
+    if model_inputs:
+        predictions = predict_inputs(active, model_inputs)
+        for i, prediction in zip(valid_rows, predictions):
+            results[i] = {'index': i, 'delay_minutes': prediction}
+    return results
+
+def expand_trip(trip):
+    """
+    Turn a whole-trip request into one payload per stop of the route/headsign's
+    representative trip. Trip-level fields apply to every stop; 'stop_conditions'
+    ({stop_id: {...}}) overrides them for individual stops.
+    """
+    city = trip.get('city', 'hyderabad')
+    # With a date, the stops come from a trip that actually runs that day; an empty one means no date
+    date = trip.get('date') or None
+    stops = loader.get_trip_stops(trip.get('route_id'), trip.get('headsign'), city, date)
+    base = {k: v for k, v in trip.items() if k not in ('headsign', 'stop_conditions', 'date')}
+    base['city'] = city
+    if date is not None:
+        base['date'] = date
+    stop_conditions = trip.get('stop_conditions') or {}
+    payloads = []
+    for stop in stops:
+        payload = dict(base)
+        payload.update(stop_conditions.get(str(stop['stop_id']), {}))
+        payloads.append(payload)
+    return stops, payloads
+
+def batch_response(active, data):
+    """
+    Body and status for /api/predict/batch (shared with the ASGI app). data is either
+      {"inputs": [{...}, ...]}  - same fields as /api/predict, one object per row
+      {"trip": {"city", "route_id", "headsign", "date", ..., "stop_conditions": {stop_id: {...}}}}
+    All rows are predicted in one model call; results keep input order and carry per-row errors.
+    """
+    if isinstance(data, list):
+        data = {'inputs': data}
+    if not isinstance(data, dict):
+        return {'error': 'Expected a JSON object with "inputs" or "trip"'}, 400
+
+    try:
+        if 'trip' in data:
+            trip = data['trip']
+            if not isinstance(trip, dict):
+                return {'error': '"trip" must be an object'}, 400
+            stops, payloads = expand_trip(trip)
+            if not stops:
+                on_date = f" running on {trip['date']}" if trip.get('date') else ''
+                return {'error': f'No stops found for this route and headsign{on_date}'}, 404
+            if len(payloads) > MAX_BATCH_SIZE:
+                return {'error': f'Batch too large (max {MAX_BATCH_SIZE} rows)'}, 413
+            results = predict_rows(active, payloads)
+            for stop, result in zip(stops, results):
+                result['stop_id'] = stop['stop_id']
+                result['stop_name'] = stop['stop_name']
+            return {
+                'route_id': trip.get('route_id'),
+                'headsign': trip.get('headsign'),
+                'predictions': results
+            }, 200
+
+        payloads = data.get('inputs')
+        if not isinstance(payloads, list):
+            return {'error': '"inputs" must be a list'}, 400
+        if len(payloads) > MAX_BATCH_SIZE:
+            return {'error': f'Batch too large (max {MAX_BATCH_SIZE} rows)'}, 413
+        results = predict_rows(active, payloads)
+        return {
+            'predictions': results,
+            'errors': sum(1 for r in results if 'error' in r)
+        }, 200
+    except Exception as e:
+        return {'error': str(e)}, 400
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Batch prediction; see batch_response for the accepted bodies"""
+    active = model_manager.active
+    if active is None:
+        return model_unavailable()
+    body, status = batch_response(active, request.get_json(silent=True))
+    return jsonify(body), status
+
+def propagation_response(active, data):
+    """
+    Body and status for /api/delays/propagate (shared with the ASGI app). data:
+      city, route_id (optional; whole city if missing), date (optional; only trips running that day),
+      origin_delay_minutes (optional; otherwise each route's origin delay is predicted from the
+      same condition fields as /api/predict), recovery_rate, min_dwell_seconds, format ("trips"|"columnar")
+    """
+    if not isinstance(data, dict):
+        return {'error': 'Expected a JSON object'}, 400
+    city = data.get('city', 'hyderabad')
+    route_id = data.get('route_id')
+    date = data.get('date') or None
+    feed = loader.get_feed(city)
+    if feed is None:
+        return {'error': f'Unknown city: {city}'}, 404
+
+    try:
+        if data.get('origin_delay_minutes') is not None:
+            route_delays = float(data['origin_delay_minutes'])
+        else:
+            if active is None:
+                return {'error': 'Model not loaded; pass origin_delay_minutes'}, 503
+            # One model call for all routes involved
+            route_ids = [str(route_id)] if route_id is not None else list(feed.route_trip_rows)
+            conditions = {k: v for k, v in data.items() if k not in ('route_id', 'origin_delay_minutes')}
+            conditions['city'] = city
+            with phase('feature_build'):
+                model_inputs = [build_model_input(dict(conditions, route_id=r), active.route_vocab, active.schedule)
+                                for r in route_ids]
+            route_delays = dict(zip(route_ids, (max(0.0, p) for p in predict_inputs(active, model_inputs))))
+
+        columnar = data.get('format') == 'columnar'
+        result = propagate_feed(
+            feed, route_delays, route_id=route_id, date=date,
+            recovery_rate=float(data.get('recovery_rate', 0.1)),
+            min_dwell=int(data.get('min_dwell_seconds', 20)),
+            columnar=columnar
+        )
+    except (ValueError, TypeError) as e:
+        return {'error': str(e)}, 400
+
+    body = {'city': city, 'route_id': route_id, 'date': date}
+    if columnar:
+        body.update(result)
+        body['trip_count'] = len(result['trip_id'])
+    else:
+        body['trips'] = result
+        body['trip_count'] = len(result)
+    return body, 200
+
+@app.route('/api/delays/propagate', methods=['POST'])
+def propagate_delays():
+    """Expected arrival delay at every stop of a route's or a whole city's trips"""
+    body, status = propagation_response(model_manager.active, request.get_json(silent=True))
+    return jsonify(body), status
+
+def listing_response(listing, args, headers):
+    """
+    (body bytes, status, headers) for a pre-serialized Listing (shared with the ASGI app):
+    format=records|columnar, optional offset/limit page, 304 on a matching If-None-Match,
+    gzip/br per Accept-Encoding.
+    """
+    try:
+        offset = query_number(args, 'offset', int) or 0
+        if offset < 0:
+            raise ValueError('offset must not be negative')
+        limit = query_number(args, 'limit', int, positive=True)
+        payload = listing.page(args.get('format', 'records'), offset, limit)
+    except ValueError as e:
+        return dumps({'error': str(e)}), 400, {'Content-Type': 'application/json'}
+    return payload.response(headers.get('If-None-Match'), headers.get('Accept-Encoding'),
+                            listing.page_headers(offset, limit))
 
 @app.route('/api/routes', methods=['GET'])
 def get_routes():
     city = request.args.get('city', 'hyderabad')
-    if loader.load_data(city):
-        return jsonify(loader.get_routes())
+    listing = loader.get_listing('routes', city)
+    if listing is not None:
+        return listing_response(listing, request.args, request.headers)
     return jsonify([]), 404
 
 @app.route('/api/trips', methods=['GET'])
 def get_trips():
     city = request.args.get('city', 'hyderabad')
     route_id = request.args.get('route_id')
-    if loader.load_data(city):
-        return jsonify(loader.get_trips(route_id))
+    # Optional YYYY-MM-DD: only directions with a trip running that day
+    date = request.args.get('date') or None
+    if loader.get_feed(city) is not None:
+        try:
+            return jsonify(loader.get_trips(route_id, city, date))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     return jsonify([]), 404
 
+def query_number(args, name, cast=float, positive=False):
+    """Numeric query param, None if absent; raises ValueError with a readable message"""
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = cast(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+    if positive and number <= 0:
+        raise ValueError(f'{name} must be positive')
+    return number
+
+
+def parse_spatial_args(args):
+    """
+    Spatial /api/stops params -> find_stops kwargs, or None if none were given:
+    bbox=min_lon,min_lat,max_lon,max_lat | lat, lon with k and/or radius (meters); limit.
+    """
+    limit = query_number(args, 'limit', int, positive=True)
+    if args.get('bbox'):
+        try:
+            bbox = [float(v) for v in args['bbox'].split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError('bbox must be min_lon,min_lat,max_lon,max_lat')
+        return {'bbox': bbox, 'limit': limit}
+    lat, lon = query_number(args, 'lat'), query_number(args, 'lon')
+    if lat is None and lon is None:
+        return None
+    if lat is None or lon is None:
+        raise ValueError('lat and lon must be given together')
+    return {'lat': lat, 'lon': lon, 'k': query_number(args, 'k', int, positive=True),
+            'radius_m': query_number(args, 'radius', positive=True), 'limit': limit}
+
+
+def stops_response(city, args):
+    """
+    Body and status for /api/stops; shared with the ASGI app. The body is the
+    city's stop Listing when no filter applies: send it with listing_response.
+    """
+    route_id = args.get('route_id')
+    trip_headsign = args.get('headsign')
+    date = args.get('date') or None
+    try:
+        # A route/headsign filter takes precedence; spatial params narrow the city-wide list
+        spatial = parse_spatial_args(args)
+        if spatial is not None and not (route_id and trip_headsign):
+            return loader.find_stops(city, **spatial), 200
+        feed = loader.get_feed(city)
+        if route_id and trip_headsign and (str(route_id), trip_headsign) in feed.representative_trip:
+            return loader.get_trip_stops(route_id, trip_headsign, city, date), 200
+        return loader.get_listing('stops', city) or [], 200
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+
 @app.route('/api/stops', methods=['GET'])
 def get_stops():
     city = request.args.get('city', 'hyderabad')
-    route_id = request.args.get('route_id')
-    trip_headsign = request.args.get('headsign')
-    
-    if loader.load_data(city):
-        stops_data = loader.get_stops(route_id, trip_headsign)
-        return jsonify(stops_data)
+    if loader.get_feed(city) is not None:
+        body, status = stops_response(city, request.args)
+        if isinstance(body, Listing):
+            return listing_response(body, request.args, request.headers)
+        return jsonify(body), status
     return jsonify([]), 404
 
+def parse_list(args, name):
+    """Comma-separated query param -> list, None if absent"""
+    value = args.get(name)
+    return [v.strip() for v in value.split(',') if v.strip()] if value else None
+
+
+def parse_hours(args):
+    """hour=8 | 7,8,9 | 7-9 -> list of ints, None if absent"""
+    values = parse_list(args, 'hour')
+    if values is None:
+        return None
+    hours = []
+    try:
+        for value in values:
+            if '-' in value:
+                low, high = (int(v) for v in value.split('-', 1))
+                hours.extend(range(low, high + 1))
+            else:
+                hours.append(int(value))
+    except ValueError:
+        raise ValueError('hour must be hours (0-23), e.g. 8, 7,8,9 or 7-9')
+    return hours
+
+
 @app.route('/api/stats', methods=['GET'])
 def stats():
-    # Return some dummy stats or read from csv
-    return jsonify({
-        'routes': ['R001', 'R002', 'R003', 'R004', 'R005'],
-        'avg_delay': 12.5,
-        'events_impact': 'High'
-    })
+    """
+    Delay statistics from the materialized aggregates, optionally filtered by
+    route_id, day, hour and weather (comma-separated values) and broken down by
+    group_by (route, day, hour, weather); sort=key|avg_delay|count, limit=N.
+    """
+    group_by = parse_list(request.args, 'group_by') or []
+    unknown = [g for g in group_by if g not in DIMENSIONS]
+    if unknown:
+        return jsonify({'error': f"Unknown group_by {unknown}; use {', '.join(DIMENSIONS)}"}), 400
+    sort = request.args.get('sort', 'key')
+    if sort not in ('key', 'avg_delay', 'count'):
+        return jsonify({'error': 'sort must be key, avg_delay or count'}), 400
+    try:
+        hours = parse_hours(request.args)
+        limit = query_number(request.args, 'limit', int, positive=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    delay_stats = stats_store.get()
+    result = delay_stats.query(
+        route_id=parse_list(request.args, 'route_id'),
+        day_of_week=parse_list(request.args, 'day'),
+        hour=hours,
+        weather_condition=parse_list(request.args, 'weather'),
+        group_by=group_by, sort=sort, limit=limit
+    )
+    result['group_by'] = group_by
+    result['source_rows'] = delay_stats.rows
+    result['skipped_rows'] = delay_stats.skipped
+    return jsonify(result)
+
+@app.route('/api/heatmap', methods=['GET'])
+def heatmap_info():
+    """Zoom range, bounds and cell counts of the heatmap; with zoom=Z, every cell of that zoom as [lat, lon, mean_delay]"""
+    heatmap = heatmap_store.get()
+    if heatmap is None:
+        return jsonify({'error': 'No heatmap built; run backend/utils/heatmap.py'}), 404
+    if request.args.get('zoom') is None:
+        return jsonify(heatmap.info())
+    try:
+        zoom = query_number(request.args, 'zoom', int)
+        min_count = query_number(request.args, 'min_count', int) or 1
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if zoom not in heatmap.zooms:
+        return jsonify({'error': f'zoom must be between {heatmap.min_zoom} and {heatmap.max_zoom}'}), 400
+    return jsonify({'zoom': zoom, 'points': heatmap.points(zoom, min_count)})
+
+
+@app.route('/api/heatmap/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def heatmap_tile(z, x, y):
+    """Cells of one slippy-map tile (x/y are offsets inside the tile, 0..cells_per_tile-1)"""
+    heatmap = heatmap_store.get()
+    if heatmap is None:
+        return jsonify({'error': 'No heatmap built; run backend/utils/heatmap.py'}), 404
+    cells = heatmap.tile(z, x, y)
+    if cells is None:
+        return jsonify({'error': f'zoom must be between {heatmap.min_zoom} and {heatmap.max_zoom}'}), 404
+    response = jsonify(dict(cells, zoom=z, tile=[x, y], cells_per_tile=heatmap.cells_per_tile))
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
 
 @app.route('/api/route-info', methods=['GET'])
 def get_route_info():
@@ -116,83 +692,20 @@ def get_route_info():
         start_lon = float(request.args.get('start_lon'))
         end_lat = float(request.args.get('end_lat'))
         end_lon = float(request.args.get('end_lon'))
-        
-        # OpenRouteService API endpoint
-        # Note: You'll need to sign up at https://openrouteservice.org/ to get a free API key
-        ORS_API_KEY = os.environ.get('ORS_API_KEY') or 'eyJvcmciOiI1YjNjZTM1OTc4NTExMTAwMDFjZjYyNDgiLCJpZCI6IjNhODM2NDM0YjI0YjQ1ZmFiNzFlMTdiZGQ0NjQxNTAyIiwiaCI6Im11cm11cjY0In0='
-        
-        url = 'https://api.openrouteservice.org/v2/directions/driving-car'
-        headers = {
-            'Authorization': ORS_API_KEY,
-            'Content-Type': 'application/json'
-        }
-        
-        body = {
-            'coordinates': [[start_lon, start_lat], [end_lon, end_lat]],
-            'alternative_routes': {
-                'share_factor': 0.6,
-                'target_count': 3,
-                'weight_factor': 1.4
-            }
-            # Note: Traffic consideration removed due to free tier limitations
-            # 'options': {
-            #     'avoid_features': [],
-            #     'profile_params': {
-            #         'weightings': {
-            #             'traffic': True  # Requires premium plan
-            #         }
-            #     }
-            # }
-        }
-        
-        response = requests.post(url, json=body, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extract route information from the 'routes' array (JSON format response)
-            if data.get('routes') and len(data['routes']) > 0:
-                from polyline import decode
-                routes_list = []
-                
-                for idx, route in enumerate(data['routes']):
-                    segments = route['segments'][0]
-                    
-                    # Get distance in km and duration in minutes
-                    distance_km = round(segments['distance'] / 1000, 2)
-                    duration_min = round(segments['duration'] / 60, 1)
-                    
-                    # Decode the geometry polyline to get coordinates
-                    geometry_string = route['geometry']
-                    decoded_coords = decode(geometry_string)
-                    
-                    routes_list.append({
-                        'id': idx,
-                        'distance': distance_km,
-                        'duration': duration_min,
-                        'coordinates': decoded_coords
-                    })
-                
-                # Return all available routes
-                return jsonify({
-                    'routes': routes_list,
-                    'selectedRoute': 0  # Default to first route
-                })
-            else:
-                return jsonify({'error': 'No route found'}), 404
-        else:
-            return jsonify({'error': f'OpenRouteService API error: {response.status_code}'}), 500
-            
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start_lat, start_lon, end_lat and end_lon must be numbers'}), 400
+
+    try:
+        result = ors_client.directions(start_lat, start_lon, end_lat, end_lon)
+    except ORSError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-            
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Request timeout'}), 504
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Network error: {str(e)}'}), 500
-    except Exception as e:
-        return jsonify({'error': str(e)}), 400
+
+    if not result['routes']:
+        return jsonify({'error': 'No route found'}), 404
+    # Return all available routes
+    return jsonify(result)
 
 if __name__ == '__main__':
-    load_model()
     app.run(debug=True, port=5000)
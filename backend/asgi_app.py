@@ -0,0 +1,289 @@
+"""
+Async serving mode: the same API as app.py on an ASGI server.
+
+    cd backend && uvicorn asgi_app:app --port 5000
+
+- /api/route-info awaits OpenRouteService through AsyncORSClient, so a slow
+  ORS call no longer holds a worker that could be serving other requests.
+- /api/predict, /api/predict/batch and /api/delays/propagate run in a bounded thread pool.
+- /api/routes, /api/trips and /api/stops are in-memory index lookups and run
+  directly on the event loop. A feed that needs (re)loading is loaded in a thread,
+  and so is a request needing a routes/stops listing that isn't built yet (compressing
+  one takes seconds for a large city).
+- Every other endpoint is served by the Flask app through a2wsgi's WSGIMiddleware.
+- /metrics (served by Flask) includes the native routes above: MetricsMiddleware
+  records their request latency and status, and phases run in the inference pool
+  keep the request's endpoint label.
+
+Backpressure: at most ASYNC_MAX_PENDING_INFERENCE predictions and
+ASYNC_MAX_PENDING_ORS route lookups may be queued or running at once. A request
+over the limit waits up to ASYNC_QUEUE_TIMEOUT seconds for a slot and then gets
+503 with a Retry-After header.
+
+Needs starlette, uvicorn, httpx and a2wsgi (backend/requirements.txt).
+"""
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as BaseJSONResponse, Response
+from starlette.routing import Mount, Route
+
+import app as flask_app
+from utils.metrics import current_endpoint, observe_request, phase
+from utils.ors_client import AsyncORSClient, ORSError
+from utils.payloads import Listing
+
+INFERENCE_WORKERS = int(os.environ.get('ASYNC_INFERENCE_WORKERS', os.cpu_count() or 1))
+MAX_PENDING_INFERENCE = int(os.environ.get('ASYNC_MAX_PENDING_INFERENCE', 64))
+MAX_PENDING_ORS = int(os.environ.get('ASYNC_MAX_PENDING_ORS', 256))
+QUEUE_TIMEOUT = float(os.environ.get('ASYNC_QUEUE_TIMEOUT', 0))
+
+
+class Gate:
+    """Bounded admission: at most `limit` holders, waiting at most `timeout` seconds for a slot"""
+
+    def __init__(self, limit, timeout=0.0):
+        self.limit = limit
+        self.timeout = timeout
+        self.pending = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __aenter__(self):
+        try:
+            if self._semaphore.locked() and self.timeout <= 0:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout or None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Busy()
+        self.pending += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.pending -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {'limit': self.limit, 'pending': self.pending, 'rejected': self.rejected}
+
+
+class Busy(Exception):
+    pass
+
+
+class JSONResponse(BaseJSONResponse):
+    def render(self, content):
+        with phase('json_serialize'):
+            return super().render(content)
+
+
+class MetricsMiddleware:
+    """Request count and latency for the native routes; Flask records the ones it serves itself"""
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
+        token = current_endpoint.set(scope['path'])
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            observe_request(scope['path'], scope['method'], status, time.perf_counter() - start)
+            current_endpoint.reset(token)
+
+
+inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix='inference')
+inference_gate = Gate(MAX_PENDING_INFERENCE, QUEUE_TIMEOUT)
+ors_gate = Gate(MAX_PENDING_ORS, QUEUE_TIMEOUT)
+ors_client = None
+
+
+def busy_response():
+    return JSONResponse({'error': 'Server busy, retry shortly'}, status_code=503, headers={'Retry-After': '1'})
+
+
+def model_unavailable():
+    if os.path.exists(flask_app.MODEL_PATH):
+        return JSONResponse({'error': 'Model is loading, retry shortly'}, status_code=503)
+    return JSONResponse({'error': 'Model not trained yet'}, status_code=503)
+
+
+async def run_inference(fn, data, require_model=True):
+    active = flask_app.model_manager.active
+    if active is None and require_model:
+        return model_unavailable()
+    try:
+        async with inference_gate:
+            # run_in_executor doesn't carry contextvars over; copy them so phases keep the endpoint label
+            context = contextvars.copy_context()
+            body, status = await asyncio.get_running_loop().run_in_executor(inference_pool, context.run, fn, active, data)
+    except Busy:
+        return busy_response()
+    return JSONResponse(body, status_code=status)
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def predict(request):
+    data = await read_json(request)
+    if not isinstance(data, dict):
+        return JSONResponse({'error': 'Expected a JSON object'}, status_code=400)
+    return await run_inference(flask_app.predict_response, data)
+
+
+async def predict_batch(request):
+    return await run_inference(flask_app.batch_response, await read_json(request))
+
+
+async def propagate_delays(request):
+    # The model is only needed when origin delays aren't given; the handler checks
+    return await run_inference(flask_app.propagation_response, await read_json(request), require_model=False)
+
+
+async def resident_feed(city):
+    """The city's feed, loading it off the event loop if it isn't resident yet"""
+    feed = flask_app.loader.feeds.get(city)
+    if feed is None or feed.is_stale():
+        feed = await run_in_threadpool(flask_app.loader.get_feed, city)
+    return feed
+
+
+def listing_response(listing, request):
+    content, status, headers = flask_app.listing_response(listing, request.query_params, request.headers)
+    return Response(content, status_code=status, headers=headers)
+
+
+async def get_routes(request):
+    city = request.query_params.get('city', 'hyderabad')
+    feed = await resident_feed(city)
+    if feed is not None:
+        if 'routes' in feed.listings:
+            listing = flask_app.loader.get_listing('routes', city)
+        else:
+            listing = await run_in_threadpool(flask_app.loader.get_listing, 'routes', city)
+        return listing_response(listing, request)
+    return JSONResponse([], status_code=404)
+
+
+async def get_trips(request):
+    city = request.query_params.get('city', 'hyderabad')
+    route_id = request.query_params.get('route_id')
+    date = request.query_params.get('date') or None
+    if await resident_feed(city) is not None:
+        try:
+            return JSONResponse(flask_app.loader.get_trips(route_id, city, date))
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+    return JSONResponse([], status_code=404)
+
+
+async def get_stops(request):
+    city = request.query_params.get('city', 'hyderabad')
+    feed = await resident_feed(city)
+    if feed is not None:
+        if 'stops' in feed.listings:
+            body, status = flask_app.stops_response(city, request.query_params)
+        else:
+            # May build the stops listing (or wait for the warm-up thread building it)
+            body, status = await run_in_threadpool(flask_app.stops_response, city, request.query_params)
+        if isinstance(body, Listing):
+            return listing_response(body, request)
+        return JSONResponse(body, status_code=status)
+    return JSONResponse([], status_code=404)
+
+
+async def get_route_info(request):
+    """Fetch route information (distance, duration, coordinates) from OpenRouteService API"""
+    try:
+        start_lat = float(request.query_params.get('start_lat'))
+        start_lon = float(request.query_params.get('start_lon'))
+        end_lat = float(request.query_params.get('end_lat'))
+        end_lon = float(request.query_params.get('end_lon'))
+    except (TypeError, ValueError):
+        return JSONResponse({'error': 'start_lat, start_lon, end_lat and end_lon must be numbers'}, status_code=400)
+
+    try:
+        async with ors_gate:
+            result = await ors_client.directions_async(start_lat, start_lon, end_lat, end_lon)
+    except Busy:
+        return busy_response()
+    except ORSError as e:
+        return JSONResponse({'error': str(e)}, status_code=e.status)
+
+    if not result['routes']:
+        return JSONResponse({'error': 'No route found'}, status_code=404)
+    return JSONResponse(result)
+
+
+async def async_stats(request):
+    return JSONResponse({
+        'inference_workers': INFERENCE_WORKERS,
+        'inference': inference_gate.stats(),
+        'route_service': ors_gate.stats(),
+        'route_service_client': ors_client.stats() if ors_client else None,
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global ors_client
+    # Same settings as the Flask app's client; the httpx client must be created on the server's loop
+    ors_client = AsyncORSClient(**flask_app.ORS_SETTINGS)
+    yield
+    await ors_client.aclose()
+    ors_client.save_cache()
+    # Write out observations still buffered
+    flask_app.ingestor.stop()
+    inference_pool.shutdown(wait=False)
+
+
+native_routes = [
+    Route('/api/predict', predict, methods=['POST']),
+    Route('/api/predict/batch', predict_batch, methods=['POST']),
+    Route('/api/delays/propagate', propagate_delays, methods=['POST']),
+    Route('/api/routes', get_routes),
+    Route('/api/trips', get_trips),
+    Route('/api/stops', get_stops),
+    Route('/api/route-info', get_route_info),
+    Route('/api/async/stats', async_stats),
+]
+
+app = Starlette(
+    routes=native_routes + [
+        # /health, /metrics, /api/stats, /api/model/rollback, ... stay on Flask
+        Mount('/', WSGIMiddleware(flask_app.app)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['ETag', 'X-Total-Count', 'X-Next-Offset']),
+        Middleware(MetricsMiddleware, paths={route.path for route in native_routes}),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,149 @@
+"""
+Load test: sync Flask workers (gunicorn) vs the async ASGI app (uvicorn) under a
+mix of slow external calls and fast local ones.
+
+Both servers talk to the local ORS stub (ors_stub.py) with --ors-delay seconds
+of simulated upstream latency. Each request is, by --mix weights:
+    ors      /api/route-info with fresh coordinates (always a cache miss)
+    gtfs     /api/routes or /api/stops
+    predict  /api/predict
+`--concurrency` clients send requests back to back for `--duration` seconds.
+
+Usage (from the repo root; needs gunicorn, uvicorn, httpx, a trained model):
+    python backend/benchmarks/bench_async_load.py [--workers 4] [--concurrency 64] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(BENCH_DIR)
+from ors_stub import start_stub
+
+PREDICT_BODY = {
+    'route_id': '10', 'day_of_week': 'Monday', 'weather_condition': 'Rain', 'event_type': 'None',
+    'temperature_c': 20, 'precipitation_mm': 5, 'event_attendance': 0, 'traffic_factor': 1.2
+}
+
+
+def make_request(kind, rng):
+    if kind == 'ors':
+        lat, lon = 17.3 + rng.random() * 0.2, 78.4 + rng.random() * 0.2
+        return 'GET', f'/api/route-info?start_lat={lat:.5f}&start_lon={lon:.5f}&end_lat={lat + 0.05:.5f}&end_lon={lon + 0.05:.5f}', None
+    if kind == 'gtfs':
+        if rng.random() < 0.5:
+            return 'GET', '/api/routes?city=hyderabad', None
+        return 'GET', '/api/stops?city=hyderabad&route_id=47100&headsign=LINGAMPALLI', None
+    body = dict(PREDICT_BODY, temperature_c=rng.randint(0, 35), traffic_factor=round(rng.uniform(0.8, 2.0), 2))
+    return 'POST', '/api/predict', body
+
+
+async def client_loop(base_url, kinds, weights, deadline, results, seed):
+    rng = random.Random(seed)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            method, path, body = make_request(kind, rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 'error'
+            results.append((kind, status, time.perf_counter() - start))
+
+
+async def run_load(base_url, mix, concurrency, duration):
+    kinds, weights = list(mix), list(mix.values())
+    results = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[client_loop(base_url, kinds, weights, deadline, results, i) for i in range(concurrency)])
+    return results
+
+
+def summarize(results, duration):
+    summary = {'total_rps': round(len(results) / duration, 1)}
+    for kind in sorted({r[0] for r in results}):
+        ok = [r[2] for r in results if r[0] == kind and r[1] == 200]
+        summary[kind] = {
+            'requests': sum(1 for r in results if r[0] == kind),
+            'ok': len(ok),
+            'rps': round(len(ok) / duration, 1),
+            'p50_ms': round(float(np.percentile(ok, 50)) * 1000, 1) if ok else None,
+            'p99_ms': round(float(np.percentile(ok, 99)) * 1000, 1) if ok else None,
+            'non_200': sum(1 for r in results if r[0] == kind and r[1] != 200),
+        }
+    return summary
+
+
+def wait_until_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            health = httpx.get(f'{base_url}/health', timeout=1).json()
+            if health.get('model_loaded'):
+                return
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'Server at {base_url} did not become ready')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn sync workers')
+    parser.add_argument('--inference-workers', type=int, default=None, help='ASGI inference pool size')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--ors-delay', type=float, default=0.5)
+    parser.add_argument('--mix', default='ors=0.2,gtfs=0.4,predict=0.4')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+    mix = {k: float(v) for k, v in (part.split('=') for part in args.mix.split(','))}
+
+    stub = start_stub(delay=args.ors_delay)
+    env = dict(os.environ, ORS_BASE_URL=stub.url, ORS_RATE_PER_MINUTE='0', MODEL_POLL_INTERVAL='0',
+               PREDICTION_CACHE_SIZE='0', GUNICORN_WORKERS=str(args.workers))
+    if args.inference_workers:
+        env['ASYNC_INFERENCE_WORKERS'] = str(args.inference_workers)
+    servers = {
+        f'gunicorn sync x{args.workers}': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                           '--bind', '127.0.0.1:5101', 'app:app'], 'http://127.0.0.1:5101'),
+        'uvicorn asgi x1': ([sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--port', '5102',
+                             '--log-level', 'warning'], 'http://127.0.0.1:5102'),
+    }
+
+    report = {'config': vars(args), 'results': {}}
+    for name, (cmd, base_url) in servers.items():
+        proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready(base_url)
+            results = asyncio.run(run_load(base_url, mix, args.concurrency, args.duration))
+        finally:
+            proc.terminate()
+            proc.wait()
+        summary = summarize(results, args.duration)
+        report['results'][name] = summary
+        print(f"{name}: {summary['total_rps']} req/s")
+        for kind in mix:
+            s = summary.get(kind)
+            if s:
+                print(f"  {kind:8s} {s['rps']:7.1f} ok/s   p50 {s['p50_ms']} ms   p99 {s['p99_ms']} ms   non-200 {s['non_200']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: whole-city delay propagation (utils/delay_propagation.py) vs a
+per-trip pandas loop over stop_times.
+
+Runs on the karnataka and hyderabad feeds, plus a synthetic network made of
+hyderabad's trips repeated --synthetic-trips times (real feeds have short trips;
+karnataka has one stop per trip), and checks both paths agree.
+
+Usage (from the repo root):
+    python backend/benchmarks/bench_delay_propagation.py [--synthetic-trips 15000] [--loop-trips 300]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from utils.delay_propagation import TripSchedule
+from utils.gtfs_loader import GTFSLoader
+
+RECOVERY_RATE = 0.1
+MIN_DWELL = 20
+
+
+def per_trip_loop(stop_times, trip_ids, origin_secs):
+    """Reference implementation: filter each trip out of stop_times and walk its stops"""
+    out = {}
+    for trip_id, d0 in zip(trip_ids, origin_secs):
+        trip = stop_times[stop_times['trip_id'] == trip_id].sort_values('stop_sequence')
+        arrival = trip['arrival_secs'].to_numpy()
+        departure = trip['departure_secs'].to_numpy()
+        delays = [d0]
+        recovered = 0
+        for i in range(1, len(trip)):
+            if arrival[i] >= 0 and departure[i - 1] >= 0:
+                running = max(arrival[i] - departure[i - 1], 0)
+                dwell = departure[i - 1] - arrival[i - 1] if arrival[i - 1] >= 0 else 0
+                recovered += int(round(running * RECOVERY_RATE + max(dwell - MIN_DWELL, 0)))
+            delays.append(max(d0 - recovered, 0))
+        out[trip_id] = delays
+    return out
+
+
+def synthetic_stop_times(stop_times, n_trips):
+    """Repeat a feed's trips until there are n_trips, each under a new trip_id"""
+    trip_ids = stop_times['trip_id'].astype(str).unique()
+    copies = -(-n_trips // len(trip_ids))
+    frames = []
+    for i in range(copies):
+        frame = stop_times[['trip_id', 'stop_id', 'stop_sequence', 'arrival_secs', 'departure_secs']].copy()
+        frame['trip_id'] = frame['trip_id'].astype(str) + f"#{i}"
+        frames.append(frame)
+    df = pd.concat(frames, ignore_index=True)
+    keep = df['trip_id'].isin(df['trip_id'].unique()[:n_trips])
+    return df[keep].reset_index(drop=True)
+
+
+def bench(name, stop_times, loop_trips):
+    start = time.perf_counter()
+    schedule = TripSchedule.from_stop_times(stop_times)
+    build = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    origin = rng.integers(0, 1800, schedule.n_trips).astype(np.int32)
+    times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        delay = schedule.propagate(origin, RECOVERY_RATE, MIN_DWELL)
+        times.append(time.perf_counter() - start)
+
+    sample = min(loop_trips, schedule.n_trips)
+    start = time.perf_counter()
+    expected = per_trip_loop(stop_times, schedule.trip_ids[:sample], origin[:sample])
+    loop = (time.perf_counter() - start) / sample * schedule.n_trips
+    for t in range(sample):
+        got = delay[schedule.offsets[t]:schedule.offsets[t + 1]].tolist()
+        if got != expected[schedule.trip_ids[t]]:
+            sys.exit(f"Mismatch on trip {schedule.trip_ids[t]}: {got} != {expected[schedule.trip_ids[t]]}")
+
+    print(f"{name:22s} {schedule.n_trips:6d} trips {len(schedule.arrival):8d} stop rows | "
+          f"build {build * 1000:7.1f} ms  propagate {min(times) * 1000:7.2f} ms | "
+          f"per-trip loop ~{loop:7.2f} s (from {sample} trips)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--synthetic-trips', type=int, default=15000)
+    parser.add_argument('--loop-trips', type=int, default=300)
+    args = parser.parse_args()
+
+    loader = GTFSLoader(os.path.join(BACKEND_DIR, 'utils'))
+    feeds = {city: loader.get_feed(city) for city in ['hyderabad', 'karnataka']}
+    for city, feed in feeds.items():
+        bench(city, feed.stop_times, args.loop_trips)
+    synthetic = synthetic_stop_times(feeds['hyderabad'].stop_times, args.synthetic_trips)
+    bench('synthetic (hyderabad)', synthetic, args.loop_trips)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: materialized delay aggregates (utils/delay_stats.py) vs working
+from the raw rows.
+
+Generates --rows synthetic rows into a temporary CSV and measures:
+  - building the table (one pass over the CSV) and its size on disk
+  - /api/stats-style queries answered from the table vs a groupby over the
+    in-memory raw DataFrame vs re-reading the CSV first (what the old
+    Streamlit dashboard did on every rerun)
+  - folding --append-rows new rows into the table vs rebuilding it
+and checks the table agrees with pandas on the raw rows.
+
+Usage (from the repo root):
+    python backend/benchmarks/bench_delay_stats.py [--rows 1000000] [--append-rows 10000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from utils.data_generator import generate_data
+from utils.delay_stats import DelayStats
+
+QUERIES = {
+    'by_weather': dict(group_by=['weather']),
+    'route_by_hour': dict(route_id='47100', group_by=['hour']),
+    'rain_rush_by_day': dict(weather_condition='Rain', hour=[7, 8, 9], group_by=['day']),
+    'top_routes': dict(group_by=['route'], sort='avg_delay', limit=10),
+}
+
+
+def raw_query(df, route_id=None, day_of_week=None, hour=None, weather_condition=None, group_by=(), sort='key', limit=None):
+    """The same query answered by filtering and grouping the raw rows"""
+    mask = np.ones(len(df), dtype=bool)
+    if route_id is not None:
+        mask &= (df['route_id'] == route_id).to_numpy()
+    if weather_condition is not None:
+        mask &= (df['weather_condition'] == weather_condition).to_numpy()
+    if hour is not None:
+        mask &= df['hour'].isin(hour).to_numpy()
+    columns = {'route': 'route_id', 'day': 'day_of_week', 'hour': 'hour', 'weather': 'weather_condition'}
+    grouped = df[mask].groupby([columns[g] for g in group_by])['delay_minutes'].agg(['count', 'mean', 'std', 'min', 'max'])
+    if sort == 'avg_delay':
+        grouped = grouped.sort_values('mean', ascending=False)
+    return grouped.head(limit) if limit else grouped
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--append-rows', type=int, default=10_000)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='delay_stats_bench_')
+    csv_path = os.path.join(workdir, 'transit_data.csv')
+    stats_path = os.path.join(workdir, 'delay_stats.npz')
+    generate_data(args.rows, csv_path, seed=0)
+    report = {'config': vars(args), 'csv_mb': round(os.path.getsize(csv_path) / 1e6, 1)}
+
+    start = time.perf_counter()
+    stats = DelayStats()
+    stats.update_from_csv(csv_path)
+    report['build_s'] = round(time.perf_counter() - start, 2)
+    stats.save(stats_path)
+    report['cells'] = len(stats.table)
+    report['table_kb'] = round(os.path.getsize(stats_path) / 1e3, 1)
+    _, report['load_ms'] = best_of(lambda: DelayStats.load(stats_path))
+    print(f"{args.rows} rows ({report['csv_mb']} MB CSV) -> {report['cells']} cells "
+          f"({report['table_kb']} KB) in {report['build_s']} s; table loads in {report['load_ms']:.1f} ms")
+
+    start = time.perf_counter()
+    df = pd.read_csv(csv_path, dtype={'route_id': str})
+    df['hour'] = df['time_of_day'].str.slice(0, 2).astype(int)
+    read_ms = (time.perf_counter() - start) * 1000
+
+    report['queries'] = {}
+    for name, query in QUERIES.items():
+        result, table_ms = best_of(lambda: stats.query(**query))
+        expected, raw_ms = best_of(lambda: raw_query(df, **query))
+        got = pd.DataFrame(result['groups']).set_index(expected.index.name)
+        assert len(got) == len(expected), f'{name}: group count differs'
+        got = got.loc[expected.index]
+        assert np.allclose(got['avg_delay'], expected['mean'], atol=0.006), f'{name}: mean differs'
+        assert (got['count'].to_numpy() == expected['count'].to_numpy()).all(), f'{name}: count differs'
+        report['queries'][name] = {'table_ms': round(table_ms, 2), 'raw_ms': round(raw_ms, 2),
+                                   'raw_with_csv_read_ms': round(raw_ms + read_ms, 1)}
+        print(f"  {name:18s} table {table_ms:7.2f} ms   raw {raw_ms:8.2f} ms   raw + CSV read {raw_ms + read_ms:8.1f} ms")
+
+    generate_data(args.append_rows, csv_path, seed=1, append=True)
+    start = time.perf_counter()
+    added = stats.update_from_csv(csv_path)
+    incremental_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    rebuilt = DelayStats()
+    rebuilt.update_from_csv(csv_path)
+    rebuild_ms = (time.perf_counter() - start) * 1000
+    assert added == args.append_rows and stats.rows == rebuilt.rows
+    assert stats.query()['avg_delay'] == rebuilt.query()['avg_delay']
+    report['append'] = {'rows': added, 'incremental_ms': round(incremental_ms, 1), 'rebuild_ms': round(rebuild_ms, 1)}
+    print(f"Appending {added} rows: incremental update {incremental_ms:.1f} ms vs rebuild {rebuild_ms:.1f} ms")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Report: the trained sklearn forest vs its FlatForest exports (utils/flat_forest.py).
+
+Variants: the sklearn estimator (joblib pickle), the exact float64 export,
+float32, and float32 cut at each --depths. For each it reports artifact size on
+disk, load time (joblib.load vs np.load, eager and memory-mapped), p50/p99
+single-row latency and batch throughput on preprocessed rows from the training
+CSV, the largest deviation from the sklearn predictions and the MAE against
+the actual delays.
+
+Unpruned exports must reproduce sklearn within tolerance (float64: exactly,
+float32: 1e-4 relative), otherwise the script exits non-zero. Pruned exports
+are different, smaller models; their deviation is only reported.
+
+Usage (from the repo root, after training the model):
+    python backend/benchmarks/bench_flat_forest.py [--rows 2000] [--batch 1000] [--depths 16,12,8] [--output results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from utils.features import FEATURE_COLUMNS, add_time_features
+from utils.flat_forest import FlatForest
+from utils.route_vocab import RouteVocab
+from utils.schedule_features import ScheduleFeatures
+
+PROJECT_ROOT = os.path.dirname(BACKEND_DIR)
+MODEL_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'delay_predictor.pkl')
+VOCAB_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'route_vocab.json')
+SCHEDULE_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'schedule_features.npz')
+DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'raw', 'transit_data.csv')
+
+FLOAT32_TOLERANCE = 1e-4
+
+
+def folder_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def best_time(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def latencies(predict, X, n):
+    predict(X[:1])
+    times = np.empty(min(n, len(X)))
+    for i in range(len(times)):
+        start = time.perf_counter()
+        predict(X[i:i + 1])
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000, help='Rows for single-row latency')
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--depths', default='16,12,8', help='Depth cuts to export (float32)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    pipeline = joblib.load(MODEL_PATH)
+    preprocessor, forest = pipeline.steps[0][1], pipeline.steps[-1][1]
+    df = pd.read_csv(DATA_PATH, nrows=max(args.rows, args.batch), dtype={'route_id': str})
+    df = add_time_features(df, ScheduleFeatures.load(SCHEDULE_PATH))
+    df['route_id'] = RouteVocab.load(VOCAB_PATH).encode_series(df['route_id'])
+    X = preprocessor.transform(df[FEATURE_COLUMNS])
+    # Trees split on float32; both sklearn and FlatForest get the same matrix
+    X = np.asarray(X.toarray() if hasattr(X, 'toarray') else X, dtype=np.float32)
+    y = df['delay_minutes'].to_numpy()
+    expected = forest.predict(X)
+
+    workdir = tempfile.mkdtemp(prefix='flat_forest_bench_')
+    pickle_path = os.path.join(workdir, 'forest.pkl')
+    joblib.dump(forest, pickle_path)
+    variants = [('sklearn', None, None), ('flat float64', np.float64, None), ('flat float32', np.float32, None)]
+    variants += [(f'float32 depth {d}', np.float32, int(d)) for d in args.depths.split(',') if d]
+
+    results = []
+    failed = False
+    for name, dtype, max_depth in variants:
+        if dtype is None:
+            model, path = forest, pickle_path
+            load_s = best_time(lambda: joblib.load(pickle_path), repeat=3)
+            mmap_load_s = None
+            nodes = sum(e.tree_.node_count for e in forest.estimators_)
+        else:
+            start = time.perf_counter()
+            model = FlatForest.from_estimator(forest, dtype=dtype, max_depth=max_depth)
+            export_s = time.perf_counter() - start
+            path = os.path.join(workdir, name.replace(' ', '_'))
+            model.save(path)
+            load_s = best_time(lambda: FlatForest.load(path, mmap_mode=None), repeat=3)
+            mmap_load_s = best_time(lambda: FlatForest.load(path, mmap_mode='r'), repeat=3)
+            nodes = model.n_nodes
+
+        predicted = model.predict(X)
+        deviation = float(np.abs(predicted - expected).max())
+        times = latencies(model.predict, X, args.rows)
+        batch = X[:args.batch]
+        batch_s = best_time(lambda: model.predict(batch))
+        row = {
+            'variant': name,
+            'nodes': int(nodes),
+            'size_mb': round(folder_size(path) / 1e6, 2),
+            'load_ms': round(load_s * 1000, 1),
+            'mmap_load_ms': round(mmap_load_s * 1000, 2) if mmap_load_s is not None else None,
+            'p50_us': round(float(np.percentile(times, 50)) * 1e6, 1),
+            'p99_us': round(float(np.percentile(times, 99)) * 1e6, 1),
+            'batch_rows_per_s': round(len(batch) / batch_s),
+            'max_abs_diff': deviation,
+            'mae': round(float(np.abs(predicted - y).mean()), 4),
+        }
+        if dtype is not None:
+            row['export_ms'] = round(export_s * 1000, 1)
+        results.append(row)
+
+        if max_depth is None and dtype is not None:
+            tolerance = 0.0 if dtype == np.float64 else FLOAT32_TOLERANCE * max(1.0, float(np.abs(expected).max()))
+            if deviation > tolerance:
+                print(f"{name}: max abs diff {deviation:.3g} exceeds tolerance {tolerance:.3g}")
+                failed = True
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(f"{len(X)} rows, {forest.n_estimators} trees\n")
+    print(f"{'variant':18s} {'nodes':>9s} {'size MB':>8s} {'load ms':>8s} {'mmap ms':>8s} {'p50 us':>8s} "
+          f"{'p99 us':>8s} {'batch rows/s':>13s} {'max |diff|':>11s} {'MAE':>7s}")
+    for r in results:
+        mmap = f"{r['mmap_load_ms']:8.2f}" if r['mmap_load_ms'] is not None else '       -'
+        print(f"{r['variant']:18s} {r['nodes']:9,d} {r['size_mb']:8.2f} {r['load_ms']:8.1f} {mmap} {r['p50_us']:8.1f} "
+              f"{r['p99_us']:8.1f} {r['batch_rows_per_s']:13,d} {r['max_abs_diff']:11.3g} {r['mae']:7.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Microbenchmark: table-scan get_trips/get_stops (the old implementation) vs the
+precomputed indexes built by GTFSFeed.build_indexes().
+
+get_trips is timed on --city; get_stops on --stops-city, which needs trips
+with headsigns (karnataka's are all empty, so its route/headsign stop lookups
+can't be compared). Both paths must return the same records, and get_stops a
+non-empty list, for every sampled pair before anything is timed.
+
+Usage (from the repo root):
+    python backend/benchmarks/bench_gtfs_lookups.py [--city karnataka] [--stops-city hyderabad] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.gtfs_loader import GTFSLoader
+
+
+def scan_get_trips(feed, route_id):
+    filtered = feed.trips[feed.trips['route_id'].astype(str) == str(route_id)]
+    return filtered[['trip_headsign']].drop_duplicates().to_dict('records')
+
+
+def scan_get_stops(feed, route_id, trip_headsign):
+    matching_trips = feed.trips[
+        (feed.trips['route_id'].astype(str) == str(route_id)) &
+        (feed.trips['trip_headsign'] == trip_headsign)
+    ]
+    if matching_trips.empty:
+        return []
+    trip_id = matching_trips.iloc[0]['trip_id']
+    trip_stops = feed.stop_times[feed.stop_times['trip_id'] == trip_id].sort_values('stop_sequence')
+    merged = trip_stops.merge(feed.stops, on='stop_id')
+    return merged[['stop_id', 'stop_name', 'stop_lat', 'stop_lon']].to_dict('records')
+
+
+def same_records(a, b):
+    # DataFrame.equals treats NaN == NaN (karnataka headsigns are all empty)
+    return pd.DataFrame(a).equals(pd.DataFrame(b))
+
+
+def sample_pairs(feed, n=50, headsigned=False):
+    """(route_id, headsign) pairs spread over the feed; with headsigned, only real headsigns"""
+    pairs = [pair for pair in feed.representative_trip if not headsigned or isinstance(pair[1], str)]
+    step = max(1, len(pairs) // n)
+    return pairs[::step][:n]
+
+
+def load_feed(loader, city):
+    start = time.perf_counter()
+    feed = loader.get_feed(city)
+    if feed is None:
+        sys.exit(f"Could not load GTFS for {city}")
+    print(f"{city}: load + index build {(time.perf_counter() - start) * 1000:.1f} ms, {len(feed.routes)} routes, "
+          f"{len(feed.trips)} trips, {len(feed.stop_times)} stop_times")
+    return feed
+
+
+def time_per_call(fn, args_list, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(*args_list[i % len(args_list)])
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city', default='karnataka')
+    parser.add_argument('--stops-city', default='hyderabad')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    loader = GTFSLoader(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils'))
+    feed = load_feed(loader, args.city)
+    stops_feed = load_feed(loader, args.stops_city) if args.stops_city != args.city else feed
+
+    route_args = [(route_id,) for route_id, _ in sample_pairs(feed)]
+    stop_args = sample_pairs(stops_feed, headsigned=True)
+    if not stop_args:
+        sys.exit(f"{args.stops_city} has no trips with headsigns; pick another --stops-city")
+
+    # Both paths must do the same work before timing them
+    for (route_id,) in route_args:
+        assert same_records(scan_get_trips(feed, route_id), loader.get_trips(route_id, args.city))
+    for route_id, headsign in stop_args:
+        expected = scan_get_stops(stops_feed, route_id, headsign)
+        assert expected, f"no stops for {route_id!r}/{headsign!r}"
+        assert same_records(expected, loader.get_stops(route_id, headsign, args.stops_city))
+
+    results = [
+        ('get_trips', args.city, 'scan', time_per_call(lambda r: scan_get_trips(feed, r), route_args, args.repeat)),
+        ('get_trips', args.city, 'index', time_per_call(lambda r: loader.get_trips(r, args.city), route_args, args.repeat)),
+        ('get_stops', args.stops_city, 'scan',
+         time_per_call(lambda r, h: scan_get_stops(stops_feed, r, h), stop_args, args.repeat)),
+        ('get_stops', args.stops_city, 'index',
+         time_per_call(lambda r, h: loader.get_stops(r, h, args.stops_city), stop_args, args.repeat)),
+    ]
+
+    for name, city, path, seconds in results:
+        print(f"{name:10s} {city:10s} {path:6s} {seconds * 1e6:10.1f} us/call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: heatmap generation, the old per-row loop vs the binned multi-zoom
+artifact (utils/heatmap.py), as the number of observations grows.
+
+The old script built [lat, lon, delay] with df.iterrows() and embedded every
+point in the HTML; its cost is timed on up to --loop-rows rows and
+extrapolated, and its payload size is the JSON of all points. The binned
+pipeline is timed end to end (bin + pyramid + save) and its artifact measured.
+Observations are synthetic, clustered around the karnataka and hyderabad stops.
+
+Usage (from the repo root):
+    python backend/benchmarks/bench_heatmap.py [--sizes 100000,1000000,5000000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from utils.gtfs_loader import GTFSLoader
+from utils.heatmap import Heatmap, HeatmapBuilder
+
+
+def synthetic_observations(stops, n, rng):
+    """n observations scattered within ~300 m of random stops"""
+    picks = rng.integers(0, len(stops), n)
+    return pd.DataFrame({
+        'lat': stops['stop_lat'].to_numpy()[picks] + rng.normal(0, 0.003, n),
+        'lon': stops['stop_lon'].to_numpy()[picks] + rng.normal(0, 0.003, n),
+        'delay_minutes': np.round(rng.gamma(2, 6, n), 2),
+    })
+
+
+def old_loop(df):
+    return [[row['lat'], row['lon'], row['delay_minutes']] for index, row in df.iterrows()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000,5000000')
+    parser.add_argument('--loop-rows', type=int, default=50_000)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    loader = GTFSLoader(os.path.join(BACKEND_DIR, 'utils'))
+    stops = pd.concat([loader.get_feed(city).stops for city in ('karnataka', 'hyderabad')])
+    stops = stops.dropna(subset=['stop_lat', 'stop_lon'])
+    rng = np.random.default_rng(0)
+    artifact = os.path.join(tempfile.mkdtemp(prefix='heatmap_bench_'), 'heatmap.json')
+
+    report = {'config': vars(args), 'results': {}}
+    for n in [int(s) for s in args.sizes.split(',')]:
+        df = synthetic_observations(stops, n, rng)
+
+        sample = df.head(min(n, args.loop_rows))
+        start = time.perf_counter()
+        points = old_loop(sample)
+        loop_s = (time.perf_counter() - start) / len(sample) * n
+        old_mb = len(json.dumps(points)) / len(sample) * n / 1e6
+
+        start = time.perf_counter()
+        builder = HeatmapBuilder()
+        for i in range(0, n, args.chunk_size):
+            chunk = df.iloc[i:i + args.chunk_size]
+            builder.add(chunk['lat'].to_numpy(), chunk['lon'].to_numpy(), chunk['delay_minutes'].to_numpy())
+        heatmap = builder.build()
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        heatmap.save(artifact)
+        save_s = time.perf_counter() - start
+        start = time.perf_counter()
+        Heatmap.load(artifact)
+        load_s = time.perf_counter() - start
+
+        # Spot check: the coarsest zoom's totals match the input
+        top = heatmap.zooms[heatmap.min_zoom]
+        assert top['count'].sum() == n
+        assert abs((top['count'] * top['mean']).sum() / n - df['delay_minutes'].mean()) < 0.05
+
+        cells = sum(len(c['x']) for c in heatmap.zooms.values())
+        result = {
+            'old_loop_s': round(loop_s, 2), 'old_payload_mb': round(old_mb, 1),
+            'bin_s': round(build_s, 2), 'save_s': round(save_s, 2), 'load_s': round(load_s, 2),
+            'cells': cells, 'artifact_mb': round(os.path.getsize(artifact) / 1e6, 1),
+            'dropped_cells': heatmap.meta['source']['dropped_cells'],
+        }
+        report['results'][n] = result
+        print(f"{n:>9} rows: iterrows {loop_s:7.1f} s, {old_mb:7.1f} MB embedded | binned {build_s:5.2f} s "
+              f"+ save {save_s:4.2f} s, {cells} cells, {result['artifact_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
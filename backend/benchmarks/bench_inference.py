@@ -0,0 +1,83 @@
+"""
+Latency benchmark: sklearn pipeline (DataFrame -> ColumnTransformer -> forest)
+vs the compiled fast path in utils/fast_inference.py.
+
+Checks that both produce identical predictions on rows from the training CSV,
+then reports p50/p99 single-row latency and batch throughput.
+
+Usage (from the repo root, after generating data and training the model):
+    python backend/benchmarks/bench_inference.py [--rows 2000] [--batch 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from utils.features import FEATURE_COLUMNS, add_time_features, build_model_frame
+from utils.fast_inference import CompiledPipeline
+from utils.route_vocab import RouteVocab
+from utils.schedule_features import ScheduleFeatures
+
+PROJECT_ROOT = os.path.dirname(BACKEND_DIR)
+MODEL_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'delay_predictor.pkl')
+VOCAB_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'route_vocab.json')
+SCHEDULE_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'schedule_features.npz')
+DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'raw', 'transit_data.csv')
+
+
+def latencies(fn, rows):
+    times = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        fn(row)
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def report(name, times):
+    print(f"{name:18s} p50 {np.percentile(times, 50) * 1e6:9.1f} us   p99 {np.percentile(times, 99) * 1e6:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    pipeline = joblib.load(MODEL_PATH)
+    start = time.perf_counter()
+    compiled = CompiledPipeline.from_pipeline(pipeline)
+    print(f"Compile time: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    df = pd.read_csv(DATA_PATH, nrows=max(args.rows, args.batch), dtype={'route_id': str})
+    df = add_time_features(df, ScheduleFeatures.load(SCHEDULE_PATH))
+    df['route_id'] = RouteVocab.load(VOCAB_PATH).encode_series(df['route_id'])
+    rows = df[FEATURE_COLUMNS].to_dict('records')
+
+    expected = pipeline.predict(build_model_frame(rows))
+    actual = compiled.predict(rows)
+    if not np.array_equal(expected, actual):
+        sys.exit(f"Mismatch: max abs diff {np.abs(expected - actual).max()}")
+    print(f"Predictions identical on {len(rows)} rows")
+
+    single = rows[:args.rows]
+    report('sklearn single', latencies(lambda r: pipeline.predict(build_model_frame([r])), single))
+    report('fast single', latencies(lambda r: compiled.predict([r]), single))
+
+    batch = rows[:args.batch]
+    for name, fn in [('sklearn batch', lambda: pipeline.predict(build_model_frame(batch))),
+                     ('fast batch', lambda: compiled.predict(batch))]:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:18s} {len(batch)} rows in {elapsed * 1000:.1f} ms ({len(batch) / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark / check of utils/ors_client.py against the local ORS stub (ors_stub.py).
+
+Reports per-call latency of a fresh requests.post (the old /api/route-info
+code path) vs the pooled client cold and warm, then checks request collapsing,
+rate limiting and the stale fallback on timeout.
+
+Usage:
+    python backend/benchmarks/bench_ors_client.py [--calls 200] [--delay 0.0]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+sys.path.append(BENCH_DIR)
+from ors_stub import start_stub
+from utils.ors_client import ALTERNATIVE_ROUTES, ORSClient, ORSError
+
+HYDERABAD = (17.385, 78.4867)
+
+
+def points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    offsets = rng.uniform(-0.1, 0.1, size=(n, 4))
+    return [(HYDERABAD[0] + a, HYDERABAD[1] + b, HYDERABAD[0] + c, HYDERABAD[1] + d) for a, b, c, d in offsets]
+
+
+def report(name, times):
+    times = np.asarray(times)
+    print(f"{name:24s} p50 {np.percentile(times, 50) * 1000:7.2f} ms   p99 {np.percentile(times, 99) * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=0.0, help='Simulated upstream latency (s)')
+    args = parser.parse_args()
+
+    stub = start_stub(delay=args.delay)
+    coords = points(args.calls)
+
+    # Old path: new connection per call
+    times = []
+    for start_lat, start_lon, end_lat, end_lon in coords:
+        t = time.perf_counter()
+        requests.post(f"{stub.url}/v2/directions/driving-car", timeout=10, json={
+            'coordinates': [[start_lon, start_lat], [end_lon, end_lat]], 'alternative_routes': ALTERNATIVE_ROUTES})
+        times.append(time.perf_counter() - t)
+    report('requests.post per call', times)
+
+    client = ORSClient('stub-key', base_url=stub.url, rate_per_minute=0)
+    for name in ['client cold (pooled)', 'client warm (cached)']:
+        times = []
+        for c in coords:
+            t = time.perf_counter()
+            client.directions(*c)
+            times.append(time.perf_counter() - t)
+        report(name, times)
+
+    # Collapsing: concurrent identical calls make one upstream request
+    slow = start_stub(delay=0.3)
+    client = ORSClient('stub-key', base_url=slow.url, rate_per_minute=0)
+    threads = [threading.Thread(target=client.directions, args=coords[0]) for _ in range(20)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    print(f"20 concurrent identical calls -> {slow.request_count} upstream request(s), {client.collapsed} collapsed")
+
+    # Rate limit: burst of 5 then refusals (no waiting)
+    client = ORSClient('stub-key', base_url=stub.url, rate_per_minute=60, burst=5, max_wait=0)
+    refused = 0
+    for c in coords[:10]:
+        try:
+            client.directions(*c)
+        except ORSError as e:
+            refused += e.status == 429
+    print(f"10 distinct calls with burst=5 -> {refused} refused with 429")
+
+    # Timeout: an expired entry is served instead of an error
+    client = ORSClient('stub-key', base_url=stub.url, rate_per_minute=0, cache_ttl=0.05, timeout=(1.0, 0.1))
+    client.directions(*coords[0])
+    time.sleep(0.1)
+    stub.delay = 0.5
+    t = time.perf_counter()
+    result = client.directions(*coords[0])
+    print(f"upstream timeout with expired entry -> stale={result.get('stale', False)} "
+          f"in {(time.perf_counter() - t) * 1000:.0f} ms")
+    try:
+        client.directions(*coords[1])
+    except ORSError as e:
+        print(f"upstream timeout with nothing cached -> {e.status} {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: pre-serialized listings (utils/payloads.py) vs building and
+serializing the records on every request.
+
+For each city, measures through the Flask test client:
+  - the old path: to_dict('records') + jsonify per request
+  - /api/routes and /api/stops served from the Listing (identity, gzip, br)
+  - a revalidation with a matching ETag (304)
+  - a 500-row page and the columnar format
+and the one-off cost of building the Listing when a feed version is first served.
+
+Usage (from the repo root):
+    python backend/benchmarks/bench_payloads.py [--cities hyderabad,karnataka] [--repeat 50] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+os.environ.setdefault('MODEL_POLL_INTERVAL', '0')
+import app as flask_app
+from utils.payloads import Listing
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cities', default='hyderabad,karnataka')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    client = flask_app.app.test_client()
+    report = {'config': vars(args), 'cities': {}}
+    for city in args.cities.split(','):
+        feed = flask_app.loader.get_feed(city)
+        if feed is None:
+            print(f"Skipping {city}: no feed")
+            continue
+        results = report['cities'][city] = {}
+        # The app builds listings in a background thread after a load; let it finish first
+        feed.warm_listings()
+        print(f"{city}: {len(feed.routes)} routes, {len(feed.stops)} stops")
+        for name in ('routes', 'stops'):
+            _, build_ms = best_of(lambda: Listing.from_frame(feed.listing_frame(name)), 3)
+            url = f'/api/{name}?city={city}'
+            legacy = (lambda: flask_app.loader.get_routes(city)) if name == 'routes' else (lambda: flask_app.loader.get_stops(city=city))
+            with flask_app.app.test_request_context():
+                legacy_body, legacy_ms = best_of(lambda: flask_app.jsonify(legacy()).get_data(), args.repeat)
+
+            row = {'listing_build_ms': round(build_ms, 1), 'legacy_ms': round(legacy_ms, 2), 'legacy_bytes': len(legacy_body)}
+            etag = None
+            for encoding in ('identity', 'gzip', 'br'):
+                response, ms = best_of(lambda: client.get(url, headers={'Accept-Encoding': encoding}), args.repeat)
+                etag = response.headers['ETag']
+                row[encoding] = {'ms': round(ms, 2), 'bytes': len(response.data),
+                                 'encoding': response.headers.get('Content-Encoding')}
+            response, ms = best_of(lambda: client.get(url, headers={'If-None-Match': etag}), args.repeat)
+            assert response.status_code == 304
+            row['not_modified_ms'] = round(ms, 2)
+            response, ms = best_of(lambda: client.get(url + '&offset=0&limit=500', headers={'Accept-Encoding': 'gzip'}), args.repeat)
+            row['page_500'] = {'ms': round(ms, 2), 'bytes': len(response.data)}
+            response, ms = best_of(lambda: client.get(url + '&format=columnar', headers={'Accept-Encoding': 'br, gzip'}), args.repeat)
+            row['columnar'] = {'ms': round(ms, 2), 'bytes': len(response.data)}
+            results[name] = row
+            # The end-to-end request time includes the test client's own overhead
+            print(f"  {name:6s} legacy {legacy_ms:7.2f} ms {len(legacy_body):>8,} B | listing {row['identity']['ms']:6.2f} ms "
+                  f"{row['identity']['bytes']:>8,} B  gzip {row['gzip']['bytes']:>8,} B  br {row['br']['bytes']:>8,} B | "
+                  f"304 {row['not_modified_ms']:.2f} ms | page {row['page_500']['ms']:.2f} ms | "
+                  f"columnar {row['columnar']['bytes']:,} B | build once {build_ms:.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
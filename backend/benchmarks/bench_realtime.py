@@ -0,0 +1,136 @@
+"""
+Realtime ingestion benchmark: throughput of each stage of the observation
+pipeline and the memory the live aggregates take.
+
+Stages, on TripUpdates generated by gtfs_rt_stub.py from a city's GTFS trips:
+    parse pb / parse json   GTFS-Realtime FeedMessage -> observation columns
+    ingest                  route resolution + buffering + store append (Ingestor)
+    aggregate               folding store segments into the rolling aggregates (LiveDelays.refresh)
+    lookup                  one live feature lookup (route + stop), as /api/predict does
+Then --keys distinct routes are fed to fresh aggregates to measure their memory
+(array bytes and process RSS growth) at that many keys.
+
+Usage (from the repo root):
+    python backend/benchmarks/bench_realtime.py [--city karnataka] [--trips 5000] [--feeds 20] [--output bench/realtime.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from benchmarks.gtfs_rt_stub import TripUpdateFeed, feed_trips
+from utils.gtfs_loader import GTFSLoader
+from utils.live_delays import LiveDelays
+from utils.observation_store import ObservationStore
+from utils.realtime import Ingestor, RouteNames, gtfs_realtime_pb2, parse_feed
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--city', default='karnataka')
+    parser.add_argument('--trips', type=int, default=5000, help='TripUpdates per feed message')
+    parser.add_argument('--feeds', type=int, default=20, help='Feed messages to ingest')
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--keys', type=int, default=50000, help='Distinct keys for the memory measurement')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    feed = TripUpdateFeed(*feed_trips(args.city, args.trips))
+    now = time.time()
+    messages_json = [json.dumps(feed.message(now - 30 * (args.feeds - i))).encode() for i in range(args.feeds)]
+    messages_pb = [feed.protobuf(now - 30 * (args.feeds - i)) for i in range(args.feeds)] \
+        if gtfs_realtime_pb2 is not None else []
+    n_rows = args.feeds * len(feed.trip_ids)
+    results = {'rows': n_rows}
+
+    parsed, seconds = timed(lambda: [parse_feed(m, args.city)[0] for m in messages_json])
+    results['parse_json_rows_per_s'] = round(n_rows / seconds)
+    if messages_pb:
+        parsed, seconds = timed(lambda: [parse_feed(m, args.city)[0] for m in messages_pb])
+        results['parse_pb_rows_per_s'] = round(n_rows / seconds)
+        results['pb_bytes_per_row'] = round(sum(map(len, messages_pb)) / n_rows, 1)
+    results['json_bytes_per_row'] = round(sum(map(len, messages_json)) / n_rows, 1)
+
+    workdir = tempfile.mkdtemp(prefix='realtime_bench_')
+    try:
+        store = ObservationStore(workdir)
+        loader = GTFSLoader(os.path.join(BACKEND_DIR, 'utils'))
+        route_names = RouteNames(loader)
+        route_names.maps(args.city)  # feed load isn't part of ingest
+        ingestor = Ingestor(store, route_names, flush_rows=n_rows + 1)
+
+        def ingest():
+            for rows in parsed:
+                ingestor.ingest(rows)
+                ingestor.flush()  # one segment per feed message, as the poller writes them
+        _, seconds = timed(ingest)
+        results['ingest_rows_per_s'] = round(n_rows / seconds)
+        results['store_bytes_per_row'] = round(store.bytes_written / store.rows_written, 1)
+        results['segments'] = store.segments_written
+
+        live = LiveDelays(store, refresh_interval=0)
+        _, seconds = timed(lambda: live.refresh(now))
+        results['aggregate_rows_per_s'] = round(n_rows / seconds)
+        _, seconds = timed(lambda: live.refresh(now))
+        results['idle_refresh_ms'] = round(seconds * 1000, 3)
+
+        frame, seconds = timed(lambda: store.read(now - 3600, now + 60))
+        results['store_read_rows_per_s'] = round(len(frame) / seconds)
+        routes, stops = frame['route'].to_numpy(), frame['stop_id'].to_numpy()
+        picks = np.random.default_rng(0).integers(0, len(frame), args.lookups)
+        times = np.empty(args.lookups)
+        for i, row in enumerate(picks.tolist()):
+            start = time.perf_counter()
+            live.features(args.city, routes[row], stops[row], now)
+            times[i] = time.perf_counter() - start
+        results['lookup_p50_us'] = round(float(np.percentile(times, 50)) * 1e6, 1)
+        results['lookup_p99_us'] = round(float(np.percentile(times, 99)) * 1e6, 1)
+        results['route_keys'] = live.routes.stats()['keys']
+        results['stop_keys'] = live.stops.stats()['keys']
+        results['live_bytes'] = live.routes.nbytes + live.stops.nbytes
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Memory at --keys distinct keys (the default max_keys of one aggregate level)
+    before = rss_mb()
+    memory = LiveDelays(ObservationStore(workdir), max_keys=args.keys, refresh_interval=0)
+    keys = np.array([f'route-{i}' for i in range(args.keys)], dtype=str)
+    batch = {'observed_at': np.full(args.keys, int(now), dtype=np.int64), 'city': np.full(args.keys, args.city),
+             'route': keys, 'trip_id': keys, 'stop_id': np.full(args.keys, ''), 'delay_s': np.full(args.keys, 60, dtype=np.int32)}
+    _, seconds = timed(lambda: memory.add(batch, now))
+    results['new_keys_per_s'] = round(args.keys / seconds)
+    results['keys'] = memory.routes.stats()['keys']
+    results['keys_array_mb'] = round(memory.routes.nbytes / 1e6, 1)
+    results['keys_rss_growth_mb'] = round(rss_mb() - before, 1)
+
+    for name, value in results.items():
+        print(f"{name:24s} {value:>12,}" if isinstance(value, int) else f"{name:24s} {value:>12}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: stop index (utils/stop_index.py) build time and bbox / k-nearest /
+radius query latency vs a brute-force scan of the stops table.
+
+Runs on the karnataka and hyderabad feeds plus a synthetic city of
+--synthetic-stops stops scattered over karnataka's extent, and checks the index
+returns the same stops as the scan. Query points are random stops; boxes are
+--box-km wide, roughly a zoomed-in map viewport.
+
+Usage (from the repo root):
+    python backend/benchmarks/bench_stop_index.py [--queries 500] [--synthetic-stops 100000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from utils.gtfs_loader import GTFSLoader
+from utils.stop_index import EARTH_RADIUS_M, StopIndex
+
+K = 10
+RADIUS_M = 500
+
+
+def haversine_m(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def scan_bbox(stops, box):
+    min_lon, min_lat, max_lon, max_lat = box
+    mask = stops['stop_lon'].between(min_lon, max_lon) & stops['stop_lat'].between(min_lat, max_lat)
+    return set(stops.loc[mask, 'stop_id'])
+
+
+def scan_nearest(stops, lat, lon, k):
+    distances = haversine_m(lat, lon, stops['stop_lat'].to_numpy(), stops['stop_lon'].to_numpy())
+    return np.sort(distances)[:k]
+
+
+def scan_radius(stops, lat, lon, radius_m):
+    distances = haversine_m(lat, lon, stops['stop_lat'].to_numpy(), stops['stop_lon'].to_numpy())
+    return set(stops.loc[distances <= radius_m, 'stop_id'])
+
+
+def timed(fn, args_list):
+    results = []
+    start = time.perf_counter()
+    for args in args_list:
+        results.append(fn(*args))
+    return results, (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def synthetic_stops(stops, n, seed=0):
+    rng = np.random.default_rng(seed)
+    lat, lon = stops['stop_lat'], stops['stop_lon']
+    return pd.DataFrame({
+        'stop_id': np.arange(n),
+        'stop_name': [f'Stop {i}' for i in range(n)],
+        'stop_lat': rng.uniform(lat.min(), lat.max(), n),
+        'stop_lon': rng.uniform(lon.min(), lon.max(), n),
+    })
+
+
+def bench(name, stops, n_queries, box_km):
+    stops = stops.dropna(subset=['stop_lat', 'stop_lon']).reset_index(drop=True)
+    start = time.perf_counter()
+    index = StopIndex(stops)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(stops), n_queries)
+    points = [(float(stops['stop_lat'][i]), float(stops['stop_lon'][i])) for i in picks]
+    half_lat = box_km / 2 / 111.32
+    boxes = [(lon - half_lat / np.cos(np.radians(lat)), lat - half_lat,
+              lon + half_lat / np.cos(np.radians(lat)), lat + half_lat) for lat, lon in points]
+
+    # Index queries include building the response records, as the endpoint does
+    idx_bbox, t_bbox = timed(lambda *b: index.take(index.bbox(*b)), boxes)
+    idx_knn, t_knn = timed(lambda lat, lon: index.take(*index.nearest(lat, lon, k=K)), points)
+    idx_rad, t_rad = timed(lambda lat, lon: index.take(*index.within(lat, lon, RADIUS_M)), points)
+
+    scan_points = points[:min(n_queries, 100)]
+    ref_bbox, s_bbox = timed(lambda *b: scan_bbox(stops, b), boxes[:len(scan_points)])
+    ref_knn, s_knn = timed(lambda lat, lon: scan_nearest(stops, lat, lon, K), scan_points)
+    ref_rad, s_rad = timed(lambda lat, lon: scan_radius(stops, lat, lon, RADIUS_M), scan_points)
+
+    for i in range(len(scan_points)):
+        assert {s['stop_id'] for s in idx_bbox[i]} == ref_bbox[i], f'{name}: bbox mismatch'
+        got = np.array([s['distance_m'] for s in idx_knn[i]])
+        assert np.allclose(got, ref_knn[i], atol=0.1), f'{name}: knn mismatch'
+        # Stops sitting right on the radius may fall either side of it through rounding
+        got_rad = {s['stop_id'] for s in idx_rad[i]}
+        assert len(got_rad ^ ref_rad[i]) <= 1, f'{name}: radius mismatch'
+
+    result = {
+        'stops': len(stops),
+        'build_ms': round(build_ms, 2),
+        'bbox_us': {'index': round(t_bbox, 1), 'scan': round(s_bbox, 1),
+                    'avg_results': round(float(np.mean([len(r) for r in idx_bbox])), 1)},
+        'knn_us': {'index': round(t_knn, 1), 'scan': round(s_knn, 1), 'k': K},
+        'radius_us': {'index': round(t_rad, 1), 'scan': round(s_rad, 1), 'radius_m': RADIUS_M,
+                      'avg_results': round(float(np.mean([len(r) for r in idx_rad])), 1)},
+    }
+    print(f"{name}: {len(stops)} stops, index built in {build_ms:.1f} ms")
+    for kind in ('bbox_us', 'knn_us', 'radius_us'):
+        r = result[kind]
+        print(f"  {kind[:-3]:7s} index {r['index']:8.1f} us   scan {r['scan']:9.1f} us   ({r['scan'] / r['index']:.0f}x)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--box-km', type=float, default=2.0)
+    parser.add_argument('--synthetic-stops', type=int, default=100_000)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    loader = GTFSLoader(os.path.join(BACKEND_DIR, 'utils'))
+    report = {'config': vars(args), 'results': {}}
+    for city in ('karnataka', 'hyderabad'):
+        feed = loader.get_feed(city)
+        if feed is None:
+            print(f"Skipping {city}: feed not found")
+            continue
+        report['results'][city] = bench(city, feed.stops, args.queries, args.box_km)
+        if city == 'karnataka' and args.synthetic_stops:
+            stops = synthetic_stops(feed.stops, args.synthetic_stops)
+            report['results']['synthetic'] = bench(f'synthetic ({args.synthetic_stops} stops)', stops,
+                                                   args.queries, args.box_km)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
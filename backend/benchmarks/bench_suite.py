@@ -0,0 +1,379 @@
+"""
+End-to-end benchmark suite for the backend, written to JSON so runs can be
+compared between commits.
+
+Sections (all in-process through Flask's test client unless --url is given):
+    gtfs_load   per city: CSV parse + index build, and load from the binary cache
+    endpoints   latency of /api/routes, /api/trips, /api/stops (route and bbox),
+                /api/stats, /api/route-info (cold and warm ORS cache),
+                /api/predict and /api/predict/batch at several batch sizes
+    throughput  requests/s and latency at each --concurrency level for a mixed
+                workload, from a local threaded load generator
+
+OpenRouteService is replaced by the local stub (ors_stub.py) with --ors-delay
+seconds of simulated latency, and the prediction cache is off so predict
+timings measure the model. The run records the git commit, Python and library
+versions next to the numbers.
+
+Usage (from the repo root, after generating data and training the model):
+    python backend/benchmarks/bench_suite.py --output bench/$(git rev-parse --short HEAD).json
+    python backend/benchmarks/bench_suite.py --quick --compare bench/baseline.json [--fail-on-regression]
+    # Same workload against a running server (e.g. gunicorn or uvicorn) over HTTP:
+    python backend/benchmarks/bench_suite.py --url http://127.0.0.1:5000 --sections endpoints,throughput
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(BACKEND_DIR)
+sys.path.append(BENCH_DIR)
+from ors_stub import start_stub
+
+SECTIONS = ['gtfs_load', 'endpoints', 'throughput']
+
+PREDICT_BODY = {
+    'route_id': '47100', 'day_of_week': 'Monday', 'weather_condition': 'Rain', 'event_type': 'None',
+    'temperature_c': 20, 'precipitation_mm': 5, 'event_attendance': 0, 'traffic_factor': 1.2
+}
+
+
+class InProcessClient:
+    """Flask test client; one per thread, as a test client isn't meant to be shared"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.flask_app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPClient:
+    """Keep-alive HTTP client per thread, for benchmarking a running server"""
+
+    def __init__(self, base_url):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        response = session.request(method, self.base_url + path, json=body, timeout=60)
+        return response.status_code
+
+
+def summarize_latencies(times, statuses):
+    times = np.asarray(times) * 1000
+    return {
+        'n': len(times),
+        'mean_ms': round(float(times.mean()), 3),
+        'p50_ms': round(float(np.percentile(times, 50)), 3),
+        'p95_ms': round(float(np.percentile(times, 95)), 3),
+        'p99_ms': round(float(np.percentile(times, 99)), 3),
+        'non_2xx': int(sum(1 for s in statuses if not 200 <= s < 300)),
+    }
+
+
+def measure(client, requests_list, iterations, warmup=5):
+    """Latency of each request in turn, cycling through requests_list"""
+    for i in range(warmup):
+        client.request(*requests_list[i % len(requests_list)])
+    times, statuses = [], []
+    for i in range(iterations):
+        method, path, body = requests_list[i % len(requests_list)]
+        start = time.perf_counter()
+        statuses.append(client.request(method, path, body))
+        times.append(time.perf_counter() - start)
+    return summarize_latencies(times, statuses)
+
+
+def bench_gtfs_load(cities, repeat):
+    from utils.gtfs_loader import GTFSFeed, GTFSLoader
+
+    results = {}
+    base_dir = os.path.join(BACKEND_DIR, 'utils')
+    loader = GTFSLoader(base_dir, cache_dir=None)
+    for city in cities:
+        path = loader.resolve_path(city)
+        if path is None:
+            results[city] = {'error': 'feed not found'}
+            continue
+        cache_dir = tempfile.mkdtemp(prefix='bench_gtfs_cache_')
+        parse, cached = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            GTFSFeed(city, path).load()
+            parse.append(time.perf_counter() - start)
+        GTFSFeed(city, path, cache_dir).load()  # writes the cache
+        for _ in range(repeat):
+            start = time.perf_counter()
+            feed = GTFSFeed(city, path, cache_dir)
+            feed.load()
+            cached.append(time.perf_counter() - start)
+        results[city] = {
+            'csv_parse_ms': round(float(np.median(parse)) * 1000, 1),
+            'binary_cache_ms': round(float(np.median(cached)) * 1000, 1),
+            'from_cache': feed.from_cache,
+            'routes': len(feed.routes), 'trips': len(feed.trips), 'stops': len(feed.stops),
+        }
+        print(f"  gtfs_load {city}: CSV {results[city]['csv_parse_ms']} ms, cache {results[city]['binary_cache_ms']} ms")
+    return results
+
+
+def endpoint_requests(flask_app):
+    """Requests per endpoint, built from the resident feeds so every one hits real data"""
+    loader = flask_app.loader
+    requests_by_name = {}
+    for city in ('hyderabad', 'karnataka'):
+        feed = loader.get_feed(city)
+        if feed is None:
+            continue
+        # Wait for the background build of the pre-serialized listings so it doesn't skew timings
+        feed.warm_listings()
+        pairs = [(r, h) for (r, h) in feed.representative_trip if isinstance(h, str)][:20]
+        route_ids = list(feed.route_headsigns)[:20]
+        requests_by_name[f'routes_{city}'] = [('GET', f'/api/routes?city={city}', None)]
+        requests_by_name[f'stops_all_{city}'] = [('GET', f'/api/stops?city={city}', None)]
+        requests_by_name[f'trips_{city}'] = [('GET', f'/api/trips?city={city}&route_id={r}', None) for r in route_ids]
+        if pairs:
+            requests_by_name[f'stops_route_{city}'] = [
+                ('GET', f'/api/stops?city={city}&route_id={r}&headsign={h}', None) for r, h in pairs]
+        if feed.stop_index is not None and len(feed.stop_index):
+            lat, lon = feed.stop_index.lat[:20], feed.stop_index.lon[:20]
+            requests_by_name[f'stops_bbox_{city}'] = [
+                ('GET', f'/api/stops?city={city}&bbox={x - 0.01:.5f},{y - 0.01:.5f},{x + 0.01:.5f},{y + 0.01:.5f}', None)
+                for y, x in zip(lat, lon)]
+            requests_by_name[f'stops_nearest_{city}'] = [
+                ('GET', f'/api/stops?city={city}&lat={y:.5f}&lon={x:.5f}&k=10', None) for y, x in zip(lat, lon)]
+    requests_by_name['stats_grouped'] = [('GET', '/api/stats?group_by=route&sort=avg_delay&limit=10', None),
+                                         ('GET', '/api/stats?weather=Rain&hour=7-9&group_by=day', None)]
+    rng = random.Random(0)
+    requests_by_name['predict'] = [
+        ('POST', '/api/predict', dict(PREDICT_BODY, temperature_c=rng.randint(0, 35),
+                                      traffic_factor=round(rng.uniform(0.8, 2.0), 2)))
+        for _ in range(50)]
+    return requests_by_name
+
+
+def route_info_request(i):
+    lat, lon = 17.3 + (i % 997) * 0.0002, 78.4 + (i // 997) * 0.0002
+    return ('GET', f'/api/route-info?start_lat={lat:.5f}&start_lon={lon:.5f}'
+                   f'&end_lat={lat + 0.05:.5f}&end_lon={lon + 0.05:.5f}', None)
+
+
+def bench_endpoints(client, flask_app, iterations, batch_sizes):
+    results = {}
+    for name, requests_list in endpoint_requests(flask_app).items():
+        results[name] = measure(client, requests_list, iterations)
+        print(f"  {name:24s} p50 {results[name]['p50_ms']:8.3f} ms   p99 {results[name]['p99_ms']:8.3f} ms")
+
+    # Cold: every request is a new coordinate pair (stub round trip); warm: the same pair again
+    cold = [route_info_request(i) for i in range(10_000, 10_000 + iterations + 5)]
+    results['route_info_cold'] = measure(client, cold, iterations)
+    results['route_info_warm'] = measure(client, [route_info_request(0)], iterations)
+    for name in ('route_info_cold', 'route_info_warm'):
+        print(f"  {name:24s} p50 {results[name]['p50_ms']:8.3f} ms   p99 {results[name]['p99_ms']:8.3f} ms")
+
+    rng = random.Random(1)
+    for size in batch_sizes:
+        body = {'inputs': [dict(PREDICT_BODY, temperature_c=rng.randint(0, 35)) for _ in range(size)]}
+        stats = measure(client, [('POST', '/api/predict/batch', body)], max(5, iterations // 10), warmup=2)
+        stats['rows_per_s'] = round(size / (stats['mean_ms'] / 1000), 1)
+        results[f'predict_batch_{size}'] = stats
+        print(f"  predict_batch_{size:<10d} p50 {stats['p50_ms']:8.3f} ms   {stats['rows_per_s']:,.0f} rows/s")
+    return results
+
+
+def mixed_workload(flask_app):
+    named = endpoint_requests(flask_app)
+    return {
+        'gtfs': [r for name, reqs in named.items() if name.startswith(('routes_', 'trips_', 'stops_')) for r in reqs],
+        'predict': named['predict'],
+        'route_info': [route_info_request(i) for i in range(200)],
+    }
+
+
+def bench_throughput(client, workload, mix, levels, duration):
+    kinds, weights = list(mix), list(mix.values())
+    results = {}
+    for concurrency in levels:
+        records = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = []
+            while time.perf_counter() < deadline:
+                kind = rng.choices(kinds, weights)[0]
+                method, path, body = rng.choice(workload[kind])
+                start = time.perf_counter()
+                try:
+                    status = client.request(method, path, body)
+                except Exception:
+                    status = 599
+                local.append((kind, status, time.perf_counter() - start))
+            with lock:
+                records.extend(local)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        level = {'rps': round(len(records) / elapsed, 1)}
+        level.update(summarize_latencies([r[2] for r in records], [r[1] for r in records]))
+        for kind in kinds:
+            times = [r[2] for r in records if r[0] == kind]
+            if times:
+                level[kind] = summarize_latencies(times, [r[1] for r in records if r[0] == kind])
+        results[str(concurrency)] = level
+        print(f"  concurrency {concurrency:3d}: {level['rps']:8.1f} req/s   p50 {level['p50_ms']:7.2f} ms   "
+              f"p99 {level['p99_ms']:8.2f} ms   non-2xx {level['non_2xx']}")
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, timeout=30)
+        return out.stdout.strip() or None, bool(dirty.stdout.strip())
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+
+
+def environment():
+    from importlib.metadata import version
+    commit, dirty = git_commit()
+    return {
+        'commit': commit, 'dirty': dirty,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+        'versions': {name: version(name) for name in ('numpy', 'pandas', 'scikit-learn', 'flask')},
+    }
+
+
+# Metrics compared by --compare, and whether a higher value is better
+# (tail latencies are recorded but too noisy between runs to flag on)
+COMPARED = {'p50_ms': False, 'csv_parse_ms': False, 'binary_cache_ms': False, 'rps': True, 'rows_per_s': True}
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif key in COMPARED and isinstance(value, (int, float)):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(baseline, current, threshold):
+    """Print metrics that moved more than threshold (fraction); returns the regressions"""
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    regressions = []
+    print(f"\nCompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')}):")
+    for metric in sorted(old.keys() & new.keys()):
+        before, after = old[metric], new[metric]
+        if not before:
+            continue
+        change = (after - before) / before
+        higher_is_better = COMPARED[metric.rsplit('.', 1)[-1]]
+        worse = change < -threshold if higher_is_better else change > threshold
+        better = change > threshold if higher_is_better else change < -threshold
+        if worse or better:
+            print(f"  {'REGRESSION' if worse else 'improved  '} {metric}: {before} -> {after} ({change:+.0%})")
+        if worse:
+            regressions.append(metric)
+    if not regressions:
+        print(f"  no regressions beyond {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sections', default=','.join(SECTIONS))
+    parser.add_argument('--cities', default='hyderabad,karnataka')
+    parser.add_argument('--iterations', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--load-repeat', type=int, default=3, help='GTFS loads per city and mode')
+    parser.add_argument('--batch-sizes', default='10,100,1000')
+    parser.add_argument('--concurrency', default='1,4,16,64')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per concurrency level')
+    parser.add_argument('--mix', default='gtfs=0.5,predict=0.4,route_info=0.1')
+    parser.add_argument('--ors-delay', type=float, default=0.05, help='Simulated ORS latency (s)')
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--quick', action='store_true', help='Fewer iterations and shorter load levels')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Relative change reported by --compare')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+    if args.quick:
+        args.iterations, args.load_repeat, args.duration = 50, 1, 2
+    sections = args.sections.split(',')
+    mix = {k: float(v) for k, v in (part.split('=') for part in args.mix.split(','))}
+
+    # The app reads its settings at import time
+    stub = start_stub(delay=args.ors_delay)
+    os.environ.update(ORS_BASE_URL=stub.url, ORS_RATE_PER_MINUTE='0', ORS_CACHE_PATH='', MODEL_PRELOAD='1',
+                      MODEL_POLL_INTERVAL='0', PREDICTION_CACHE_SIZE='0')
+    import app as flask_app
+    if flask_app.model_manager.active is None:
+        sys.exit("No trained model; run backend/model/train.py first")
+    client = HTTPClient(args.url) if args.url else InProcessClient(flask_app.app)
+
+    report = {'environment': environment(), 'config': vars(args), 'results': {}}
+    report['config']['target'] = args.url or 'flask test client'
+    if 'gtfs_load' in sections:
+        print("GTFS load")
+        report['results']['gtfs_load'] = bench_gtfs_load(args.cities.split(','), args.load_repeat)
+    if 'endpoints' in sections:
+        print("Endpoints")
+        report['results']['endpoints'] = bench_endpoints(client, flask_app, args.iterations,
+                                                         [int(s) for s in args.batch_sizes.split(',')])
+    if 'throughput' in sections:
+        print(f"Throughput ({args.mix})")
+        report['results']['throughput'] = bench_throughput(
+            client, mixed_workload(flask_app), mix, [int(c) for c in args.concurrency.split(',')], args.duration)
+    report['results']['ors_stub_requests'] = stub.request_count
+    stub.shutdown()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
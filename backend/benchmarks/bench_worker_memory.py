@@ -0,0 +1,154 @@
+"""
+Memory benchmark for multi-worker serving: forks N worker processes the way
+gunicorn does and reports what each one costs.
+
+Modes:
+    pickle          every worker joblib.loads delay_predictor.pkl itself (no preload)
+    preload-pickle  the master loads the pickle, workers inherit it through fork
+    bundle          the master opens the memory-mapped delay_predictor.bundle, then forks
+
+Each worker scores --rows requests, then all workers are measured together from
+/proc/<pid>/smaps_rollup: RSS, PSS (shared pages split between the processes
+using them) and private (unshared) memory.
+
+Usage (from the repo root, after training the model):
+    python backend/benchmarks/bench_worker_memory.py [--workers 4] [--rows 200]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from utils.features import FEATURE_COLUMNS, add_time_features
+from utils.model_manager import ModelManager
+from utils.route_vocab import RouteVocab
+from utils.schedule_features import ScheduleFeatures
+
+PROJECT_ROOT = os.path.dirname(BACKEND_DIR)
+MODEL_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'delay_predictor.pkl')
+VOCAB_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'route_vocab.json')
+SCHEDULE_PATH = os.path.join(PROJECT_ROOT, 'data', 'models', 'schedule_features.npz')
+DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'raw', 'transit_data.csv')
+MODES = ['pickle', 'preload-pickle', 'bundle']
+
+
+def smaps_rollup(pid):
+    """RSS / PSS / private memory of a process in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss_mb': round(fields.get('Rss', 0), 1),
+        'pss_mb': round(fields.get('Pss', 0), 1),
+        'private_mb': round(fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0), 1),
+    }
+
+
+def load_manager(use_bundle):
+    manager = ModelManager(MODEL_PATH, VOCAB_PATH, poll_interval=0)
+    if not use_bundle:
+        # Pretend there is no bundle so the full pickle is loaded
+        manager.load_from_bundle = lambda *args: None
+    manager.reload(force=True)
+    return manager
+
+
+def run_mode(mode, n_workers, rows):
+    """Fork the workers, measure them while all are alive, return the per-worker stats"""
+    manager = None
+    start = time.perf_counter()
+    if mode != 'pickle':
+        manager = load_manager(use_bundle=mode == 'bundle')
+    master_load = time.perf_counter() - start
+
+    ready_r, ready_w = os.pipe()
+    release_r, release_w = os.pipe()
+    pids = []
+    for _ in range(n_workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            os.close(release_w)
+            start = time.perf_counter()
+            worker_manager = manager or load_manager(use_bundle=False)
+            load_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            for row in rows:
+                worker_manager.active.predict([row])
+            per_request = (time.perf_counter() - start) / len(rows)
+            os.write(ready_w, (json.dumps([load_seconds, per_request]) + '\n').encode())
+            os.read(release_r, 1)  # stay alive until the parent has measured everyone
+            os._exit(0)
+        pids.append(pid)
+    os.close(ready_w)
+
+    timings = []
+    with os.fdopen(ready_r) as ready:
+        for _ in range(n_workers):
+            timings.append(json.loads(ready.readline()))
+    workers = [dict(smaps_rollup(pid), load_seconds=round(t[0], 3), request_ms=round(t[1] * 1000, 3))
+               for pid, t in zip(pids, timings)]
+    master = smaps_rollup(os.getpid())
+    os.close(release_w)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    os.close(release_r)
+
+    return {
+        'mode': mode,
+        'workers': n_workers,
+        'master_load_seconds': round(master_load, 3),
+        'master': master,
+        'per_worker': workers,
+        'total_pss_mb': round(master['pss_mb'] + sum(w['pss_mb'] for w in workers), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--mode', choices=MODES)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child run: one mode in a fresh interpreter, result as JSON on stdout's last line
+        df = pd.read_csv(DATA_PATH, nrows=args.rows, dtype={'route_id': str})
+        df = add_time_features(df, ScheduleFeatures.load(SCHEDULE_PATH))
+        df['route_id'] = RouteVocab.load(VOCAB_PATH).encode_series(df['route_id'])
+        result = run_mode(args.mode, args.workers, df[FEATURE_COLUMNS].to_dict('records'))
+        print(json.dumps(result))
+        return
+
+    results = []
+    for mode in MODES:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                              '--workers', str(args.workers), '--rows', str(args.rows)],
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        results.append(result)
+        w = result['per_worker']
+        avg = lambda key: sum(x[key] for x in w) / len(w)
+        print(f"{mode:15s} master load {result['master_load_seconds']:6.2f}s | per worker: "
+              f"RSS {avg('rss_mb'):6.1f} MB  PSS {avg('pss_mb'):6.1f} MB  private {avg('private_mb'):6.1f} MB  "
+              f"load {avg('load_seconds'):5.2f}s  {avg('request_ms'):6.2f} ms/request | "
+              f"total PSS {result['total_pss_mb']:7.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Local GTFS-Realtime TripUpdates feed, for exercising utils/realtime.py and
+/api/observations without a transit agency's feed.
+
+Answers GET /trip_updates with one TripUpdate per sampled trip of a city's GTFS
+feed: each trip keeps a delay that random-walks between requests, reported at
+its current StopTimeUpdate. Protobuf by default (needs gtfs-realtime-bindings),
+the protobuf JSON mapping with ?format=json.
+
+    python backend/benchmarks/gtfs_rt_stub.py --port 8095 --trips 500
+    python backend/utils/realtime.py --city hyderabad --url http://127.0.0.1:8095/trip_updates --interval 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.realtime import gtfs_realtime_pb2
+
+
+def feed_trips(city, limit=None, seed=0):
+    """(trip_id, route_id, stop_id) per sampled trip of the city's GTFS feed, the stop being its first"""
+    from utils.gtfs_loader import GTFSLoader
+    feed = GTFSLoader(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils')).get_feed(city)
+    schedule = feed.schedule
+    rows = feed.schedule_trips_row
+    timed = np.flatnonzero(rows >= 0)
+    if limit is not None and limit < len(timed):
+        timed = np.sort(np.random.default_rng(seed).choice(timed, limit, replace=False))
+    return (feed.trip_id_values[rows[timed]].astype(str), feed.trip_route_values[rows[timed]].astype(str),
+            schedule.stop_ids[schedule.offsets[timed]].astype(str))
+
+
+class TripUpdateFeed:
+    """Trips with persistent, random-walking delays (seconds)"""
+
+    def __init__(self, trip_ids, route_ids, stop_ids, seed=0):
+        self.trip_ids, self.route_ids, self.stop_ids = trip_ids, route_ids, stop_ids
+        self.rng = np.random.default_rng(seed)
+        self.delays = self.rng.normal(180, 240, len(trip_ids))
+        self.lock = threading.Lock()
+
+    def step(self):
+        with self.lock:
+            self.delays = np.clip(self.delays + self.rng.normal(0, 60, len(self.delays)), -300, 3600)
+            return self.delays.round().astype(int)
+
+    def message(self, now=None):
+        """The current FeedMessage in the protobuf JSON mapping"""
+        now = int(time.time() if now is None else now)
+        delays = self.step()
+        return {
+            'header': {'gtfsRealtimeVersion': '2.0', 'incrementality': 'FULL_DATASET', 'timestamp': str(now)},
+            'entity': [{
+                'id': str(i),
+                'tripUpdate': {
+                    'trip': {'tripId': trip_id, 'routeId': route_id},
+                    'stopTimeUpdate': [{'stopSequence': 1, 'stopId': stop_id, 'arrival': {'delay': int(delay)}}],
+                    'timestamp': str(now),
+                },
+            } for i, (trip_id, route_id, stop_id, delay)
+                in enumerate(zip(self.trip_ids.tolist(), self.route_ids.tolist(), self.stop_ids.tolist(), delays.tolist()))],
+        }
+
+    def protobuf(self, now=None):
+        """The current FeedMessage, serialized"""
+        now = int(time.time() if now is None else now)
+        delays = self.step()
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.header.gtfs_realtime_version = '2.0'
+        feed.header.incrementality = gtfs_realtime_pb2.FeedHeader.FULL_DATASET
+        feed.header.timestamp = now
+        for i, (trip_id, route_id, stop_id, delay) in enumerate(
+                zip(self.trip_ids.tolist(), self.route_ids.tolist(), self.stop_ids.tolist(), delays.tolist())):
+            entity = feed.entity.add(id=str(i))
+            update = entity.trip_update
+            update.trip.trip_id = trip_id
+            update.trip.route_id = route_id
+            update.timestamp = now
+            stop_update = update.stop_time_update.add(stop_sequence=1, stop_id=stop_id)
+            stop_update.arrival.delay = int(delay)
+        return feed.SerializeToString()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'GTFSRTStub/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/trip_updates':
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self.server.request_count += 1
+        if parse_qs(url.query).get('format') == ['json'] or gtfs_realtime_pb2 is None:
+            data, content_type = json.dumps(self.server.feed.message()).encode(), 'application/json'
+        else:
+            data, content_type = self.server.feed.protobuf(), 'application/x-protobuf'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(feed, port=0):
+    """Serve a TripUpdateFeed on a background thread; returns the server (server.url, server.request_count)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.feed = feed
+    server.request_count = 0
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/trip_updates"
+    threading.Thread(target=server.serve_forever, name='gtfs-rt-stub', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local GTFS-Realtime TripUpdates stub")
+    parser.add_argument('--port', type=int, default=8095)
+    parser.add_argument('--city', default='hyderabad')
+    parser.add_argument('--trips', type=int, default=None, help='Sample this many trips (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    server = start_stub(TripUpdateFeed(*feed_trips(args.city, args.trips, args.seed), seed=args.seed), args.port)
+    print(f"Serving GTFS-Realtime TripUpdates on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
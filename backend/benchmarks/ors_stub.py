@@ -0,0 +1,89 @@
+"""
+Local stand-in for the OpenRouteService directions API, for exercising
+utils/ors_client.py and /api/route-info without network access or an API key.
+
+Answers POST /v2/directions/<profile> with a straight-line route (plus
+alternatives) in ORS's JSON format. `delay` seconds are slept per request to
+mimic upstream latency; `status` forces an error response.
+
+    python backend/benchmarks/ors_stub.py --port 8089 --delay 0.2
+    ORS_BASE_URL=http://127.0.0.1:8089 python backend/app.py
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from polyline import encode
+
+
+def fake_directions(coordinates, target_count=1):
+    (start_lon, start_lat), (end_lon, end_lat) = coordinates
+    distance = math.hypot(end_lat - start_lat, end_lon - start_lon) * 111_000
+    routes = []
+    for i in range(max(1, target_count)):
+        # Alternatives bend away from the straight line and are a little longer
+        mid = ((start_lat + end_lat) / 2 + 0.002 * i, (start_lon + end_lon) / 2 - 0.002 * i)
+        points = [(start_lat, start_lon), mid, (end_lat, end_lon)]
+        routes.append({
+            'segments': [{'distance': distance * (1 + 0.1 * i), 'duration': distance * (1 + 0.1 * i) / 8.0}],
+            'geometry': encode(points),
+        })
+    return {'routes': routes}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'ORSStub/1.0'
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if server.delay:
+            time.sleep(server.delay)
+        if server.status != 200:
+            payload = {'error': {'code': server.status, 'message': 'stub error'}}
+        else:
+            target_count = body.get('alternative_routes', {}).get('target_count', 1)
+            payload = fake_directions(body['coordinates'], target_count)
+        data = json.dumps(payload).encode()
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port=0, delay=0.0, status=200):
+    """Run the stub on a background thread; returns the server (server.url, server.request_count)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.status = status
+    server.request_count = 0
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name='ors-stub', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local OpenRouteService stub")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay', type=float, default=0.0)
+    parser.add_argument('--status', type=int, default=200)
+    args = parser.parse_args()
+    stub = start_stub(args.port, args.delay, args.status)
+    print(f"ORS stub listening on {stub.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,38 @@
+"""
+Gunicorn settings for serving the backend with several workers:
+
+    cd backend && gunicorn app:app
+
+The app (and the model) is imported once in the master before forking, so all
+workers share the preloaded memory copy-on-write; the forest itself is served
+from the memory-mapped delay_predictor.bundle written by train.py.
+"""
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+timeout = 60
+preload_app = True
+
+# Tell app.py to load the model at import time instead of on a background thread
+os.environ.setdefault('MODEL_PRELOAD', '1')
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the GC's reach; otherwise the first
+    # collection in each worker writes to every object header and un-shares the pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads don't survive fork: start each worker's model watcher, observation flusher
+    # and live delay refresher here
+    import app
+    app.start_background_threads()
+
+
+def worker_exit(server, worker):
+    # Write out the worker's buffered realtime observations
+    import app
+    app.ingestor.stop()
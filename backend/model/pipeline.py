@@ -5,28 +5,39 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.impute import SimpleImputer
 import joblib
 
-def create_pipeline():
-    # Define categorical and numerical features
-    categorical_features = ['route_id', 'day_of_week', 'weather_condition', 'event_type']
-    numerical_features = ['temperature_c', 'precipitation_mm', 'event_attendance', 'traffic_factor']
+CATEGORICAL_FEATURES = ['route_id', 'day_of_week', 'weather_condition', 'event_type']
+# Time-of-day and GTFS schedule features come from utils/features.add_time_features
+# (training) and utils/features.build_model_input (serving); NaN means unknown
+NUMERICAL_FEATURES = ['temperature_c', 'precipitation_mm', 'event_attendance', 'traffic_factor',
+                      'hour', 'time_bucket', 'is_rush_hour',
+                      'scheduled_headway_min', 'scheduled_stops', 'scheduled_trip_min']
 
+def create_pipeline(categories=None, dense=False):
+    """
+    categories: optional fixed category lists (one per categorical feature, in order)
+    so the encoder doesn't need to see the whole dataset, e.g. for chunked training.
+    dense: always output a dense matrix (for estimators that reject sparse input).
+    """
     # Preprocessing for numerical data
     numerical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='median')),
+        # keep_empty_features: schedule features are all NaN when no GTFS feed was available;
+        # keep their columns so the output layout doesn't depend on the data
+        ('imputer', SimpleImputer(strategy='median', keep_empty_features=True)),
         ('scaler', StandardScaler())
     ])
 
     # Preprocessing for categorical data
     categorical_transformer = Pipeline(steps=[
         ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
-        ('onehot', OneHotEncoder(handle_unknown='ignore'))
+        ('onehot', OneHotEncoder(categories=categories if categories is not None else 'auto', handle_unknown='ignore'))
     ])
 
     # Bundle preprocessing for numerical and categorical data
     preprocessor = ColumnTransformer(
         transformers=[
-            ('num', numerical_transformer, numerical_features),
-            ('cat', categorical_transformer, categorical_features)
-        ])
+            ('num', numerical_transformer, NUMERICAL_FEATURES),
+            ('cat', categorical_transformer, CATEGORICAL_FEATURES)
+        ],
+        sparse_threshold=0 if dense else 0.3)
 
     return preprocessor
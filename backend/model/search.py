@@ -0,0 +1,285 @@
+"""
+Model comparison: several model families and hyperparameter grids on the
+create_pipeline() features, evaluated in parallel across a process pool.
+
+The preprocessor is fitted once on the training split. The dense float32
+train/test matrices are then copied into shared memory
+(multiprocessing.shared_memory), and every worker maps them instead of receiving
+a pickled copy or refitting the preprocessor per candidate. Each candidate
+fits on one core and reports:
+  mae, r2               accuracy on the held-out split
+  fit_s                 training time
+  latency_p50_ms/p99    single-row predict on a preprocessed row, as /api/predict does;
+                        forests the serving bundle can flatten are timed through FlatForest
+  rows_per_s            1000-row batch predict throughput
+  size_mb               pickled model size (flat_mb: the FlatForest arrays the bundle serves)
+
+Latency is measured inside the busy pool; run with --workers 1 for quiet-machine numbers.
+xgboost, lightgbm and catboost are used when installed and skipped otherwise.
+
+Usage (from the repo root):
+    python backend/model/search.py [--families rf,extra_trees,hgb,ridge,xgboost,lightgbm,catboost]
+        [--workers N] [--sample-size 500000] [--max-latency-ms 5] [--max-size-mb 50]
+        [--output results.json] [--save-best]
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import ParameterGrid, train_test_split
+from sklearn.pipeline import Pipeline
+from threadpoolctl import threadpool_limits
+
+from pipeline import create_pipeline
+from train import DATA_PATH, load_training_data, save_model
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.flat_forest import FlatForest
+
+# family -> (module, class, grid, fixed params); every candidate fits single-threaded
+FAMILIES = {
+    'rf': ('sklearn.ensemble', 'RandomForestRegressor',
+           {'n_estimators': [50, 100], 'max_depth': [None, 12], 'min_samples_leaf': [1, 5]},
+           {'random_state': 42, 'n_jobs': 1}),
+    'extra_trees': ('sklearn.ensemble', 'ExtraTreesRegressor',
+                    {'n_estimators': [50, 100], 'max_depth': [None, 12], 'min_samples_leaf': [1, 5]},
+                    {'random_state': 42, 'n_jobs': 1}),
+    'hgb': ('sklearn.ensemble', 'HistGradientBoostingRegressor',
+            {'max_iter': [100, 300], 'learning_rate': [0.05, 0.1], 'max_leaf_nodes': [15, 31]},
+            {'random_state': 42}),
+    'ridge': ('sklearn.linear_model', 'Ridge', {'alpha': [0.1, 1.0, 10.0]}, {}),
+    'xgboost': ('xgboost', 'XGBRegressor',
+                {'n_estimators': [200, 400], 'max_depth': [4, 6], 'learning_rate': [0.05, 0.1]},
+                {'random_state': 42, 'n_jobs': 1, 'tree_method': 'hist'}),
+    'lightgbm': ('lightgbm', 'LGBMRegressor',
+                 {'n_estimators': [200, 400], 'num_leaves': [15, 31], 'learning_rate': [0.05, 0.1]},
+                 {'random_state': 42, 'n_jobs': 1, 'verbose': -1}),
+    'catboost': ('catboost', 'CatBoostRegressor',
+                 {'iterations': [300, 600], 'depth': [4, 6], 'learning_rate': [0.05, 0.1]},
+                 {'random_seed': 42, 'thread_count': 1, 'verbose': 0}),
+}
+# Parameter that sets the core count, for the final refit of the chosen model
+THREAD_PARAMS = {'rf': 'n_jobs', 'extra_trees': 'n_jobs', 'xgboost': 'n_jobs', 'lightgbm': 'n_jobs',
+                 'catboost': 'thread_count'}
+
+LATENCY_ROWS = 200
+BATCH_ROWS = 1000
+
+
+def make_estimator(family, params, threads=1):
+    module, name, _, fixed = FAMILIES[family]
+    fixed = dict(fixed)
+    if family in THREAD_PARAMS:
+        fixed[THREAD_PARAMS[family]] = threads
+    return getattr(importlib.import_module(module), name)(**fixed, **params)
+
+
+def available_families(names):
+    families = []
+    for name in names:
+        if name not in FAMILIES:
+            raise ValueError(f"Unknown family {name}; use {', '.join(FAMILIES)}")
+        try:
+            importlib.import_module(FAMILIES[name][0])
+            families.append(name)
+        except ImportError:
+            print(f"Skipping {name}: {FAMILIES[name][0]} is not installed")
+    return families
+
+
+def candidates(families):
+    return [(family, params) for family in families for params in ParameterGrid(FAMILIES[family][2])]
+
+
+class SharedArrays:
+    """NumPy arrays copied once into shared memory blocks; workers attach to them by name"""
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.spec = {}
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.spec[key] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+# Set in each worker by attach_shared()
+_blocks = []
+_data = {}
+
+
+def attach_shared(spec):
+    for key, (name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=name)
+        # Keep the handle alive as long as the view
+        _blocks.append(block)
+        _data[key] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def percentile_ms(times, q):
+    return round(float(np.percentile(times, q)) * 1000, 4)
+
+
+def evaluate(family, params):
+    """Fit one candidate on the shared training matrix; accuracy, latency and size"""
+    X_train, y_train, X_test, y_test = _data['X_train'], _data['y_train'], _data['X_test'], _data['y_test']
+    model = make_estimator(family, params)
+    # One core per worker, including OpenMP/BLAS pools (HistGradientBoosting has no n_jobs)
+    with threadpool_limits(1):
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_s = time.perf_counter() - start
+        preds = model.predict(X_test)
+
+        # What serving would run: the flattened forest for RF/ExtraTrees bundles, else the estimator
+        try:
+            flat = FlatForest.from_estimator(model)
+            predict = flat.predict
+        except (AttributeError, ValueError):
+            flat = None
+            predict = model.predict
+        rows = X_test[:LATENCY_ROWS]
+        predict(rows[:1])
+        times = []
+        for i in range(len(rows)):
+            start = time.perf_counter()
+            predict(rows[i:i + 1])
+            times.append(time.perf_counter() - start)
+        batch = X_test[:BATCH_ROWS]
+        start = time.perf_counter()
+        predict(batch)
+        batch_s = time.perf_counter() - start
+
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return {
+        'family': family,
+        'params': params,
+        'mae': round(float(mean_absolute_error(y_test, preds)), 4),
+        'r2': round(float(r2_score(y_test, preds)), 4),
+        'fit_s': round(fit_s, 2),
+        'latency_p50_ms': percentile_ms(times, 50),
+        'latency_p99_ms': percentile_ms(times, 99),
+        'rows_per_s': round(len(batch) / batch_s),
+        'size_mb': round(buffer.tell() / 1e6, 3),
+        'flat_mb': round(flat.nbytes / 1e6, 3) if flat is not None else None,
+    }
+
+
+def within_budget(result, max_latency_ms, max_size_mb):
+    if max_latency_ms is not None and result['latency_p50_ms'] > max_latency_ms:
+        return False
+    if max_size_mb is not None and result['size_mb'] > max_size_mb:
+        return False
+    return True
+
+
+def run_search(data_path=DATA_PATH, families=tuple(FAMILIES), workers=None, sample_size=None,
+               max_latency_ms=None, max_size_mb=None, seed=42):
+    """
+    Evaluate every candidate of `families`; returns (results sorted by MAE, best
+    candidate within the latency/size budget or None, fitted preprocessor, training data, route_vocab,
+    schedule)
+    """
+    X, y, route_vocab, schedule = load_training_data(data_path)
+    if sample_size and len(X) > sample_size:
+        X = X.sample(sample_size, random_state=seed)
+        y = y.loc[X.index]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed)
+
+    # Fitted once; every candidate trains on the same transformed matrix
+    start = time.perf_counter()
+    preprocessor = create_pipeline(dense=True)
+    train_matrix = preprocessor.fit_transform(X_train).astype(np.float32)
+    test_matrix = preprocessor.transform(X_test).astype(np.float32)
+    print(f"Preprocessed {train_matrix.shape[0]} training rows x {train_matrix.shape[1]} features "
+          f"({train_matrix.nbytes / 1e6:.1f} MB) in {time.perf_counter() - start:.2f}s")
+
+    todo = candidates(available_families(families))
+    workers = workers or os.cpu_count() or 1
+    print(f"Evaluating {len(todo)} candidates on {workers} worker(s)")
+    shared = SharedArrays({'X_train': train_matrix, 'y_train': y_train.to_numpy(np.float64),
+                           'X_test': test_matrix, 'y_test': y_test.to_numpy(np.float64)})
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_shared, initargs=(shared.spec,)) as pool:
+            futures = {pool.submit(evaluate, family, params): (family, params) for family, params in todo}
+            for future in as_completed(futures):
+                family, params = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  {family} {params} failed: {e}")
+                    continue
+                results.append(result)
+                print(f"  {family:12s} MAE {result['mae']:7.4f}  p50 {result['latency_p50_ms']:8.3f} ms  "
+                      f"{result['size_mb']:8.2f} MB  {params}")
+    finally:
+        shared.close()
+
+    results.sort(key=lambda r: r['mae'])
+    best = next((r for r in results if within_budget(r, max_latency_ms, max_size_mb)), None)
+    return results, best, preprocessor, (train_matrix, y_train), route_vocab, schedule
+
+
+def print_table(results, best):
+    print(f"\n{'family':12s} {'MAE':>8s} {'R2':>7s} {'fit s':>7s} {'p50 ms':>9s} {'p99 ms':>9s} "
+          f"{'rows/s':>10s} {'size MB':>9s} {'flat MB':>8s}  params")
+    for r in results:
+        marker = '*' if r is best else ' '
+        flat = f"{r['flat_mb']:8.2f}" if r['flat_mb'] is not None else '       -'
+        print(f"{r['family']:12s} {r['mae']:8.4f} {r['r2']:7.4f} {r['fit_s']:7.2f} {r['latency_p50_ms']:9.3f} "
+              f"{r['latency_p99_ms']:9.3f} {r['rows_per_s']:10,d} {r['size_mb']:9.2f} {flat}{marker} {r['params']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model families and hyperparameters")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--families', default=','.join(FAMILIES), help='Comma-separated: ' + ', '.join(FAMILIES))
+    parser.add_argument('--workers', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('--sample-size', type=int, help='Use at most this many rows')
+    parser.add_argument('--max-latency-ms', type=float, help='Serving budget: p50 single-row latency')
+    parser.add_argument('--max-size-mb', type=float, help='Serving budget: pickled model size')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--save-best', action='store_true',
+                        help='Refit the best candidate within budget on all cores and save it as the served model')
+    args = parser.parse_args()
+
+    results, best, preprocessor, (train_matrix, y_train), route_vocab, schedule = run_search(
+        args.data, args.families.split(','), args.workers, args.sample_size, args.max_latency_ms, args.max_size_mb)
+    print_table(results, best)
+    if best is None:
+        print("\nNo candidate fits the latency/size budget")
+    else:
+        print(f"\nBest within budget (*): {best['family']} {best['params']} MAE {best['mae']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results, 'best': best}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.save_best and best is not None:
+        model = make_estimator(best['family'], best['params'], threads=-1)
+        model.fit(train_matrix, y_train.to_numpy())
+        # The preprocessor was fitted on the same training rows, so the pair forms the usual pipeline
+        save_model(Pipeline(steps=[('preprocessor', preprocessor), ('model', model)]), route_vocab, schedule)
+
+
+if __name__ == '__main__':
+    main()
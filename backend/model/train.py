@@ -1,42 +1,69 @@
 import os
+import sys
+import time
+import argparse
+import numpy as np
 import pandas as pd
 import joblib
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_absolute_error, r2_score
-from pipeline import create_pipeline
+from pipeline import CATEGORICAL_FEATURES, NUMERICAL_FEATURES, create_pipeline
 
-def train_model():
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.features import add_time_features
+from utils.gtfs_loader import GTFSLoader
+from utils.route_vocab import build_route_vocab
+from utils.flat_forest import FlatForest
+from utils.model_bundle import bundle_path, export_bundle, file_digest
+from utils.schedule_features import ScheduleFeatures
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'raw', 'transit_data.csv')
+MODEL_DIR = os.path.join(PROJECT_ROOT, 'data', 'models')
+CITIES = ['hyderabad', 'karnataka']
+
+FEATURES = CATEGORICAL_FEATURES + NUMERICAL_FEATURES
+
+def build_schedule(loader):
+    """(route, time bucket) schedule lookup table from the cities' GTFS feeds"""
+    schedule = ScheduleFeatures.from_feeds([loader.get_feed(city) for city in CITIES])
+    print(f"Schedule features: {len(schedule)} routes")
+    return schedule
+
+def load_training_data(data_path=DATA_PATH):
+    """
+    Training CSV -> (X with the create_pipeline() features, y, route_vocab, schedule);
+    route_id is vocabulary-encoded
+    """
     print("Loading data...")
-    # Load data
-    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'raw', 'transit_data.csv')
-    df = pd.read_csv(data_path)
-    
-    # Separate target
-    X = df.drop(['delay_minutes', 'time_of_day'], axis=1) # Drop time_of_day for simplicity or process it later. 
-    # Ideally process time_of_day into Hour/Minute features, let's fix that below.
-    
-    # Feature Engineering: Extract Hour from time_of_day
-    df['hour'] = df['time_of_day'].apply(lambda x: int(x.split(':')[0]))
-    X = df.drop(['delay_minutes', 'time_of_day'], axis=1)
-    
-    # Add hour to pipeline - we need to update pipeline to handle 'hour' as numerical or categorical
-    # For now let's treat it as numerical
-    X = X[['route_id', 'day_of_week', 'weather_condition', 'event_type', 
-           'temperature_c', 'precipitation_mm', 'event_attendance', 'traffic_factor']]
-    # Wait, I dropped 'hour'. Let's add it back in future iterations if needed. 
-    # For MVP stick to the defined features in pipeline.py or update pipeline.py.
-    # Actually, let's keep it simple.
-    
-    y = df['delay_minutes']
+    # Keep route names as text ("47100" is a name, not a number)
+    df = pd.read_csv(data_path, dtype={'route_id': str})
+
+    # Stable route codes: GTFS route names + whatever the training data contains
+    loader = GTFSLoader(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils'))
+    route_vocab = build_route_vocab(loader, CITIES, df['route_id'].unique())
+    schedule = build_schedule(loader)
+    # Time and schedule features are joined on the route name, before encoding
+    df = add_time_features(df, schedule)
+    df['route_id'] = route_vocab.encode_series(df['route_id'])
+    print(f"Route vocabulary: {len(route_vocab)} routes")
+
+    return df[FEATURES], df['delay_minutes'], route_vocab, schedule
+
+def train_model(export_dtype=np.float64, export_max_depth=None):
+    """Fit the random forest on the training CSV and save it; export_* compact the served bundle"""
+    X, y, route_vocab, schedule = load_training_data()
 
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
     # Create pipeline
     preprocessor = create_pipeline()
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
 
     clf = Pipeline(steps=[('preprocessor', preprocessor),
                           ('model', model)])
@@ -52,13 +79,247 @@ def train_model():
     r2 = r2_score(y_test, preds)
     print(f"MAE: {mae}")
     print(f"R2 Score: {r2}")
+    if np.dtype(export_dtype) != np.float64 or export_max_depth is not None:
+        report_export(clf, X_test, y_test, preds, export_dtype, export_max_depth)
+
+    save_model(clf, route_vocab, schedule, export_dtype, export_max_depth)
 
+def report_export(clf, X_test, y_test, preds, dtype, max_depth):
+    """How far the compact forest served from the bundle is from the sklearn model, on the test split"""
+    forest = FlatForest.from_estimator(clf.named_steps['model'], dtype=dtype, max_depth=max_depth)
+    X = clf.named_steps['preprocessor'].transform(X_test)
+    X = np.asarray(X.toarray() if hasattr(X, 'toarray') else X, dtype=np.float32)
+    compact = forest.predict(X)
+    full = FlatForest.from_estimator(clf.named_steps['model'])
+    print(f"Compact export ({np.dtype(dtype)}, max_depth={max_depth}): {forest.n_nodes} nodes, "
+          f"{forest.nbytes / 1e6:.1f} MB vs {full.n_nodes} nodes, {full.nbytes / 1e6:.1f} MB; "
+          f"max |diff| {np.abs(compact - preds).max():.3g} min, MAE {mean_absolute_error(y_test, compact):.4f}")
+
+def save_model(clf, route_vocab, schedule, export_dtype=np.float64, export_max_depth=None):
     # Save model
-    model_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'models')
+    model_dir = MODEL_DIR
     os.makedirs(model_dir, exist_ok=True)
     model_path = os.path.join(model_dir, 'delay_predictor.pkl')
-    joblib.dump(clf, model_path)
+    # The vocabulary is part of the model: serving must encode routes with the same codes.
+    # Likewise the schedule table: serving joins the values the model was trained on.
+    vocab_path = os.path.join(model_dir, 'route_vocab.json')
+    schedule_path = os.path.join(model_dir, 'schedule_features.npz')
+
+    # Everything is written under temporary names first and the pickle is published last,
+    # so the running backend never pairs a new vocabulary with the old model. The model
+    # also carries the digests of its vocabulary/schedule files, which the backend checks.
+    staged_vocab, staged_schedule = f"{vocab_path}.new", f"{schedule_path}.new.npz"
+    route_vocab.save(staged_vocab)
+    schedule.save(staged_schedule)
+    clf.artifact_digests_ = {'route_vocab': file_digest(staged_vocab), 'schedule_features': file_digest(staged_schedule)}
+    tmp_path = f"{model_path}.tmp"
+    joblib.dump(clf, tmp_path)
+    # Memory-mappable copy for serving; records tmp_path's stat, which the rename keeps
+    export_bundle(clf, tmp_path, bundle_path(model_path), dtype=export_dtype, max_depth=export_max_depth,
+                  artifacts=clf.artifact_digests_)
+    os.replace(staged_vocab, vocab_path)
+    print(f"Route vocabulary saved to {vocab_path}")
+    os.replace(staged_schedule, schedule_path)
+    print(f"Schedule features saved to {schedule_path}")
+    os.replace(tmp_path, model_path)
     print(f"Model saved to {model_path}")
 
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            return getattr(info, 'peak_wset', info.rss) / 1024 / 1024
+        except ImportError:
+            return None
+
+class PhaseLog:
+    """Logs wall time and peak RSS for each training phase"""
+    def __init__(self):
+        self.phases = []
+
+    def run(self, name, fn, *args, **kwargs):
+        print(f"[{name}] starting...")
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        rss = peak_rss_mb()
+        self.phases.append({'phase': name, 'seconds': round(elapsed, 2), 'peak_rss_mb': round(rss, 1) if rss else None})
+        print(f"[{name}] done in {elapsed:.2f}s, peak RSS {rss:.0f} MB" if rss else f"[{name}] done in {elapsed:.2f}s")
+        return result
+
+def iter_chunks(data_path, chunk_size):
+    """Stream the dataset in DataFrame chunks (CSV, or Parquet file/directory via pyarrow)"""
+    if data_path.endswith('.parquet') or os.path.isdir(data_path):
+        import pyarrow.dataset as ds
+        for batch in ds.dataset(data_path, format='parquet').to_batches(batch_size=chunk_size):
+            chunk = batch.to_pandas()
+            chunk['route_id'] = chunk['route_id'].astype(str)
+            yield chunk
+    else:
+        yield from pd.read_csv(data_path, chunksize=chunk_size, dtype={'route_id': str})
+
+def split_masks(data_path, chunk_size, test_fraction, seed, schedule):
+    """
+    Per-chunk test-row masks, with time and schedule features added to the chunk;
+    the same seed gives the same split on every pass
+    """
+    rng = np.random.default_rng(seed)
+    for chunk in iter_chunks(data_path, chunk_size):
+        yield add_time_features(chunk, schedule), rng.random(len(chunk)) < test_fraction
+
+def scan_dataset(data_path, chunk_size, sample_size, test_fraction, seed, schedule):
+    """
+    Pass 1: category sets, scaler statistics of the observed (non-NaN) numerical
+    values (StandardScaler.partial_fit), the number of training rows, and a uniform
+    sample of at most sample_size training rows (keep the rows with the smallest
+    random keys), all in bounded memory.
+    """
+    categories = {c: set() for c in CATEGORICAL_FEATURES}
+    scaler = StandardScaler()
+    key_rng = np.random.default_rng(seed + 1)
+    sample = None
+    n_rows = n_train = 0
+    for chunk, is_test in split_masks(data_path, chunk_size, test_fraction, seed, schedule):
+        n_rows += len(chunk)
+        for c in CATEGORICAL_FEATURES:
+            categories[c].update(chunk[c].dropna().unique().tolist())
+        train = chunk.loc[~is_test, FEATURES + ['delay_minutes']]
+        scaler.partial_fit(train[NUMERICAL_FEATURES])
+        n_train += len(train)
+
+        train = train.assign(_key=key_rng.random(len(train)))
+        sample = train if sample is None else pd.concat([sample, train], ignore_index=True)
+        if len(sample) > sample_size:
+            sample = sample.nsmallest(sample_size, '_key')
+    print(f"Scanned {n_rows} rows, sampled {len(sample)} training rows")
+    return categories, scaler, n_train, sample.drop(columns='_key').reset_index(drop=True)
+
+def imputed_moments(scaler, n_rows, fill):
+    """
+    Mean and variance of every column once its missing values are imputed with `fill`:
+    the observed values' moments (partial_fit skips NaN) plus (n_rows - observed)
+    copies of the fill value.
+    """
+    observed = np.broadcast_to(np.asarray(scaler.n_samples_seen_, dtype=np.float64), fill.shape)
+    missing = n_rows - observed
+    mean_obs = np.nan_to_num(scaler.mean_) if scaler.mean_ is not None else np.zeros_like(fill)
+    var_obs = np.nan_to_num(scaler.var_) if scaler.var_ is not None else np.zeros_like(fill)
+    mean = (observed * mean_obs + missing * fill) / n_rows
+    var = (observed * (var_obs + (mean_obs - mean) ** 2) + missing * (fill - mean) ** 2) / n_rows
+    return mean, var
+
+def fit_sgd(clf, data_path, chunk_size, test_fraction, seed, route_vocab, schedule):
+    """Pass 2 (incremental learner): partial_fit on every training chunk"""
+    preprocessor, model = clf.named_steps['preprocessor'], clf.named_steps['model']
+    for chunk, is_test in split_masks(data_path, chunk_size, test_fraction, seed, schedule):
+        train = chunk.loc[~is_test]
+        X = train[FEATURES].assign(route_id=route_vocab.encode_series(train['route_id']))
+        model.partial_fit(preprocessor.transform(X), train['delay_minutes'].to_numpy())
+
+def evaluate_streaming(clf, data_path, chunk_size, test_fraction, seed, route_vocab, schedule):
+    """Final pass: MAE and R2 on the held-out rows, accumulated chunk by chunk"""
+    n = abs_err = sq_err = y_sum = y_sq_sum = 0.0
+    for chunk, is_test in split_masks(data_path, chunk_size, test_fraction, seed, schedule):
+        test = chunk.loc[is_test]
+        if test.empty:
+            continue
+        X = test[FEATURES].assign(route_id=route_vocab.encode_series(test['route_id']))
+        y = test['delay_minutes'].to_numpy()
+        residual = y - clf.predict(X)
+        n += len(y)
+        abs_err += np.abs(residual).sum()
+        sq_err += (residual ** 2).sum()
+        y_sum += y.sum()
+        y_sq_sum += (y ** 2).sum()
+    total_ss = y_sq_sum - y_sum ** 2 / n
+    return abs_err / n, 1 - sq_err / total_ss
+
+def train_model_chunked(data_path=DATA_PATH, estimator='hgb', chunk_size=200_000, sample_size=500_000,
+                        test_fraction=0.2, seed=42):
+    """
+    Out-of-core training for datasets larger than RAM.
+
+    The create_pipeline() preprocessor is fitted with fixed category lists from a
+    streaming scan. Imputer medians come from the sample; the scaler gets the exact
+    full-data statistics of the imputed values, derived from the scan's partial_fit
+    moments of the observed values and those medians. Then either:
+      estimator='hgb': HistGradientBoostingRegressor (all cores) on a memory-bounded sample
+      estimator='sgd': SGDRegressor partial_fit over every training chunk
+    The saved artifact is the same Pipeline(preprocessor, model) layout as train_model().
+    """
+    log = PhaseLog()
+    loader = GTFSLoader(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils'))
+    schedule = log.run('schedule', build_schedule, loader)
+    categories, scaler, n_train, sample = log.run('scan', scan_dataset, data_path, chunk_size, sample_size, test_fraction, seed,
+                                         schedule)
+
+    # Stable route codes: GTFS route names + whatever the training data contains
+    route_vocab = build_route_vocab(loader, CITIES, categories['route_id'])
+    print(f"Route vocabulary: {len(route_vocab)} routes")
+    category_lists = [sorted(route_vocab.index[r] for r in categories['route_id'])] + \
+                     [sorted(categories[c]) for c in CATEGORICAL_FEATURES[1:]]
+    sample['route_id'] = route_vocab.encode_series(sample['route_id'])
+
+    def fit_preprocessor():
+        preprocessor = create_pipeline(categories=category_lists, dense=estimator == 'hgb')
+        preprocessor.fit(sample[FEATURES])
+        # Replace the sample's scaler statistics with the exact full-data ones (of imputed values)
+        numeric = preprocessor.named_transformers_['num']
+        fitted = numeric.named_steps['scaler']
+        mean, var = imputed_moments(scaler, n_train, numeric.named_steps['imputer'].statistics_.astype(np.float64))
+        scale = np.sqrt(var)
+        fitted.mean_, fitted.var_, fitted.scale_ = mean, var, np.where(scale > 0, scale, 1.0)
+        fitted.n_samples_seen_ = n_train
+        return preprocessor
+    preprocessor = log.run('fit_preprocessor', fit_preprocessor)
+
+    if estimator == 'hgb':
+        model = HistGradientBoostingRegressor(max_iter=300, random_state=seed)
+        def fit_hgb():
+            X = preprocessor.transform(sample[FEATURES]).astype(np.float32)
+            model.fit(X, sample['delay_minutes'].to_numpy())
+        log.run('fit_model', fit_hgb)
+    elif estimator == 'sgd':
+        model = SGDRegressor(random_state=seed)
+    else:
+        raise ValueError(f"Unknown estimator: {estimator}")
+
+    clf = Pipeline(steps=[('preprocessor', preprocessor),
+                          ('model', model)])
+    # The sample is no longer needed; free it before the streaming passes
+    del sample
+    if estimator == 'sgd':
+        log.run('fit_model', fit_sgd, clf, data_path, chunk_size, test_fraction, seed, route_vocab, schedule)
+
+    mae, r2 = log.run('evaluate', evaluate_streaming, clf, data_path, chunk_size, test_fraction, seed, route_vocab,
+                      schedule)
+    print(f"MAE: {mae}")
+    print(f"R2 Score: {r2}")
+
+    log.run('save', save_model, clf, route_vocab, schedule)
+    for phase in log.phases:
+        print(f"  {phase['phase']:18s} {phase['seconds']:8.2f}s  peak RSS {phase['peak_rss_mb']} MB")
+    return log.phases
+
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the delay prediction model")
+    parser.add_argument('--chunked', action='store_true', help="Stream the dataset instead of loading it into memory")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--estimator', choices=['hgb', 'sgd'], default='hgb')
+    parser.add_argument('--chunk-size', type=int, default=200_000)
+    parser.add_argument('--sample-size', type=int, default=500_000)
+    parser.add_argument('--export-float32', action='store_true',
+                        help="Store the served forest's thresholds and leaf values as float32")
+    parser.add_argument('--export-max-depth', type=int, help='Cut the served forest at this depth')
+    args = parser.parse_args()
+    if args.chunked:
+        train_model_chunked(args.data, args.estimator, args.chunk_size, args.sample_size)
+    else:
+        train_model(np.float32 if args.export_float32 else np.float64, args.export_max_depth)
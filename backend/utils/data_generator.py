@@ -1,119 +1,205 @@
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
+import argparse
 import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-from gtfs_loader import GTFSLoader
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.gtfs_loader import GTFSLoader
 
-def generate_data(num_samples=5000):
-    print(f"Generating {num_samples} samples...")
-    
+DAYS = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+WEATHER_CONDITIONS = np.array(['Clear', 'Rain', 'Snow', 'Fog'], dtype=object)
+WEATHER_WEIGHTS = [0.6, 0.25, 0.1, 0.05]
+EVENT_TYPES = np.array(['None', 'Sports', 'Concert', 'Festival'], dtype=object)
+EVENT_WEIGHTS = [0.8, 0.1, 0.05, 0.05]
+
+# Per weather condition (same order as WEATHER_CONDITIONS): inclusive temperature range
+TEMP_LOW = np.array([10, 5, -10, 0])
+TEMP_HIGH = np.array([35, 25, 2, 15])
+# Precipitation range (mm); Clear and Fog have none
+PRECIP_LOW = np.array([0.0, 1.0, 0.5, 0.0])
+PRECIP_HIGH = np.array([0.0, 50.0, 20.0, 0.0])
+# Delay minutes per mm of precipitation
+PRECIP_DELAY = np.array([0.0, 0.5, 1.5, 0.0])
+
+# "HH:MM" for every minute of the day, indexed by hour * 60 + minute
+TIME_STRINGS = np.array([f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)], dtype=object)
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'raw', 'transit_data.csv')
+
+
+def load_routes():
     # Load GTFS Routes
     base_dir = os.path.dirname(os.path.abspath(__file__))
     loader = GTFSLoader(base_dir)
-    
+
     # Combine routes from both cities for training
     real_routes = []
     if loader.load_data('hyderabad'):
         real_routes.extend([r['route_short_name'] for r in loader.get_routes()])
     if loader.load_data('karnataka'):
         real_routes.extend([r['route_short_name'] for r in loader.get_routes()])
-    
+
     if not real_routes:
         print("Warning: No GTFS routes found. Using synthetic IDs.")
-        routes = ['R001', 'R002', 'R003', 'R004', 'R005']
-    else:
-        # Sample a subset if too many, or use all
-        routes = real_routes[:100] if len(real_routes) > 100 else real_routes
+        return ['R001', 'R002', 'R003', 'R004', 'R005']
+    # Sample a subset if too many, or use all
+    return real_routes[:100] if len(real_routes) > 100 else real_routes
+
+
+def generate_chunk(rng, routes, n):
+    """
+    Generate n samples with the same distributions as the original per-row generator,
+    using vectorised draws from a numpy Generator.
+    """
+    routes = np.array([str(r) for r in routes], dtype=object) # Ensure string
+    # Route Specific (Mocking route factor based on ID length)
+    route_factors = np.array([(len(r) % 5) * 0.1 + 0.8 for r in routes])
+
+    # 1. Basic Spatio-Temporal
+    route_idx = rng.integers(0, len(routes), n)
+    day_idx = rng.integers(0, len(DAYS), n)
+    # Random time between 06:00 and 23:59
+    hour = rng.integers(6, 24, n)
+    minute = rng.integers(0, 60, n)
+
+    # 2. Weather Generation
+    condition = rng.choice(len(WEATHER_CONDITIONS), size=n, p=WEATHER_WEIGHTS)
+    temp = rng.integers(TEMP_LOW[condition], TEMP_HIGH[condition] + 1)
+    precip = np.round(rng.uniform(PRECIP_LOW[condition], PRECIP_HIGH[condition]), 1)
+
+    # 3. Event Generation
+    event = rng.choice(len(EVENT_TYPES), size=n, p=EVENT_WEIGHTS)
+    attendance = np.where(event != 0, rng.integers(500, 50001, n), 0)
+
+    # 4. Traffic / Operational Factors
+    traffic_factor = rng.uniform(0.8, 1.5, n)
+    rush_hour = ((hour >= 7) & (hour <= 9)) | ((hour >= 16) & (hour <= 19))
+    traffic_factor += np.where(rush_hour, 0.5, 0.0)
 
+    # 5. Calculate Delay
+    base_delay = rng.uniform(0, 5, n)
+    weather_delay = precip * PRECIP_DELAY[condition]
+    fog = condition == 3
+    weather_delay[fog] = rng.uniform(2, 10, int(fog.sum()))
+    event_delay = (attendance / 1000) * 0.8
+
+    total_delay = (base_delay + weather_delay + event_delay) * traffic_factor * route_factors[route_idx]
+    total_delay += rng.normal(0, 2, n)
+    total_delay = np.maximum(0, np.round(total_delay, 2))
+
+    return pd.DataFrame({
+        'route_id': routes[route_idx],
+        'day_of_week': DAYS[day_idx],
+        'time_of_day': TIME_STRINGS[hour * 60 + minute],
+        'weather_condition': WEATHER_CONDITIONS[condition],
+        'temperature_c': temp,
+        'precipitation_mm': precip,
+        'event_type': EVENT_TYPES[event],
+        'event_attendance': attendance,
+        'traffic_factor': np.round(traffic_factor, 2),
+        'delay_minutes': total_delay
+    })
+
+
+def write_shard(seed_seq, routes, num_samples, output_path, fmt, chunk_size, append=False):
+    """Generate num_samples rows chunk by chunk, appending each chunk to output_path"""
+    rng = np.random.default_rng(seed_seq)
+    writer = None
+    written = 0
+    try:
+        while written < num_samples:
+            n = min(chunk_size, num_samples - written)
+            chunk = generate_chunk(rng, routes, n)
+            if fmt == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+            else:
+                first = written == 0 and not append
+                chunk.to_csv(output_path, mode='w' if first else 'a', header=first, index=False)
+            written += n
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def generate_data(num_samples=5000, output_path=None, chunk_size=500_000, seed=None, workers=1, fmt='csv', append=False):
+    """
+    Generate the synthetic training set and stream it to disk chunk by chunk,
+    so memory use is bounded by chunk_size rather than num_samples.
+
+    workers > 1 splits the rows into shards generated in a process pool; each
+    shard has its own seeded generator (SeedSequence.spawn), so a given
+    (seed, workers) pair always reproduces the same data.
+    fmt='parquet' needs pyarrow; with several workers the output is a directory of part files.
+    append=True adds the rows to an existing CSV instead of replacing it (new
+    training data arriving; see delay_stats.py for the incremental aggregates).
+    """
+    print(f"Generating {num_samples} samples...")
+    output_path = output_path or DEFAULT_OUTPUT
+    if fmt == 'parquet' and output_path.endswith('.csv'):
+        output_path = output_path[:-4] + '.parquet'
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if append and (fmt != 'csv' or not os.path.exists(output_path)):
+        print("Nothing to append to (append needs an existing CSV); writing a new file")
+        append = False
+
+    routes = load_routes()
     print(f"Using {len(routes)} routes for data generation.")
 
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    weather_conditions = ['Clear', 'Rain', 'Snow', 'Fog']
-    event_types = ['None', 'Sports', 'Concert', 'Festival']
-    
-    data = []
-    
-    for _ in range(num_samples):
-        # 1. Basic Spatio-Temporal
-        route = str(random.choice(routes)) # Ensure string
-        day = random.choice(days)
-        # Random time between 06:00 and 23:00
-        hour = random.randint(6, 23)
-        minute = random.randint(0, 59)
-        time_of_day = f"{hour:02d}:{minute:02d}"
-        
-        # 2. Weather Generation
-        condition = random.choices(weather_conditions, weights=[0.6, 0.25, 0.1, 0.05])[0]
-        
-        if condition == 'Clear':
-            temp = random.randint(10, 35)
-            precip = 0
-        elif condition == 'Rain':
-            temp = random.randint(5, 25)
-            precip = round(random.uniform(1.0, 50.0), 1)
-        elif condition == 'Snow':
-            temp = random.randint(-10, 2)
-            precip = round(random.uniform(0.5, 20.0), 1)
-        else: # Fog
-            temp = random.randint(0, 15)
-            precip = 0
-            
-        # 3. Event Generation
-        event = random.choices(event_types, weights=[0.8, 0.1, 0.05, 0.05])[0]
-        attendance = 0
-        if event != 'None':
-            attendance = random.randint(500, 50000)
-            
-        # 4. Traffic / Operational Factors
-        traffic_factor = random.uniform(0.8, 1.5)
-        if 7 <= hour <= 9 or 16 <= hour <= 19: # Rush hour
-            traffic_factor += 0.5
-            
-        # 5. Calculate Delay
-        base_delay = random.uniform(0, 5) 
-        
-        weather_delay = 0
-        if condition == 'Rain':
-            weather_delay = precip * 0.5
-        elif condition == 'Snow':
-            weather_delay = precip * 1.5
-        elif condition == 'Fog':
-            weather_delay = random.uniform(2, 10)
-            
-        event_delay = 0
-        if event != 'None':
-            event_delay = (attendance / 1000) * 0.8
-            
-        # Route Specific (Mocking route factor based on ID hash/length)
-        route_factor = (len(route) % 5) * 0.1 + 0.8 
-        
-        total_delay = (base_delay + weather_delay + event_delay) * traffic_factor * route_factor
-        
-        total_delay += np.random.normal(0, 2)
-        total_delay = max(0, round(total_delay, 2)) 
-        
-        data.append({
-            'route_id': route,
-            'day_of_week': day,
-            'time_of_day': time_of_day,
-            'weather_condition': condition,
-            'temperature_c': temp,
-            'precipitation_mm': precip,
-            'event_type': event,
-            'event_attendance': attendance,
-            'traffic_factor': round(traffic_factor, 2),
-            'delay_minutes': total_delay
-        })
-        
-    df = pd.DataFrame(data)
-    
-    # Save
-    output_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'raw', 'transit_data.csv')
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_csv(output_path, index=False)
+    start = time.perf_counter()
+    workers = max(1, min(workers, num_samples))
+    shard_sizes = [num_samples // workers + (1 if i < num_samples % workers else 0) for i in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+
+    if workers == 1:
+        write_shard(seeds[0], routes, num_samples, output_path, fmt, chunk_size, append)
+    else:
+        if fmt == 'parquet':
+            shutil.rmtree(output_path, ignore_errors=True)
+            os.makedirs(output_path)
+            part_paths = [os.path.join(output_path, f"part-{i:04d}.parquet") for i in range(workers)]
+        else:
+            part_paths = [f"{output_path}.part{i:04d}" for i in range(workers)]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(write_shard, seeds[i], routes, shard_sizes[i], part_paths[i], fmt, chunk_size)
+                       for i in range(workers)]
+            for future in futures:
+                future.result()
+
+        if fmt != 'parquet':
+            # Stitch the CSV parts together, keeping only the first header
+            with open(output_path, 'ab' if append else 'wb') as out:
+                for i, part in enumerate(part_paths):
+                    with open(part, 'rb') as f:
+                        if i > 0 or append:
+                            f.readline()
+                        shutil.copyfileobj(f, out)
+                    os.remove(part)
+
+    elapsed = time.perf_counter() - start
     print(f"Data saved to {output_path}")
+    print(f"Generated {num_samples} rows in {elapsed:.2f}s ({num_samples / elapsed:,.0f} rows/sec)")
+    return output_path
+
 
 if __name__ == "__main__":
-    generate_data()
+    parser = argparse.ArgumentParser(description="Generate synthetic transit delay data")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--chunk-size', type=int, default=500_000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--append', action='store_true', help='Append to an existing CSV instead of replacing it')
+    args = parser.parse_args()
+    generate_data(args.rows, args.output, args.chunk_size, args.seed, args.workers, args.format, args.append)
@@ -0,0 +1,372 @@
+"""
+Materialized delay statistics over the training data.
+
+Rows are reduced in one groupby pass to a table with one row per
+(route_id, day_of_week, hour, weather_condition) cell holding count, sum,
+sum of squares, min and max of delay_minutes. These are mergeable: the stats
+of appended rows fold into the table with another groupby, so the raw CSV is
+never re-read. Any coarser view (per route, per hour of one route in the rain,
+...) is a filter plus a sum over this small table.
+
+The table is saved as an .npz (key columns dictionary-encoded) together with
+how far into the CSV it has consumed; update_from_csv() then only parses the
+bytes appended since. A CSV that shrank, whose header changed or whose already
+consumed bytes no longer match their fingerprint (the file was regenerated rather
+than appended to) is rebuilt from scratch.
+
+    python backend/utils/delay_stats.py [--data data/raw/transit_data.csv] [--output ...] [--rebuild]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+KEYS = ['route_id', 'day_of_week', 'hour', 'weather_condition']
+METRICS = ['count', 'sum', 'sum_sq', 'min', 'max']
+# Short names accepted by query(group_by=...) and the API
+DIMENSIONS = {'route': 'route_id', 'day': 'day_of_week', 'hour': 'hour', 'weather': 'weather_condition'}
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'raw', 'transit_data.csv')
+STATS_PATH = os.path.join(PROJECT_ROOT, 'data', 'processed', 'delay_stats.npz')
+
+# Bytes of CSV parsed at a time when catching up
+BLOCK_SIZE = 64 * 1024 * 1024
+# Bytes hashed at each end of the consumed prefix to notice a regenerated CSV
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def empty_table():
+    return pd.DataFrame({
+        'route_id': pd.Series(dtype=object), 'day_of_week': pd.Series(dtype=object),
+        'hour': pd.Series(dtype=np.int8), 'weather_condition': pd.Series(dtype=object),
+        'count': pd.Series(dtype=np.int64), 'sum': pd.Series(dtype=np.float64),
+        'sum_sq': pd.Series(dtype=np.float64), 'min': pd.Series(dtype=np.float64),
+        'max': pd.Series(dtype=np.float64),
+    })
+
+
+def aggregate_rows(df):
+    """Raw training rows -> stats table, in one groupby pass; rows whose time_of_day has no valid hour are left out"""
+    if len(df) == 0:
+        return empty_table()
+    hour = pd.to_numeric(df['time_of_day'].astype(str).str.slice(0, 2), errors='coerce').to_numpy(dtype=np.float64)
+    valid = (hour >= 0) & (hour <= 23)
+    if not valid.all():
+        df, hour = df[valid], hour[valid]
+    delay = df['delay_minutes'].to_numpy(dtype=np.float64)
+    frame = pd.DataFrame({
+        'route_id': df['route_id'].astype(str).to_numpy(),
+        'day_of_week': df['day_of_week'].astype(str).to_numpy(),
+        'hour': hour.astype(np.int8),
+        'weather_condition': df['weather_condition'].astype(str).to_numpy(),
+        'delay': delay,
+        'delay_sq': delay * delay,
+    })
+    table = frame.groupby(KEYS, sort=False).agg(
+        count=('delay', 'size'), sum=('delay', 'sum'), sum_sq=('delay_sq', 'sum'),
+        min=('delay', 'min'), max=('delay', 'max'))
+    return table.reset_index()
+
+
+def merge_tables(*tables):
+    """Fold several stats tables into one"""
+    tables = [t for t in tables if len(t)]
+    if not tables:
+        return empty_table()
+    if len(tables) == 1:
+        return tables[0]
+    table = pd.concat(tables, ignore_index=True).groupby(KEYS, sort=False).agg(
+        {'count': 'sum', 'sum': 'sum', 'sum_sq': 'sum', 'min': 'min', 'max': 'max'})
+    return table.reset_index()
+
+
+def summarize(count, total, sum_sq, low, high):
+    """Sufficient statistics -> the numbers the API reports"""
+    count = int(count)
+    if count == 0:
+        return {'count': 0, 'avg_delay': None, 'std_delay': None, 'min_delay': None, 'max_delay': None}
+    mean = total / count
+    # Sample standard deviation, as pandas reports it
+    variance = max(sum_sq - count * mean * mean, 0.0) / (count - 1) if count > 1 else 0.0
+    return {
+        'count': count,
+        'avg_delay': round(float(mean), 2),
+        'std_delay': round(float(np.sqrt(variance)), 2),
+        'min_delay': round(float(low), 2),
+        'max_delay': round(float(high), 2),
+    }
+
+
+def as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set, np.ndarray)):
+        return list(value)
+    return [value]
+
+
+def prefix_fingerprint(f, end):
+    """Hash of the first and last FINGERPRINT_BYTES of f[:end] (and end itself)"""
+    digest = hashlib.sha256(str(end).encode())
+    f.seek(0)
+    digest.update(f.read(min(end, FINGERPRINT_BYTES)))
+    start = max(0, end - FINGERPRINT_BYTES)
+    f.seek(start)
+    digest.update(f.read(end - start))
+    return digest.hexdigest()
+
+
+class DelayStats:
+    def __init__(self, table=None, source=None):
+        self.table = table if table is not None else empty_table()
+        # How much of which CSV the table covers: {path, header, bytes, rows, skipped, mtime_ns, fingerprint}
+        self.source = source or {'path': None, 'header': None, 'bytes': 0, 'rows': 0, 'mtime_ns': None}
+        self._encoded = None
+
+    @property
+    def rows(self):
+        return int(self.source.get('rows', 0))
+
+    @property
+    def skipped(self):
+        return int(self.source.get('skipped', 0))
+
+    def add_rows(self, df):
+        table = aggregate_rows(df)
+        self.table = merge_tables(self.table, table)
+        self.source['rows'] = self.rows + len(df)
+        self.source['skipped'] = self.skipped + len(df) - int(table['count'].sum())
+
+    def update_from_csv(self, path, rebuild=False):
+        """Fold rows appended to `path` since the last update into the table; returns rows added"""
+        path = os.path.abspath(path)
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.readline()
+            header_text = header.decode('utf-8-sig').strip()
+            stale = (rebuild or self.source.get('path') != path or self.source.get('header') != header_text
+                     or size < self.source.get('bytes', 0)
+                     or self.source.get('fingerprint') != prefix_fingerprint(f, self.source.get('bytes', 0)))
+            if stale:
+                self.table = empty_table()
+                self.source = {'path': path, 'header': header_text, 'bytes': len(header), 'rows': 0}
+            elif size == self.source['bytes']:
+                return 0
+
+            names = header_text.split(',')
+            offset = self.source['bytes']
+            f.seek(offset)
+            added = 0
+            partial = b''
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                data = partial + block
+                # A writer may be mid-row: only parse up to the last complete line
+                cut = data.rfind(b'\n') + 1
+                partial = data[cut:]
+                if cut:
+                    chunk = pd.read_csv(io.BytesIO(data[:cut]), names=names, header=None,
+                                        dtype={'route_id': str}, index_col=False)
+                    self.add_rows(chunk)
+                    added += len(chunk)
+                    offset += cut
+            self.source['bytes'] = offset
+            self.source['mtime_ns'] = os.stat(path).st_mtime_ns
+            self.source['fingerprint'] = prefix_fingerprint(f, offset)
+        return added
+
+    def encoded(self):
+        """
+        Per key column: int32 codes and their values, in display order (days
+        Monday first, the rest sorted), plus the metric columns as arrays.
+        Built once per table version; queries work on these, not on strings.
+        """
+        if self._encoded is None or self._encoded[0] is not self.table:
+            columns = {}
+            for column in KEYS:
+                values = self.table[column]
+                if column == 'day_of_week':
+                    present = set(values)
+                    categories = [d for d in DAY_ORDER if d in present] + sorted(present - set(DAY_ORDER))
+                    codes = pd.Categorical(values, categories=categories).codes
+                else:
+                    codes, categories = pd.factorize(values, sort=True)
+                columns[column] = (codes.astype(np.int32), np.asarray(categories, dtype=object))
+            metrics = {m: self.table[m].to_numpy() for m in METRICS}
+            self._encoded = (self.table, columns, metrics)
+        return self._encoded[1], self._encoded[2]
+
+    def query(self, route_id=None, day_of_week=None, hour=None, weather_condition=None,
+              group_by=(), sort='key', limit=None):
+        """
+        Delay stats over the cells matching every given filter (each a value or
+        a list of values). group_by: dimension names (route, day, hour, weather)
+        to break the result down by; sort: 'key', 'avg_delay' or 'count'
+        (the latter two descending); limit caps the number of groups.
+        """
+        columns, metrics = self.encoded()
+        mask = np.ones(len(self.table), dtype=bool)
+        filters = {'route_id': as_list(route_id), 'day_of_week': as_list(day_of_week),
+                   'hour': as_list(hour), 'weather_condition': as_list(weather_condition)}
+        for column, values in filters.items():
+            if values is not None:
+                codes, categories = columns[column]
+                wanted = [int(v) for v in values] if column == 'hour' else [str(v) for v in values]
+                mask &= np.isin(codes, np.flatnonzero(pd.Index(categories).isin(wanted)))
+
+        count, total, sum_sq = (metrics[m][mask] for m in ('count', 'sum', 'sum_sq'))
+        low, high = metrics['min'][mask], metrics['max'][mask]
+        result = dict(summarize(count.sum(), total.sum(), sum_sq.sum(),
+                                low.min() if len(low) else 0, high.max() if len(high) else 0), groups=[])
+        group_columns = [DIMENSIONS[g] for g in group_by]
+        if not group_columns or not mask.any():
+            return result
+
+        # One integer key per cell; sorting by it puts each group in a contiguous run, in key order
+        sizes = [len(columns[c][1]) for c in group_columns]
+        key = np.ravel_multi_index([columns[c][0][mask] for c in group_columns], sizes)
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        g_count = np.add.reduceat(count[order], starts)
+        g_sum = np.add.reduceat(total[order], starts)
+        g_sum_sq = np.add.reduceat(sum_sq[order], starts)
+        g_min = np.minimum.reduceat(low[order], starts)
+        g_max = np.maximum.reduceat(high[order], starts)
+        group_codes = np.unravel_index(key[starts], sizes)
+
+        groups = np.arange(len(starts))
+        if sort == 'avg_delay':
+            groups = np.argsort(-(g_sum / g_count), kind='stable')
+        elif sort == 'count':
+            groups = np.argsort(-g_count, kind='stable')
+        if limit:
+            groups = groups[:limit]
+
+        for g in groups.tolist():
+            group = {}
+            for column, codes in zip(group_columns, group_codes):
+                value = columns[column][1][codes[g]]
+                group[column] = int(value) if column == 'hour' else value
+            group.update(summarize(g_count[g], g_sum[g], g_sum_sq[g], g_min[g], g_max[g]))
+            result['groups'].append(group)
+        return result
+
+    def values(self, dimension):
+        """Distinct values of a dimension, e.g. for filter dropdowns"""
+        columns, _ = self.encoded()
+        column = DIMENSIONS.get(dimension, dimension)
+        values = columns[column][1].tolist()
+        return [int(v) for v in values] if column == 'hour' else values
+
+    def save(self, path):
+        """Atomic write: key columns as int32 codes + categories, metrics as arrays"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {}
+        for column in ['route_id', 'day_of_week', 'weather_condition']:
+            codes, categories = pd.factorize(self.table[column])
+            arrays[f'{column}_codes'] = codes.astype(np.int32)
+            arrays[f'{column}_values'] = np.asarray(categories, dtype=str)
+        arrays['hour'] = self.table['hour'].to_numpy(dtype=np.int8)
+        arrays['count'] = self.table['count'].to_numpy(dtype=np.int64)
+        for column in ['sum', 'sum_sq', 'min', 'max']:
+            arrays[column] = self.table[column].to_numpy(dtype=np.float64)
+        arrays['source'] = np.array(json.dumps(self.source))
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            table = pd.DataFrame({
+                column: data[f'{column}_values'].astype(object)[data[f'{column}_codes']]
+                if column != 'hour' else data['hour']
+                for column in KEYS
+            })
+            for column in METRICS:
+                table[column] = data[column]
+            source = json.loads(str(data['source']))
+        return cls(table, source)
+
+
+class StatsStore:
+    """
+    The current DelayStats for a CSV, shared by request threads. get() checks
+    the CSV at most every refresh_interval seconds and folds in appended rows,
+    saving the table so the next process starts from it.
+    """
+
+    def __init__(self, data_path=DATA_PATH, stats_path=STATS_PATH, refresh_interval=30.0):
+        self.data_path = data_path
+        self.stats_path = stats_path
+        self.refresh_interval = refresh_interval
+        self.stats = None
+        self.checked_at = 0.0
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self.stats is not None and now - self.checked_at < self.refresh_interval:
+            return self.stats
+        with self._lock:
+            if self.stats is not None and now - self.checked_at < self.refresh_interval:
+                return self.stats
+            self.checked_at = now
+            stats = self.stats
+            if stats is None and os.path.exists(self.stats_path):
+                try:
+                    stats = DelayStats.load(self.stats_path)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Delay stats at {self.stats_path} unreadable, rebuilding: {e}")
+            if stats is None:
+                stats = DelayStats()
+            if os.path.exists(self.data_path) and self.csv_changed(stats):
+                # Update a copy so readers never see a half-merged table
+                updated = DelayStats(stats.table, dict(stats.source))
+                start = time.perf_counter()
+                added = updated.update_from_csv(self.data_path)
+                print(f"Delay stats: folded in {added} rows in {time.perf_counter() - start:.2f}s "
+                      f"({updated.rows} rows, {updated.skipped} skipped, {len(updated.table)} cells)")
+                try:
+                    updated.save(self.stats_path)
+                except OSError as e:
+                    print(f"Could not save delay stats: {e}")
+                stats = updated
+                self.updated_at = time.time()
+            self.stats = stats
+            return stats
+
+    def csv_changed(self, stats):
+        st = os.stat(self.data_path)
+        source = stats.source
+        return (source.get('path') != os.path.abspath(self.data_path) or source.get('bytes') != st.st_size
+                or source.get('mtime_ns') != st.st_mtime_ns)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or update the materialized delay statistics")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--output', default=STATS_PATH)
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the existing table and re-read the whole CSV')
+    args = parser.parse_args()
+
+    stats = DelayStats()
+    if os.path.exists(args.output) and not args.rebuild:
+        stats = DelayStats.load(args.output)
+    start = time.perf_counter()
+    added = stats.update_from_csv(args.data, rebuild=args.rebuild)
+    stats.save(args.output)
+    print(f"Folded in {added} rows in {time.perf_counter() - start:.2f}s; "
+          f"{stats.rows} rows ({stats.skipped} skipped) -> {len(stats.table)} cells saved to {args.output}")
@@ -0,0 +1,171 @@
+"""
+Fast-path inference for the fitted delay_predictor.pkl pipeline.
+
+At model-load time the fitted ColumnTransformer from model/pipeline.py is
+compiled into plain lookup tables:
+  - numeric columns: imputer medians, scaler mean/scale arrays
+  - categorical columns: {category: output column} dicts for the one-hot blocks
+Requests then write straight into a preallocated feature buffer and
+the forest's trees are evaluated directly, skipping DataFrame construction,
+ColumnTransformer dispatch and sparse-matrix conversion.
+
+Predictions are identical to pipeline.predict(): the same float64 arithmetic
+is applied before the cast to float32 that the forest does itself, and tree
+outputs are summed in the same order.
+"""
+import threading
+
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+class CompiledPipeline:
+    """
+    Lookup-table version of a fitted Pipeline([('preprocessor', ColumnTransformer), ('model', ...)]).
+    The model is either a fitted estimator or a FlatForest (see flat_forest.py).
+    """
+
+    def __init__(self, preprocessor, estimator=None, forest=None):
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise ValueError('Expected a fitted ColumnTransformer preprocessor')
+        if (estimator is None) == (forest is None):
+            raise ValueError('Pass exactly one of estimator or forest')
+        self.estimator = estimator
+        self.forest = forest
+
+        self.num_columns = []
+        self.num_positions = []
+        num_fill, num_mean, num_scale = [], [], []
+        # (input column, missing fill value, {category: output column})
+        self.cat_columns = []
+
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == 'remainder':
+                if transformer != 'drop':
+                    raise ValueError('Only remainder="drop" is supported')
+                continue
+            out = preprocessor.output_indices_[name]
+            steps = [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+            imputer = next((s for s in steps if isinstance(s, SimpleImputer)), None)
+            scaler = next((s for s in steps if isinstance(s, StandardScaler)), None)
+            encoder = next((s for s in steps if isinstance(s, OneHotEncoder)), None)
+            if len(steps) != sum(s is not None for s in (imputer, scaler, encoder)):
+                raise ValueError(f'Unsupported step in transformer "{name}"')
+            if imputer is not None and not _is_missing(imputer.missing_values):
+                raise ValueError('Only NaN missing_values are supported')
+
+            if encoder is None:
+                fills = imputer.statistics_ if imputer is not None else np.full(len(columns), np.nan)
+                means = scaler.mean_ if scaler is not None and scaler.mean_ is not None else np.zeros(len(columns))
+                scales = scaler.scale_ if scaler is not None and scaler.scale_ is not None else np.ones(len(columns))
+                for i, column in enumerate(columns):
+                    self.num_columns.append(column)
+                    self.num_positions.append(out.start + i)
+                    num_fill.append(fills[i])
+                    num_mean.append(means[i] if scaler is None or scaler.with_mean else 0.0)
+                    num_scale.append(scales[i] if scaler is None or scaler.with_std else 1.0)
+            else:
+                if encoder.drop_idx_ is not None or getattr(encoder, '_infrequent_enabled', False):
+                    raise ValueError('OneHotEncoder drop/infrequent categories are not supported')
+                if encoder.handle_unknown not in ('ignore', 'infrequent_if_exist'):
+                    raise ValueError('OneHotEncoder must use handle_unknown="ignore"')
+                offset = out.start
+                for i, column in enumerate(columns):
+                    categories = encoder.categories_[i].tolist()
+                    lookup = {category: offset + j for j, category in enumerate(categories)}
+                    fill = imputer.statistics_[i] if imputer is not None else None
+                    self.cat_columns.append((column, fill, lookup))
+                    offset += len(categories)
+
+        self.num_positions = np.array(self.num_positions, dtype=np.intp)
+        self.num_fill = np.array(num_fill, dtype=np.float64)
+        self.num_mean = np.array(num_mean, dtype=np.float64)
+        self.num_scale = np.array(num_scale, dtype=np.float64)
+        self.n_features = max(s.stop for s in preprocessor.output_indices_.values())
+
+        # Forests are scored tree by tree, exactly as ForestRegressor.predict does internally.
+        # Trees split on float32, other estimators get the float64 matrix the pipeline would produce.
+        self.trees = None
+        if forest is not None:
+            self.dtype = np.float32
+        elif isinstance(estimator, (RandomForestRegressor, ExtraTreesRegressor)):
+            self.trees = list(estimator.estimators_)
+            self.dtype = np.float32
+        else:
+            self.dtype = np.float64
+
+        self._local = threading.local()
+
+    def _buffer(self, n_rows):
+        """Per-thread feature buffer, grown on demand"""
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None or buf.shape[0] < n_rows:
+            buf = np.empty((max(n_rows, 1), self.n_features), dtype=self.dtype)
+            self._local.buffer = buf
+        return buf[:n_rows]
+
+    def transform(self, rows, out=None):
+        """Encode a list of feature dicts into a (n_rows, n_features) matrix"""
+        n_rows = len(rows)
+        X = self._buffer(n_rows) if out is None else out
+        X.fill(0.0)
+
+        if len(self.num_positions):
+            num = np.array([[row.get(c) for c in self.num_columns] for row in rows], dtype=np.float64)
+            missing = np.isnan(num)
+            if missing.any():
+                num = np.where(missing, self.num_fill, num)
+            X[:, self.num_positions] = (num - self.num_mean) / self.num_scale
+
+        for column, fill, lookup in self.cat_columns:
+            for i, row in enumerate(rows):
+                value = row.get(column)
+                if _is_missing(value):
+                    value = fill
+                position = lookup.get(value)
+                if position is not None:
+                    X[i, position] = 1.0
+        return X
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        if len(pipeline.steps) != 2:
+            raise ValueError('Expected Pipeline(preprocessor=ColumnTransformer, model=estimator)')
+        return cls(pipeline.steps[0][1], estimator=pipeline.steps[-1][1])
+
+    def predict_matrix(self, X):
+        if self.forest is not None:
+            return self.forest.predict(X)
+        if self.trees is None:
+            return self.estimator.predict(X)
+        total = np.zeros(X.shape[0] if self.estimator.n_outputs_ == 1 else (X.shape[0], self.estimator.n_outputs_))
+        for tree in self.trees:
+            total += tree.predict(X, check_input=False)
+        total /= len(self.trees)
+        return total
+
+    def predict(self, rows):
+        """Predict a list of feature dicts (as built by utils.features.build_model_input)"""
+        if not rows:
+            return np.zeros(0)
+        return self.predict_matrix(self.transform(rows))
+
+    def predict_one(self, row):
+        return float(self.predict([row])[0])
+
+
+def compile_pipeline(pipeline):
+    """Compile a fitted pipeline, or return None if it uses steps the fast path doesn't handle"""
+    try:
+        return CompiledPipeline.from_pipeline(pipeline)
+    except (ValueError, AttributeError, TypeError) as e:
+        print(f"Fast inference unavailable, using sklearn pipeline: {e}")
+        return None
@@ -0,0 +1,122 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.route_vocab import UNKNOWN_ROUTE
+from utils.schedule_features import BUCKET_MINUTES, SCHEDULE_COLUMNS
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Hours (of any day) counted as rush hour, as in utils/data_generator.py
+RUSH_HOURS = [7, 8, 9, 16, 17, 18, 19]
+TIME_COLUMNS = ['hour', 'time_bucket', 'is_rush_hour']
+
+# Columns the trained pipeline expects, in order (see model/pipeline.py)
+FEATURE_COLUMNS = ['route_id', 'day_of_week', 'weather_condition', 'event_type',
+                   'temperature_c', 'precipitation_mm', 'event_attendance', 'traffic_factor'] \
+    + TIME_COLUMNS + SCHEDULE_COLUMNS
+
+
+def parse_time_of_day(value):
+    """'HH:MM' (or 'HH:MM:SS') -> minutes since midnight, None if absent. Raises ValueError if malformed."""
+    if value is None or value == '':
+        return None
+    parts = str(value).split(':')
+    hours, minutes = int(parts[0]), int(parts[1]) if len(parts) > 1 else -1
+    if not (0 <= hours < 48 and 0 <= minutes < 60):
+        raise ValueError(f"time_of_day must be HH:MM, got {value!r}")
+    return (hours * 60 + minutes) % (24 * 60)
+
+
+def time_features(minutes):
+    """Time-of-day feature values for minutes since midnight (None -> all NaN)"""
+    if minutes is None:
+        return [float('nan')] * len(TIME_COLUMNS)
+    hour = minutes // 60
+    return [float(hour), float(minutes // BUCKET_MINUTES), float(hour in RUSH_HOURS)]
+
+
+def add_time_features(frame, schedule=None):
+    """
+    Vectorised time-of-day and schedule features for a training frame with a
+    'time_of_day' column and raw route names in 'route_id' (encode routes afterwards).
+    Same values as build_model_input; malformed or missing times become NaN.
+    """
+    parts = frame['time_of_day'].astype('string').str.split(':', expand=True)
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    minutes = pd.to_numeric(parts[1], errors='coerce') if parts.shape[1] > 1 else np.nan
+    valid = (hours >= 0) & (hours < 48) & (minutes >= 0) & (minutes < 60) \
+        & (hours == np.floor(hours)) & (minutes == np.floor(minutes))
+    minutes = ((hours * 60 + minutes) % (24 * 60)).where(valid).to_numpy(dtype=np.float64, na_value=np.nan)
+
+    hour = np.floor(minutes / 60)
+    bucket = np.floor(minutes / BUCKET_MINUTES)
+    columns = {
+        'hour': hour,
+        'time_bucket': bucket,
+        'is_rush_hour': np.where(np.isnan(hour), np.nan, np.isin(hour, RUSH_HOURS)),
+    }
+    if schedule is not None:
+        values = schedule.lookup(schedule.rows(frame['route_id']), bucket)
+    else:
+        values = np.full((len(frame), len(SCHEDULE_COLUMNS)), np.nan)
+    columns.update(zip(SCHEDULE_COLUMNS, values.T))
+    return frame.assign(**columns)
+
+
+def categorical(data, name, default):
+    """A categorical request field, which must be a string"""
+    value = data.get(name, default)
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string, got {type(value).__name__}")
+    return value
+
+
+def build_model_input(data, route_vocab=None, schedule=None):
+    """
+    Build the model feature dict for one request payload.
+    route_vocab and schedule are the RouteVocab and ScheduleFeatures saved with the
+    model; without them every route is unknown.
+    Raises ValueError/TypeError on malformed input.
+    """
+    # Stable integer code for the route, identical in every worker and to training
+    if route_vocab is not None:
+        route_id = route_vocab.encode(data.get('route_id', ''), data.get('city'))
+    else:
+        route_id = UNKNOWN_ROUTE
+
+    # Calculate day_of_week from date if provided
+    if 'date' in data:
+        date_obj = datetime.strptime(data['date'], '%Y-%m-%d')
+        day_of_week = DAYS[date_obj.weekday()]
+    else:
+        day_of_week = categorical(data, 'day_of_week', 'Monday')
+
+    minutes = parse_time_of_day(data.get('time_of_day'))
+    features = dict(zip(TIME_COLUMNS, time_features(minutes)))
+    if schedule is not None:
+        # The vocabulary resolves aliases (GTFS route_ids) to the route name the schedule is keyed by
+        route_name = route_vocab.tokens[route_id] if route_id != UNKNOWN_ROUTE else None
+        bucket = minutes // BUCKET_MINUTES if minutes is not None else None
+        features.update(zip(SCHEDULE_COLUMNS, schedule.lookup_one(route_name, bucket)))
+    else:
+        features.update((column, float('nan')) for column in SCHEDULE_COLUMNS)
+
+    # Build model input with exact features expected
+    return {
+        'route_id': route_id,
+        'day_of_week': day_of_week,
+        'weather_condition': categorical(data, 'weather_condition', 'Clear'),
+        'event_type': categorical(data, 'event_type', 'None'),
+        'temperature_c': float(data.get('temperature_c', 20)),
+        'precipitation_mm': float(data.get('precipitation_mm', 0)),
+        'event_attendance': int(data.get('event_attendance', 0)),
+        'traffic_factor': float(data.get('traffic_factor', 1.0)),
+        **features
+    }
+
+
+def build_model_frame(model_inputs):
+    """Stack feature dicts into the DataFrame the pipeline predicts on"""
+    return pd.DataFrame(model_inputs, columns=FEATURE_COLUMNS)
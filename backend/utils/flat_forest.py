@@ -0,0 +1,180 @@
+"""
+Tree ensembles flattened into contiguous NumPy arrays.
+
+All trees of a fitted RandomForestRegressor/ExtraTreesRegressor are
+concatenated into one node table (feature, threshold, left, right, value) with
+global child indices. Leaves point to themselves. Every (row, tree) pair is
+walked down in vectorised steps, dropping pairs as they reach a leaf.
+
+The arrays are saved as plain .npy files and opened with mmap_mode='r', so
+processes serving the same model share one copy of the nodes through the page
+cache (sklearn's Tree copies its nodes into private memory on unpickling).
+
+Compact exports (from_estimator options):
+  dtype=np.float32  thresholds and leaf values in float32, halving those arrays.
+                    Thresholds are rounded *down* to a float32, which keeps every
+                    split decision identical for the float32 features trees see;
+                    only leaf values lose precision (~1e-7 relative).
+  max_depth=d       nodes at depth d become leaves holding the mean target of their
+                    training samples (sklearn stores it on every node); deeper nodes
+                    are dropped. A smaller, shallower and approximate model.
+"""
+import json
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+
+def float32_floor(values):
+    """Largest float32 <= each float64 value: x <= t and x <= float32_floor(t) agree for every float32 x"""
+    rounded = values.astype(np.float32)
+    over = rounded.astype(np.float64) > values
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+
+def prune_to_depth(children_left, children_right, max_depth):
+    """(nodes kept, kept nodes that are leaves) when a tree is cut at max_depth"""
+    keep = np.zeros(len(children_left), dtype=bool)
+    leaf = children_left == -1
+    # Walk down one level at a time from the root
+    level = np.array([0])
+    for _ in range(max_depth):
+        keep[level] = True
+        level = level[~leaf[level]]
+        level = np.concatenate([children_left[level], children_right[level]])
+    keep[level] = True
+    leaf = leaf.copy()
+    leaf[level] = True
+    return keep, leaf
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self._walk_tables = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    @classmethod
+    def from_estimator(cls, forest, dtype=np.float64, max_depth=None):
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single-output forests can be flattened')
+        if max_depth is not None and max_depth < 0:
+            raise ValueError('max_depth must not be negative')
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth_reached = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            children_left, children_right = tree.children_left, tree.children_right
+            feature, threshold, value = tree.feature, tree.threshold, tree.value[:, 0, 0]
+            leaf = children_left == -1
+            if max_depth is not None and tree.max_depth > max_depth:
+                keep, leaf = prune_to_depth(children_left, children_right, max_depth)
+                # Nodes are stored parent before child, so a kept subset renumbers in order
+                new_index = np.cumsum(keep) - 1
+                children_left = np.where(leaf, -1, new_index[children_left])[keep]
+                children_right = np.where(leaf, -1, new_index[children_right])[keep]
+                feature, threshold, value, leaf = feature[keep], threshold[keep], value[keep], leaf[keep]
+            n = len(feature)
+            own = np.arange(offset, offset + n)
+            # Leaves point back to themselves, which is how traversal recognises them
+            lefts.append(np.where(leaf, own, children_left + offset))
+            rights.append(np.where(leaf, own, children_right + offset))
+            features.append(np.where(leaf, 0, feature))
+            thresholds.append(np.where(leaf, 0.0, threshold))
+            values.append(value)
+            roots.append(offset)
+            depth_reached = max(depth_reached, tree.max_depth if max_depth is None else min(tree.max_depth, max_depth))
+            offset += n
+        index_dtype = np.int32 if offset < 2 ** 31 else np.int64
+        threshold = np.concatenate(thresholds).astype(np.float64)
+        if np.dtype(dtype) == np.float32:
+            threshold = float32_floor(threshold)
+        return cls(
+            np.concatenate(features).astype(np.int32),
+            threshold,
+            np.concatenate(lefts).astype(index_dtype),
+            np.concatenate(rights).astype(index_dtype),
+            np.concatenate(values).astype(dtype),
+            np.array(roots, dtype=index_dtype),
+            depth_reached,
+        )
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(folder, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(folder, 'forest.json'), 'w') as f:
+            json.dump({'version': FORMAT_VERSION, 'max_depth': self.max_depth,
+                       'n_trees': self.n_trees, 'n_nodes': self.n_nodes, 'dtype': str(self.value.dtype)}, f)
+
+    @classmethod
+    def load(cls, folder, mmap_mode='r'):
+        with open(os.path.join(folder, 'forest.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported flat forest version: {meta.get('version')}")
+        arrays = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(max_depth=meta['max_depth'], **arrays)
+
+    def walk_tables(self):
+        """
+        (children, is_leaf) used by predict, derived from left/right on first use:
+        children interleaves [right, left] per node so a step is one gather
+        indexed by the split outcome. Private to the process (~9 bytes a node).
+        """
+        if self._walk_tables is None:
+            left, right = np.asarray(self.left), np.asarray(self.right)
+            children = np.empty(2 * len(left), dtype=np.int32 if len(left) < 2 ** 30 else np.int64)
+            children[0::2] = right
+            children[1::2] = left
+            self._walk_tables = children, left == np.arange(len(left))
+        return self._walk_tables
+
+    def predict(self, X):
+        """
+        Mean of the trees' leaf values for each row of X. Thresholds are compared
+        in float64 against the (float32) features and tree outputs are summed in
+        tree order, as sklearn does, so results match forest.predict exactly.
+        """
+        children, is_leaf = self.walk_tables()
+        n_rows, n_features = X.shape
+        flat_X = np.ascontiguousarray(X).ravel()
+        # One cursor per (row, tree), row-major; only cursors still on internal nodes are advanced
+        nodes = np.tile(np.asarray(self.roots), n_rows)
+        row_start = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        active = np.flatnonzero(~is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            go_left = flat_X[row_start[active] + self.feature[current]] <= self.threshold[current]
+            current = children[2 * current + go_left]
+            nodes[active] = current
+            active = active[~is_leaf[current]]
+        leaf_values = self.value[nodes].reshape(n_rows, self.n_trees)
+
+        total = np.zeros(n_rows)
+        for t in range(self.n_trees):
+            total += leaf_values[:, t]
+        total /= self.n_trees
+        return total
@@ -0,0 +1,147 @@
+"""
+Compiled, memory-mappable GTFS cache.
+
+Each feed is written as one .npy file per column under
+data/gtfs_cache/<city>/<key>/, where <key> is derived from the (mtime, size)
+signature of the source CSVs. A cache that no longer matches the files on disk
+is simply never found, so stale caches fall back to CSV parsing.
+
+- numeric columns are stored as-is
+- string columns are stored as categorical codes (+ a categories file)
+- stop_times arrival/departure times are additionally stored as int32
+  seconds since midnight (added by GTFSFeed before compiling)
+
+Arrays are opened with np.load(mmap_mode='r'), so several gunicorn workers on
+the same host share the pages through the OS page cache instead of each
+holding a parsed copy.
+
+Compile ahead of time with:
+    python backend/utils/gtfs_cache.py hyderabad karnataka
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout changes so old caches are ignored
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'gtfs_cache')
+
+
+def cache_key(signature):
+    raw = repr((CACHE_VERSION, signature)).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def cache_path(cache_dir, city, signature):
+    return os.path.join(cache_dir, city, cache_key(signature))
+
+
+def _write_column(folder, index, series):
+    """Write one column and return its manifest entry"""
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        np.save(os.path.join(folder, f"{index}.npy"), series.to_numpy())
+        return {'name': series.name, 'kind': 'numeric'}
+
+    # Strings (and mixed object columns) become categorical codes; missing -> code -1
+    values = series.astype(object)
+    values = values.where(values.isna(), values.astype(str))
+    cat = pd.Categorical(values)
+    # Codes keep the dtype pandas picked (int8/16/32) so loading them back needs no copy
+    np.save(os.path.join(folder, f"{index}.npy"), cat.codes)
+    np.save(os.path.join(folder, f"{index}.categories.npy"), np.asarray(cat.categories, dtype=str))
+    return {'name': series.name, 'kind': 'category'}
+
+
+def write_cache(cache_dir, city, signature, tables):
+    """
+    Compile parsed feed tables into the binary cache.
+    The folder is built under a temp name and renamed into place, so concurrent
+    workers never see a partial cache.
+    """
+    final_path = cache_path(cache_dir, city, signature)
+    if os.path.exists(os.path.join(final_path, 'manifest.json')):
+        return final_path
+
+    city_dir = os.path.join(cache_dir, city)
+    os.makedirs(city_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=city_dir)
+    try:
+        manifest = {'version': CACHE_VERSION, 'city': city, 'signature': signature, 'tables': {}}
+        for name, df in tables.items():
+            folder = os.path.join(tmp_path, name)
+            os.makedirs(folder)
+            columns = [_write_column(folder, i, df[col]) for i, col in enumerate(df.columns)]
+            manifest['tables'][name] = {'rows': len(df), 'columns': columns}
+
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        try:
+            os.rename(tmp_path, final_path)
+        except OSError:
+            # Another process published the same version first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    # Drop older versions of this city's cache
+    for entry in os.listdir(city_dir):
+        path = os.path.join(city_dir, entry)
+        if path != final_path and not entry.startswith('.tmp-'):
+            shutil.rmtree(path, ignore_errors=True)
+    return final_path
+
+
+def read_cache(cache_dir, city, signature):
+    """Memory-map the cached tables for this signature, or return None if there is no fresh cache"""
+    path = cache_path(cache_dir, city, signature)
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+
+    tables = {}
+    for name, spec in manifest['tables'].items():
+        folder = os.path.join(path, name)
+        data = {}
+        for i, column in enumerate(spec['columns']):
+            values = np.load(os.path.join(folder, f"{i}.npy"), mmap_mode='r')
+            if column['kind'] == 'category':
+                categories = np.load(os.path.join(folder, f"{i}.categories.npy"))
+                dtype = pd.CategoricalDtype(pd.Index(categories.astype(object)))
+                values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+            data[column['name']] = values
+        # copy=False keeps the numeric columns and category codes backed by the mapped files
+        tables[name] = pd.DataFrame(data, copy=False)
+    return tables
+
+
+def main():
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.gtfs_loader import GTFSLoader
+
+    cities = sys.argv[1:] or ['hyderabad', 'karnataka']
+    loader = GTFSLoader(os.path.dirname(os.path.abspath(__file__)))
+    for city in cities:
+        feed = loader.get_feed(city)
+        if feed is None:
+            print(f"Skipping {city}: GTFS folder not found")
+            continue
+        path = write_cache(loader.cache_dir, city, feed.signature, feed.tables())
+        print(f"Compiled {city} -> {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,264 @@
 import pandas as pd
+import numpy as np
 import os
+import threading
 
-class GTFSLoader:
-    def __init__(self, base_dir):
-        self.base_dir = base_dir
+from utils.delay_propagation import TripSchedule
+from utils.gtfs_cache import DEFAULT_CACHE_DIR, read_cache, write_cache
+from utils.metrics import phase
+from utils.payloads import Listing
+from utils.service_calendar import ServiceCalendar, parse_date
+from utils.stop_index import StopIndex
+
+# Files that make up a feed; a change to any of them triggers a reload
+GTFS_FILES = ['routes.txt', 'stops.txt', 'trips.txt', 'calendar.txt', 'calendar_dates.txt', 'stop_times.txt']
+# Files a feed may omit
+OPTIONAL_FILES = ['calendar.txt', 'calendar_dates.txt']
+
+
+def read_gtfs_table(data_path, name):
+    # index_col=False: the karnataka feed ends every line with a trailing comma,
+    # which otherwise makes pandas treat the first column as the index.
+    # utf-8-sig strips the BOM some exporters put in front of the header.
+    path = os.path.join(data_path, name)
+    if name in OPTIONAL_FILES and not os.path.exists(path):
+        return None
+    return pd.read_csv(path, index_col=False, encoding='utf-8-sig')
+
+
+def gtfs_time_to_seconds(values):
+    """Vectorised HH:MM:SS -> int32 seconds since midnight (hours may exceed 24); -1 if missing"""
+    parts = pd.Series(values).astype('string').str.split(':', expand=True)
+    if parts.shape[1] < 3:
+        return np.full(len(parts), -1, dtype=np.int32)
+    h, m, s = (pd.to_numeric(parts[i], errors='coerce') for i in range(3))
+    seconds = h * 3600 + m * 60 + s
+    return seconds.fillna(-1).to_numpy().astype(np.int32)
+
+
+class GTFSFeed:
+    """Parsed GTFS tables for one city, kept resident in memory."""
+
+    def __init__(self, city, data_path, cache_dir=None):
+        self.city = city
+        self.data_path = data_path
+        self.cache_dir = cache_dir
+        self.from_cache = False
+        self.signature = None
         self.routes = None
         self.stops = None
-        self.loaded_city = None
+        self.trips = None
+        self.calendar = None
+        self.calendar_dates = None
+        self.stop_times = None
+        # Lookup indexes, built once per load
+        self.route_headsigns = {}
+        self.representative_trip = {}
+        self.trip_stops = {}
+        # Date lookups: service bitmap, service index per trips row, trips rows per route
+        self.service_calendar = None
+        self.trip_service = None
+        self.trip_headsign_values = None
+        self.trip_id_values = None
+        self.trip_route_values = None
+        self.route_trip_rows = {}
+        # stop_times as flat arrays for delay propagation, and the trips row of each of its trips
+        self.schedule = None
+        self.schedule_trips_row = None
+        # KD-tree / longitude-sorted arrays over stop coordinates for spatial queries
+        self.stop_index = None
+        # Pre-serialized city-wide listings, built once per feed version (see listing())
+        self.listings = {}
+        self._listing_lock = threading.Lock()
 
-    def load_data(self, city):
+    def file_signature(self):
+        """(name, mtime, size) of every feed file, used to detect changes on disk"""
+        sig = []
+        for name in GTFS_FILES:
+            path = os.path.join(self.data_path, name)
+            try:
+                st = os.stat(path)
+                sig.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((name, None, None))
+        return tuple(sig)
+
+    def is_stale(self):
+        return self.signature != self.file_signature()
+
+    def load(self):
+        # Take the signature before reading so a write during the load is picked up next time
+        signature = self.file_signature()
+
+        tables = read_cache(self.cache_dir, self.city, signature) if self.cache_dir else None
+        self.from_cache = tables is not None
+        if tables is None:
+            tables = self.parse_csv()
+            if self.cache_dir:
+                try:
+                    write_cache(self.cache_dir, self.city, signature, tables)
+                except Exception as e:
+                    print(f"Could not write GTFS cache for {self.city}: {e}")
+
+        self.routes = tables['routes']
+        self.stops = tables['stops']
+        self.trips = tables['trips']
+        self.calendar = tables.get('calendar')
+        self.calendar_dates = tables.get('calendar_dates')
+        self.stop_times = tables['stop_times']
+
+        self.build_indexes()
+        self.signature = signature
+        source = 'cache' if self.from_cache else 'CSV'
+        print(f"Loaded {len(self.routes)} routes, {len(self.trips)} trips for {self.city} from {source}")
+
+    def parse_csv(self):
+        routes = read_gtfs_table(self.data_path, 'routes.txt')
+        # Some GTFS have route_short_name, some route_long_name. validation needed.
+        if 'route_short_name' not in routes.columns:
+            routes['route_short_name'] = routes['route_long_name'] if 'route_long_name' in routes.columns else routes['route_id']
+
+        # Loading full stop_times into memory is okay for these city sizes (~700KB - ~5MB)
+        stop_times = read_gtfs_table(self.data_path, 'stop_times.txt')
+        stop_times['arrival_secs'] = gtfs_time_to_seconds(stop_times['arrival_time'])
+        stop_times['departure_secs'] = gtfs_time_to_seconds(stop_times['departure_time'])
+
+        tables = {
+            'routes': routes,
+            'stops': read_gtfs_table(self.data_path, 'stops.txt'),
+            'trips': read_gtfs_table(self.data_path, 'trips.txt'),
+            'calendar': read_gtfs_table(self.data_path, 'calendar.txt'),
+            'calendar_dates': read_gtfs_table(self.data_path, 'calendar_dates.txt'),
+            'stop_times': stop_times,
+        }
+        return {name: table for name, table in tables.items() if table is not None}
+
+    def tables(self):
+        tables = {
+            'routes': self.routes,
+            'stops': self.stops,
+            'trips': self.trips,
+            'calendar': self.calendar,
+            'calendar_dates': self.calendar_dates,
+            'stop_times': self.stop_times,
+        }
+        return {name: table for name, table in tables.items() if table is not None}
+
+    def build_indexes(self):
         """
-        Load GTFS data for a specific city.
-        city: 'hyderabad' or 'karnataka'
+        Precompute the lookups behind get_trips/get_stops so requests never scan tables:
+        route_id -> headsign records, (route_id, headsign) -> representative trip_id,
+        trip_id -> ordered stop records with names and coordinates already joined.
         """
+        route_headsigns = {}
+        representative_trip = {}
+        # route_id is compared as a string, matching what arrives in query params
+        trips = self.trips[['route_id', 'trip_headsign', 'trip_id']].copy()
+        trips['route_id'] = trips['route_id'].astype(str)
+        # First trip of each (route, headsign) in file order is the representative one
+        first_trips = trips.drop_duplicates(['route_id', 'trip_headsign'])
+        for route_id, headsign, trip_id in zip(first_trips['route_id'], first_trips['trip_headsign'], first_trips['trip_id']):
+            route_headsigns.setdefault(route_id, []).append({'trip_headsign': headsign})
+            representative_trip[(route_id, headsign)] = trip_id
+
+        trip_stops = {}
+        stop_cols = ['stop_id', 'stop_name', 'stop_lat', 'stop_lon']
+        ordered = self.stop_times[['trip_id', 'stop_id', 'stop_sequence']].sort_values(['trip_id', 'stop_sequence'], kind='stable')
+        merged = ordered.merge(self.stops[stop_cols], on='stop_id', sort=False)
+        if len(merged):
+            trip_ids = merged['trip_id'].to_numpy()
+            records = merged[stop_cols].to_dict('records')
+            # Rows are grouped by trip_id, so each trip is one contiguous slice
+            starts = np.flatnonzero(np.r_[True, trip_ids[1:] != trip_ids[:-1]])
+            ends = np.r_[starts[1:], len(trip_ids)]
+            for start, end in zip(starts, ends):
+                trip_stops[trip_ids[start]] = records[start:end]
+
+        self.route_headsigns = route_headsigns
+        self.representative_trip = representative_trip
+        self.trip_stops = trip_stops
+        self.build_calendar_index(trips)
+        self.schedule = TripSchedule.from_stop_times(self.stop_times)
+        self.schedule_trips_row = pd.Index(self.trip_id_values).get_indexer(self.schedule.trip_ids)
+        if 'stop_lat' in self.stops.columns:
+            self.stop_index = StopIndex(self.stops)
+
+    def build_calendar_index(self, trips):
+        """Service bitmap plus, per route, the trips rows (in file order) to test against it"""
+        self.service_calendar = ServiceCalendar(self.calendar, self.calendar_dates)
+        self.trip_service = self.service_calendar.encode(self.trips['service_id'])
+        self.trip_headsign_values = trips['trip_headsign'].to_numpy()
+        self.trip_id_values = trips['trip_id'].to_numpy()
+        self.trip_route_values = trips['route_id'].to_numpy()
+        route_ids = trips['route_id'].to_numpy()
+        order = np.argsort(route_ids, kind='stable')
+        sorted_ids = route_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]) if len(order) else []
+        ends = np.r_[starts[1:], len(order)] if len(order) else []
+        self.route_trip_rows = {sorted_ids[start]: order[start:end] for start, end in zip(starts, ends)}
+
+    def listing_frame(self, name):
+        """Columns of the city-wide routes or stops listing"""
+        if name == 'routes':
+            return self.routes[['route_id', 'route_short_name']]
+        cols = ['stop_id', 'stop_name']
+        if 'stop_lat' in self.stops.columns: cols.extend(['stop_lat', 'stop_lon'])
+        return self.stops[cols]
+
+    def listing(self, name):
+        """
+        'routes' or 'stops' as a pre-serialized Listing, built on first use and kept
+        for this feed version (a reload creates a new feed). Compressing a large
+        listing takes seconds, so concurrent first requests wait for one build.
+        """
+        listing = self.listings.get(name)
+        if listing is None:
+            with self._listing_lock:
+                listing = self.listings.get(name)
+                if listing is None:
+                    # Stops have always been returned with blanks for missing values
+                    listing = Listing.from_frame(self.listing_frame(name), fill='' if name == 'stops' else None)
+                    self.listings[name] = listing
+        return listing
+
+    def warm_listings(self):
+        for name in ('routes', 'stops'):
+            try:
+                self.listing(name)
+            except Exception as e:
+                print(f"Could not build the {name} listing for {self.city}: {e}")
+
+    def active_trip_rows(self, route_id, day):
+        """trips rows of a route that run on `day`, in file order"""
+        day = parse_date(day)
+        rows = self.route_trip_rows.get(str(route_id))
+        if rows is None:
+            return np.array([], dtype=np.int64)
+        return rows[self.service_calendar.is_active(self.trip_service[rows], day)]
+
+
+class GTFSLoader:
+    """
+    Per-city GTFS store. Each feed is parsed once and kept resident alongside
+    the others; a feed is only re-read when its files change on disk.
+    Parsed feeds are compiled into a memory-mapped cache (see gtfs_cache.py),
+    so later cold starts skip CSV parsing entirely.
+    """
+
+    def __init__(self, base_dir, cache_dir=DEFAULT_CACHE_DIR, warm_listings=False):
+        self.base_dir = base_dir
+        # Compiled binary cache location; None or GTFS_CACHE_DIR='' disables it (always parse CSV)
+        self.cache_dir = os.environ.get('GTFS_CACHE_DIR', cache_dir)
+        # Build each new feed's routes/stops listings in a background thread rather than on first request
+        self.warm_listings = warm_listings
+        self.feeds = {}
+        self.loaded_city = None
+        self._lock = threading.Lock()
+
+    def resolve_path(self, city):
         folder_name = f"{city}_GTFS"
         data_path = os.path.join(self.base_dir, '..', '..', folder_name) # Adjust path relative to backend/utils
-        
+
         # Absolute path check
         if not os.path.exists(data_path):
             # Try absolute path from project root if relative fails
@@ -23,85 +266,167 @@ class GTFSLoader:
             data_path = os.path.join(project_root, folder_name)
 
         if not os.path.exists(data_path):
-            print(f"GTFS folder not found: {data_path}")
-            return False
+            return None
+        return data_path
+
+    def get_feed(self, city):
+        """Return the resident feed for a city, (re)loading it only if missing or stale"""
+        if not city:
+            city = self.loaded_city
+        feed = self.feeds.get(city)
+        if feed is not None and not feed.is_stale():
+            return feed
+
+        with self._lock:
+            # Another thread may have loaded it while we waited
+            feed = self.feeds.get(city)
+            if feed is not None and not feed.is_stale():
+                return feed
+
+            data_path = feed.data_path if feed is not None else self.resolve_path(city)
+            if data_path is None:
+                print(f"GTFS folder not found for city: {city}")
+                return None
+
+            new_feed = GTFSFeed(city, data_path, self.cache_dir)
+            try:
+                with phase('gtfs_load'):
+                    new_feed.load()
+            except Exception as e:
+                print(f"Error loading GTFS for {city}: {e}")
+                # Keep serving the previous version if a reload fails
+                return feed
 
-        try:
-            self.routes = pd.read_csv(os.path.join(data_path, 'routes.txt'))
-            # Some GTFS have route_short_name, some route_long_name. validation needed.
-            if 'route_short_name' not in self.routes.columns:
-                 self.routes['route_short_name'] = self.routes['route_long_name'] if 'route_long_name' in self.routes.columns else self.routes['route_id']
-            
-            self.stops = pd.read_csv(os.path.join(data_path, 'stops.txt'))
-            self.trips = pd.read_csv(os.path.join(data_path, 'trips.txt'))
-            self.calendar = pd.read_csv(os.path.join(data_path, 'calendar.txt'))
-            
-            # Load stop_times (lighter version, maybe group by trip_id)
-            # Optimisation: We only need this for get_stops(route_id). 
-            # Loading full file into memory might be okay for these city sizes (~700KB - ~5MB)
-            self.stop_times = pd.read_csv(os.path.join(data_path, 'stop_times.txt'))
-            
-            self.loaded_city = city
-            print(f"Loaded {len(self.routes)} routes, {len(self.trips)} trips for {city}")
-            return True
-        except Exception as e:
-            print(f"Error loading GTFS for {city}: {e}")
+            # Swap in a fully built feed so readers never see a half-loaded one
+            self.feeds[city] = new_feed
+            if self.warm_listings:
+                threading.Thread(target=new_feed.warm_listings, name=f'listings-{city}', daemon=True).start()
+            return new_feed
+
+    def load_data(self, city):
+        """
+        Load GTFS data for a specific city.
+        city: 'hyderabad' or 'karnataka'
+        """
+        feed = self.get_feed(city)
+        if feed is None:
             return False
+        self.loaded_city = city
+        return True
+
+    # Tables of the most recently loaded city, for callers that use load_data() + attributes
+    @property
+    def routes(self):
+        feed = self.feeds.get(self.loaded_city)
+        return feed.routes if feed else None
+
+    @property
+    def stops(self):
+        feed = self.feeds.get(self.loaded_city)
+        return feed.stops if feed else None
+
+    @property
+    def trips(self):
+        feed = self.feeds.get(self.loaded_city)
+        return feed.trips if feed else None
+
+    @property
+    def calendar(self):
+        feed = self.feeds.get(self.loaded_city)
+        return feed.calendar if feed else None
 
-    def get_routes(self):
-        if self.routes is not None:
+    @property
+    def stop_times(self):
+        feed = self.feeds.get(self.loaded_city)
+        return feed.stop_times if feed else None
+
+    def get_routes(self, city=None):
+        feed = self.get_feed(city)
+        if feed is not None and feed.routes is not None:
              # Return list of {id, name}
-             return self.routes[['route_id', 'route_short_name']].to_dict('records')
+             return feed.listing_frame('routes').to_dict('records')
         return []
 
-    def get_trips(self, route_id):
-        """Returns unique trip headsigns (directions) for a route"""
-        if self.trips is not None:
-            # Filter trips by route_id (need to handle type mismatch: ensure string?)
-            filtered = self.trips[self.trips['route_id'].astype(str) == str(route_id)]
-            unique_trips = filtered[['trip_headsign']].drop_duplicates()
-            return unique_trips.to_dict('records')
-        return []
+    def get_trips(self, route_id, city=None, date=None):
+        """
+        Returns unique trip headsigns (directions) for a route. With a date
+        (YYYY-MM-DD), only directions with a trip running that day.
+        """
+        feed = self.get_feed(city)
+        if feed is None:
+            return []
+        if date is None:
+            return feed.route_headsigns.get(str(route_id), [])
+        rows = feed.active_trip_rows(route_id, date)
+        headsigns = pd.unique(feed.trip_headsign_values[rows]) if len(rows) else []
+        return [{'trip_headsign': h} for h in headsigns]
+
+    def get_stops(self, route_id=None, trip_headsign=None, city=None, date=None):
+        feed = self.get_feed(city)
+        if feed is None or feed.stops is None: return []
 
-    def get_stops(self, route_id=None, trip_headsign=None):
-        if self.stops is None: return []
-        
         # If route_id is provided, filtering by stops on that route is complex without trip_headsign
         # If trip_headsign is provided, we can find a representative trip and return its stops in order
-        
+
         if route_id and trip_headsign:
-            try:
-                # Find a trip_id for this route and headsign
-                matching_trips = self.trips[
-                    (self.trips['route_id'].astype(str) == str(route_id)) & 
-                    (self.trips['trip_headsign'] == trip_headsign)
-                ]
-                
-                if not matching_trips.empty:
-                    # Take the first one as representative
-                    trip_id = matching_trips.iloc[0]['trip_id']
-                    
-                    # Get stops for this trip from stop_times
-                    trip_stops = self.stop_times[self.stop_times['trip_id'] == trip_id].sort_values('stop_sequence')
-                    
-                    # Join with stops to get names
-                    merged = trip_stops.merge(self.stops, on='stop_id')
-                    return merged[['stop_id', 'stop_name', 'stop_lat', 'stop_lon']].to_dict('records')
-            except Exception as e:
-                print(f"Error filtering stops: {e}")
-        
+            # Representative trip for this route and headsign, then its stops in order
+            if (str(route_id), trip_headsign) in feed.representative_trip:
+                return self.get_trip_stops(route_id, trip_headsign, city, date)
+
         # Fallback: Return all stops if no filter
-        cols = ['stop_id', 'stop_name']
-        if 'stop_lat' in self.stops.columns: cols.extend(['stop_lat', 'stop_lon'])
-        return self.stops[cols].fillna('').to_dict('records')
-
-    def validate_date(self, date_str):
-        # date_str: YYYY-MM-DD
-        # Check if any service runs on this date
-        # logic: 
-        # 1. Get day of week (Monday...Sunday)
-        # 2. Check calendar for service_ids active on this day and start_date <= date <= end_date
-        return True # Simplified for now, or implement full logic
+        return feed.listing_frame('stops').fillna('').to_dict('records')
+
+    def get_listing(self, name, city=None):
+        """Pre-serialized 'routes' or 'stops' listing of a city (see GTFSFeed.listing); None if unknown"""
+        feed = self.get_feed(city)
+        if feed is None or getattr(feed, name) is None:
+            return None
+        return feed.listing(name)
+
+    def find_stops(self, city=None, bbox=None, lat=None, lon=None, k=None, radius_m=None, limit=None):
+        """
+        Spatial stop queries against the feed's stop index:
+        bbox=(min_lon, min_lat, max_lon, max_lat) -> stops inside the box;
+        lat/lon with k and/or radius_m -> nearest stops, closest first, with distance_m.
+        With only a radius, every stop within it is returned (up to limit).
+        """
+        feed = self.get_feed(city)
+        if feed is None or feed.stop_index is None:
+            return []
+        index = feed.stop_index
+        if bbox is not None:
+            return index.take(index.bbox(*bbox, limit=limit))
+        if k is None and radius_m is not None:
+            return index.take(*index.within(lat, lon, radius_m, limit=limit))
+        k = k if k is not None else 10
+        if limit:
+            k = min(k, limit)
+        return index.take(*index.nearest(lat, lon, k=k, radius_m=radius_m))
+
+    def get_trip_stops(self, route_id, trip_headsign, city=None, date=None):
+        """
+        Ordered stops of the representative trip for a route/headsign; [] if there is
+        no such trip. With a date, the representative trip is the first one running that day.
+        """
+        feed = self.get_feed(city)
+        if feed is None:
+            return []
+        if date is None:
+            trip_id = feed.representative_trip.get((str(route_id), trip_headsign))
+        else:
+            rows = feed.active_trip_rows(route_id, date)
+            matches = rows[feed.trip_headsign_values[rows] == trip_headsign]
+            trip_id = feed.trip_id_values[matches[0]] if len(matches) else None
+        if trip_id is None:
+            return []
+        return feed.trip_stops.get(trip_id, [])
+
+    def validate_date(self, date_str, city=None):
+        """True if any service of the city's feed runs on date_str (YYYY-MM-DD); raises ValueError if malformed"""
+        feed = self.get_feed(city)
+        if feed is None:
+            return False
+        return bool(feed.service_calendar.active_services(date_str).any())
 
 
 # Singleton or factory can be used in app.py
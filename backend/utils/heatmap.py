@@ -0,0 +1,327 @@
+"""
+Delay heatmap pre-binned into a Web Mercator grid at several zoom levels.
+
+Every tile (256 px, standard slippy-map numbering) is split into
+cells_per_tile x cells_per_tile cells. Points are binned at max_zoom with
+vectorised NumPy (cell key per point, np.unique + np.bincount per chunk), so
+memory is bounded by the number of occupied cells, not the number of points.
+Lower zooms are built from the cells of the zoom above (x >> 1, y >> 1), never
+from the points again. Each cell keeps its observation count and delay sum;
+its heat is the mean delay.
+
+The artifact is one JSON file with, per zoom, parallel integer arrays sorted by
+tile, so the backend answers /api/heatmap/<z>/<x>/<y> with a binary search.
+
+    python backend/utils/heatmap.py [--points obs.csv --lat-col lat --lon-col lon --delay-col delay]
+                                    [--min-zoom 5] [--max-zoom 15] [--output data/processed/delay_heatmap.json]
+Without --points, each route's observed delays (training CSV, via delay_stats.py)
+are spread over the stops of that route in the GTFS feeds.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+MAX_LAT = 85.05112878
+ARTIFACT_VERSION = 1
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HEATMAP_PATH = os.path.join(PROJECT_ROOT, 'data', 'processed', 'delay_heatmap.json')
+
+
+def mercator(lat, lon):
+    """Degrees -> Web Mercator x, y in [0, 1) (y grows southwards, as tile rows do)"""
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return np.clip(x, 0, np.nextafter(1, 0)), np.clip(y, 0, np.nextafter(1, 0))
+
+
+def cell_centers(z, x, y, cells_per_tile):
+    """Grid cell indices at zoom z -> (lat, lon) of their centres"""
+    n = float(2 ** z * cells_per_tile)
+    lon = (np.asarray(x) + 0.5) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (np.asarray(y) + 0.5) / n))))
+    return lat, lon
+
+
+def combine(keys, count, total):
+    """Sum count/total per distinct key; keys come back sorted"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return (unique, np.bincount(inverse, weights=count, minlength=len(unique)),
+            np.bincount(inverse, weights=total, minlength=len(unique)))
+
+
+class HeatmapBuilder:
+    def __init__(self, min_zoom=5, max_zoom=15, cells_per_tile=64, max_cells=100_000):
+        if not 0 <= min_zoom <= max_zoom or 2 ** max_zoom * cells_per_tile > 2 ** 31:
+            raise ValueError('need 0 <= min_zoom <= max_zoom and a grid that fits in int32 cells')
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.cells_per_tile = cells_per_tile
+        # Per-zoom budget that keeps the artifact's size bounded however many points go in
+        self.max_cells = max_cells
+        self.side = 2 ** max_zoom * cells_per_tile
+        self.keys = np.array([], dtype=np.int64)
+        self.count = np.array([], dtype=np.float64)
+        self.total = np.array([], dtype=np.float64)
+        self.points = 0
+
+    def add(self, lat, lon, delay, count=None):
+        """
+        Bin a batch of observations. count, if given, is how many observations
+        each point stands for and delay is their summed delay.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        delay = np.asarray(delay, dtype=np.float64)
+        count = np.ones(len(lat)) if count is None else np.asarray(count, dtype=np.float64)
+        valid = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(delay) & (count > 0)
+        if not valid.all():
+            lat, lon, delay, count = lat[valid], lon[valid], delay[valid], count[valid]
+        x, y = mercator(lat, lon)
+        keys = (x * self.side).astype(np.int64) * self.side + (y * self.side).astype(np.int64)
+        self.keys, self.count, self.total = combine(
+            np.concatenate([self.keys, keys]), np.concatenate([self.count, count]),
+            np.concatenate([self.total, delay]))
+        self.points += len(lat)
+
+    def build(self, source=None):
+        """
+        Cells for every zoom. Zooms with more than max_cells occupied cells keep
+        the max_cells with the most observations; coarser zooms are still
+        computed from all cells, so they stay exact.
+        """
+        zooms = {}
+        dropped = {}
+        x, y = self.keys // self.side, self.keys % self.side
+        count, total = self.count, self.total
+        for z in range(self.max_zoom, self.min_zoom - 1, -1):
+            if z < self.max_zoom:
+                side = 2 ** z * self.cells_per_tile
+                keys, count, total = combine((x >> 1) * side + (y >> 1), count, total)
+                x, y = keys // side, keys % side
+            keep = slice(None)
+            if self.max_cells and len(x) > self.max_cells:
+                keep = np.argpartition(-count, self.max_cells - 1)[:self.max_cells]
+                dropped[z] = len(x) - self.max_cells
+            zooms[z] = (x[keep], y[keep], count[keep], total[keep])
+        return Heatmap.from_cells(zooms, self.cells_per_tile,
+                                  source=dict(source or {}, points=self.points, dropped_cells=dropped))
+
+
+class Heatmap:
+    def __init__(self, zooms, cells_per_tile, meta):
+        # zoom -> dict of x, y (int32 cell indices), count (int64), mean (float32), tile_key (int64)
+        self.zooms = zooms
+        self.cells_per_tile = cells_per_tile
+        self.meta = meta
+        self.shift = int(np.log2(cells_per_tile))
+
+    @classmethod
+    def from_cells(cls, zooms, cells_per_tile, source=None):
+        arrays = {}
+        for z, (x, y, count, total) in zooms.items():
+            arrays[z] = {'x': x.astype(np.int32), 'y': y.astype(np.int32), 'count': np.round(count).astype(np.int64),
+                         'mean': np.round(total / np.maximum(count, 1), 2).astype(np.float32)}
+        meta = {'version': ARTIFACT_VERSION, 'generated_at': datetime.now().isoformat(timespec='seconds'),
+                'source': source or {}}
+        return cls(cls.sorted_by_tile(arrays, cells_per_tile), cells_per_tile, meta)
+
+    @staticmethod
+    def sorted_by_tile(arrays, cells_per_tile):
+        shift = int(np.log2(cells_per_tile))
+        for z, cells in arrays.items():
+            tile_key = (cells['x'].astype(np.int64) >> shift) * 2 ** z + (cells['y'] >> shift)
+            order = np.lexsort((cells['y'], cells['x'], tile_key))
+            arrays[z] = {name: values[order] for name, values in cells.items()}
+            arrays[z]['tile_key'] = tile_key[order]
+        return arrays
+
+    @property
+    def min_zoom(self):
+        return min(self.zooms)
+
+    @property
+    def max_zoom(self):
+        return max(self.zooms)
+
+    def info(self):
+        top = self.zooms[self.min_zoom]
+        lat, lon = cell_centers(self.max_zoom, self.zooms[self.max_zoom]['x'], self.zooms[self.max_zoom]['y'],
+                                self.cells_per_tile)
+        return dict(self.meta, min_zoom=self.min_zoom, max_zoom=self.max_zoom, cells_per_tile=self.cells_per_tile,
+                    cells={z: len(cells['x']) for z, cells in self.zooms.items()},
+                    max_mean_delay=round(float(top['mean'].max()), 2) if len(top['mean']) else None,
+                    bounds=[float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())] if len(lat) else None)
+
+    def tile(self, z, tx, ty):
+        """
+        Cells of one map tile: columnar dict with cell offsets inside the tile
+        (0..cells_per_tile-1), observation counts and mean delays
+        """
+        cells = self.zooms.get(z)
+        if cells is None:
+            return None
+        key = tx * 2 ** z + ty
+        lo, hi = np.searchsorted(cells['tile_key'], [key, key + 1])
+        mask = self.cells_per_tile - 1
+        return {
+            'x': (cells['x'][lo:hi] & mask).tolist(),
+            'y': (cells['y'][lo:hi] & mask).tolist(),
+            'count': cells['count'][lo:hi].tolist(),
+            'mean_delay': cells['mean'][lo:hi].astype(np.float64).round(2).tolist(),
+        }
+
+    def points(self, z, min_count=1):
+        """[lat, lon, mean_delay] per cell of a zoom, e.g. for a client-side heat layer"""
+        cells = self.zooms[z]
+        keep = cells['count'] >= min_count
+        lat, lon = cell_centers(z, cells['x'][keep], cells['y'][keep], self.cells_per_tile)
+        return np.column_stack([np.round(lat, 5), np.round(lon, 5), cells['mean'][keep].astype(np.float64).round(2)]).tolist()
+
+    def save(self, path):
+        """Atomic write of the JSON artifact (tile keys are recomputed on load)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        doc = dict(self.meta, cells_per_tile=self.cells_per_tile, zooms={
+            str(z): {'x': cells['x'].tolist(), 'y': cells['y'].tolist(), 'count': cells['count'].tolist(),
+                     'mean': cells['mean'].astype(np.float64).round(2).tolist()}
+            for z, cells in self.zooms.items()
+        })
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(doc, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            doc = json.load(f)
+        if doc.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported heatmap artifact version {doc.get('version')}")
+        cells_per_tile = doc.pop('cells_per_tile')
+        arrays = {
+            int(z): {'x': np.array(c['x'], dtype=np.int32), 'y': np.array(c['y'], dtype=np.int32),
+                     'count': np.array(c['count'], dtype=np.int64), 'mean': np.array(c['mean'], dtype=np.float32)}
+            for z, c in doc.pop('zooms').items()
+        }
+        return cls(cls.sorted_by_tile(arrays, cells_per_tile), cells_per_tile, doc)
+
+
+class HeatmapStore:
+    """The heatmap artifact, reloaded when the file changes (checked at most every check_interval seconds)"""
+
+    def __init__(self, path=HEATMAP_PATH, check_interval=30.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.heatmap = None
+        self.signature = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return self.heatmap
+        with self._lock:
+            self.checked_at = now
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self.heatmap, self.signature = None, None
+                return None
+            signature = (st.st_mtime_ns, st.st_size)
+            if signature != self.signature:
+                try:
+                    self.heatmap = Heatmap.load(self.path)
+                    self.signature = signature
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Heatmap at {self.path} unreadable: {e}")
+            return self.heatmap
+
+
+def route_stop_points(loader, cities, route_totals):
+    """
+    Spread per-route delay totals over the route's stops: route_totals maps a
+    route name (as in the training data) to (count, delay_sum). Returns
+    lat, lon, delay_sum, count arrays with one entry per (route, stop).
+    """
+    lat, lon, total, count = [], [], [], []
+    for city in cities:
+        feed = loader.get_feed(city)
+        if feed is None:
+            continue
+        # The training data names routes by route_short_name
+        names = feed.routes['route_short_name'].astype(str).to_numpy()
+        ids = feed.routes['route_id'].astype(str).to_numpy()
+        for name, route_id in zip(names, ids):
+            if name not in route_totals:
+                continue
+            rows = feed.route_trip_rows.get(route_id, [])
+            stops = {}
+            for trip_id in pd.unique(feed.trip_id_values[rows]):
+                for stop in feed.trip_stops.get(trip_id, []):
+                    stops[stop['stop_id']] = (stop['stop_lat'], stop['stop_lon'])
+            n, delay_sum = route_totals[name]
+            for stop_lat, stop_lon in stops.values():
+                lat.append(stop_lat)
+                lon.append(stop_lon)
+                count.append(n)
+                total.append(delay_sum)
+    return np.array(lat, dtype=float), np.array(lon, dtype=float), np.array(total), np.array(count, dtype=float)
+
+
+def build_from_points(path, lat_col, lon_col, delay_col, chunk_size=1_000_000, **grid):
+    """Heatmap of a CSV of raw observations, read chunk by chunk as NumPy columns"""
+    builder = HeatmapBuilder(**grid)
+    for chunk in pd.read_csv(path, usecols=[lat_col, lon_col, delay_col], chunksize=chunk_size):
+        builder.add(chunk[lat_col].to_numpy(), chunk[lon_col].to_numpy(), chunk[delay_col].to_numpy())
+    return builder.build(source={'points_csv': os.path.abspath(path)})
+
+
+def build_from_routes(cities=('hyderabad', 'karnataka'), **grid):
+    """Heatmap of the training data's route delays laid over the GTFS stops"""
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.delay_stats import DATA_PATH, STATS_PATH, StatsStore
+    from utils.gtfs_loader import GTFSLoader
+
+    groups = StatsStore(DATA_PATH, STATS_PATH).get().query(group_by=['route'])['groups']
+    route_totals = {g['route_id']: (g['count'], g['avg_delay'] * g['count']) for g in groups}
+    loader = GTFSLoader(os.path.dirname(os.path.abspath(__file__)))
+    lat, lon, total, count = route_stop_points(loader, cities, route_totals)
+    builder = HeatmapBuilder(**grid)
+    builder.add(lat, lon, total, count)
+    return builder.build(source={'training_csv': DATA_PATH, 'cities': list(cities), 'routes': len(route_totals)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the multi-zoom delay heatmap artifact")
+    parser.add_argument('--points', help='CSV of raw observations with coordinates (default: training data over GTFS stops)')
+    parser.add_argument('--lat-col', default='lat')
+    parser.add_argument('--lon-col', default='lon')
+    parser.add_argument('--delay-col', default='delay_minutes')
+    parser.add_argument('--min-zoom', type=int, default=5)
+    parser.add_argument('--max-zoom', type=int, default=15)
+    parser.add_argument('--cells-per-tile', type=int, default=64)
+    parser.add_argument('--max-cells', type=int, default=100_000, help='Cell budget per zoom level')
+    parser.add_argument('--output', default=HEATMAP_PATH)
+    args = parser.parse_args()
+
+    grid = dict(min_zoom=args.min_zoom, max_zoom=args.max_zoom, cells_per_tile=args.cells_per_tile,
+                max_cells=args.max_cells)
+    start = time.perf_counter()
+    if args.points:
+        heatmap = build_from_points(args.points, args.lat_col, args.lon_col, args.delay_col, **grid)
+    else:
+        heatmap = build_from_routes(**grid)
+    heatmap.save(args.output)
+    info = heatmap.info()
+    print(f"Heatmap of {info['source']['points']} points built in {time.perf_counter() - start:.2f}s: "
+          f"{sum(info['cells'].values())} cells over zooms {info['min_zoom']}-{info['max_zoom']}, "
+          f"{os.path.getsize(args.output) / 1e3:.0f} KB at {args.output}")
@@ -0,0 +1,257 @@
+"""
+Rolling per-route and per-stop delay aggregates over realtime observations.
+
+RollingAggregates keeps, for every key, the count, sum and maximum of the
+delays observed in each `bucket_seconds` slot of the last `window_minutes`,
+in a ring of columns shared by all keys:
+
+    count[slot, bucket % n_buckets]    (and total, peak)
+    bucket_id[bucket % n_buckets]      which absolute bucket a column holds
+
+When time moves past a column's bucket, that column is zeroed for every key at
+once; a batch of observations is then a handful of vectorised scatter-adds.
+Any window up to window_minutes is a sum over its most recent columns.
+
+Memory is bounded: n_buckets int32 columns (12 bytes per bucket) per key, and
+at most max_keys keys (60 one-minute buckets x 50,000 keys: 36 MB). Observations
+dated more than a bucket in the future (producer clock skew) are dropped rather
+than allowed to push the window forward. When the table is full, keys with nothing left in the window give up their slot;
+observations for new keys are dropped (and counted) if none can be freed.
+
+LiveDelays feeds two of these (keys "city:route" and "city:stop_id") from the
+ObservationStore. Each serving process tails the store's recent partitions, so
+observations ingested through any worker or by utils/realtime.py reach all of
+them within refresh_interval seconds.
+"""
+import threading
+import time
+
+import numpy as np
+
+from utils.observation_store import HOUR, StoreTail
+
+NO_PEAK = np.iinfo(np.int32).min
+
+
+class RollingAggregates:
+    def __init__(self, window_minutes=60, bucket_seconds=60, max_keys=50_000, initial_keys=1024):
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = int(np.ceil(window_minutes * 60 / bucket_seconds))
+        self.max_keys = max_keys
+        self.slots = {}       # key -> row
+        self.slot_keys = []   # row -> key (None when free)
+        capacity = min(initial_keys, max_keys)
+        # Free rows, lowest last (pop() takes it)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.count = np.zeros((capacity, self.n_buckets), dtype=np.int32)
+        # Delays are whole seconds; a bucket's sum stays far below int32 limits
+        self.total = np.zeros((capacity, self.n_buckets), dtype=np.int32)
+        self.peak = np.full((capacity, self.n_buckets), NO_PEAK, dtype=np.int32)
+        self.bucket_id = np.full(self.n_buckets, -1, dtype=np.int64)
+        self.latest = -1
+        self.added = 0
+        self.dropped_late = 0
+        self.dropped_future = 0
+        self.dropped_full = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self.count.nbytes + self.total.nbytes + self.peak.nbytes + self.bucket_id.nbytes
+
+    def _advance(self, bucket):
+        """Move the ring forward to `bucket`, clearing the columns it reuses"""
+        for b in range(max(self.latest + 1, bucket - self.n_buckets + 1), bucket + 1):
+            column = b % self.n_buckets
+            self.count[:, column] = 0
+            self.total[:, column] = 0
+            self.peak[:, column] = NO_PEAK
+            self.bucket_id[column] = b
+        self.latest = bucket
+
+    def _grow(self, pending):
+        """More free rows: double the table up to max_keys, then reclaim idle keys (except rows in `pending`)"""
+        capacity = len(self.count)
+        if capacity < self.max_keys:
+            extra = min(capacity, self.max_keys - capacity)
+            self.count = np.vstack([self.count, np.zeros((extra, self.n_buckets), dtype=np.int32)])
+            self.total = np.vstack([self.total, np.zeros((extra, self.n_buckets), dtype=np.int32)])
+            self.peak = np.vstack([self.peak, np.full((extra, self.n_buckets), NO_PEAK, dtype=np.int32)])
+            self.free.extend(range(capacity + extra - 1, capacity - 1, -1))
+            return
+        # Full: reclaim keys with no observations left in the window
+        idle = np.flatnonzero(self.count.sum(axis=1) == 0)
+        for row in idle[::-1].tolist():
+            key = self.slot_keys[row]
+            if key is not None and row not in pending:
+                del self.slots[key]
+                self.slot_keys[row] = None
+                self.free.append(row)
+
+    def _rows(self, keys):
+        """Row per unique key (allocating new ones), -1 where the table is full"""
+        rows = np.empty(len(keys), dtype=np.int64)
+        allocated = set()  # rows new in this batch: idle until its values are added
+        full = False       # reclaiming found nothing: don't rescan for every remaining key
+        for i, key in enumerate(keys.tolist()):
+            row = self.slots.get(key)
+            if row is None:
+                if not self.free and not full:
+                    self._grow(allocated)
+                    full = not self.free
+                if not self.free:
+                    row = -1
+                else:
+                    row = self.free.pop()
+                    allocated.add(row)
+                    self.slots[key] = row
+                    if row >= len(self.slot_keys):
+                        self.slot_keys.extend([None] * (row + 1 - len(self.slot_keys)))
+                    self.slot_keys[row] = key
+            rows[i] = row
+        return rows
+
+    def add(self, keys, timestamps, values, now=None):
+        """Record integer values (keys: object array, timestamps: epoch seconds) in one vectorised update"""
+        keys = np.asarray(keys, dtype=object)
+        buckets = np.asarray(timestamps, dtype=np.int64) // self.bucket_seconds
+        values = np.asarray(values, dtype=np.int32)
+        future = buckets > int((time.time() if now is None else now) // self.bucket_seconds) + 1
+        if future.any():
+            keys, buckets, values = keys[~future], buckets[~future], values[~future]
+        if not len(keys):
+            with self._lock:
+                self.dropped_future += int(future.sum())
+            return
+        with self._lock:
+            self.dropped_future += int(future.sum())
+            newest = int(buckets.max())
+            if newest > self.latest:
+                self._advance(newest)
+            in_window = buckets > self.latest - self.n_buckets
+            self.dropped_late += int((~in_window).sum())
+            keys, buckets, values = keys[in_window], buckets[in_window], values[in_window]
+
+            unique, inverse = np.unique(keys, return_inverse=True)
+            rows = self._rows(unique)[inverse]
+            known = rows >= 0
+            self.dropped_full += int((~known).sum())
+            rows, columns, values = rows[known], buckets[known] % self.n_buckets, values[known]
+            np.add.at(self.count, (rows, columns), 1)
+            np.add.at(self.total, (rows, columns), values)
+            np.maximum.at(self.peak, (rows, columns), values)
+            self.added += len(rows)
+
+    def query(self, key, windows, now=None):
+        """{window minutes: (count, sum, max)} for one key over the last `windows` minutes, or None if unknown"""
+        now_bucket = int((time.time() if now is None else now) // self.bucket_seconds)
+        with self._lock:
+            row = self.slots.get(key)
+            if row is None:
+                return None
+            # One key's n_buckets values: plain lists beat numpy's per-call overhead here
+            count, total, peak = self.count[row].tolist(), self.total[row].tolist(), self.peak[row].tolist()
+            bucket_id = self.bucket_id.tolist()
+        # Walk back from the current bucket once; windows are nested, so each is a running total
+        ends = {}
+        for minutes in windows:
+            ends.setdefault(min(self.n_buckets, int(np.ceil(minutes * 60 / self.bucket_seconds))), []).append(minutes)
+        result = {}
+        n, s, m = 0, 0, NO_PEAK
+        for age in range(1, max(ends) + 1):
+            b = now_bucket - age + 1
+            column = b % self.n_buckets
+            if bucket_id[column] == b and count[column]:
+                n, s, m = n + count[column], s + total[column], max(m, peak[column])
+            for minutes in ends.get(age, ()):
+                result[minutes] = (n, s, m)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self.slots), 'capacity': len(self.count), 'max_keys': self.max_keys,
+                    'added': self.added, 'dropped_late': self.dropped_late, 'dropped_future': self.dropped_future,
+                    'dropped_full': self.dropped_full, 'bytes': self.nbytes}
+
+
+class LiveDelays:
+    def __init__(self, store, windows=(15, 60), bucket_seconds=60, max_keys=50_000, refresh_interval=1.0):
+        self.store = store
+        self.windows = tuple(sorted(windows))
+        self.routes = RollingAggregates(self.windows[-1], bucket_seconds, max_keys)
+        self.stops = RollingAggregates(self.windows[-1], bucket_seconds, max_keys)
+        self.refresh_interval = refresh_interval
+        self.tail = StoreTail(store)
+        self.segments_read = 0
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add(self, batch, now=None):
+        """Fold a batch of observation columns (see observation_store.COLUMNS) into the aggregates"""
+        city = batch['city'].astype(object) + ':'
+        stop_rows = batch['stop_id'] != ''
+        self.routes.add(city + batch['route'].astype(object), batch['observed_at'], batch['delay_s'], now)
+        self.stops.add((city + batch['stop_id'].astype(object))[stop_rows], batch['observed_at'][stop_rows],
+                       batch['delay_s'][stop_rows], now)
+
+    def refresh(self, now=None):
+        """Read the segments appended to the store's window partitions since the last refresh"""
+        now = time.time() if now is None else now
+        first_hour = int((now - self.windows[-1] * 60) // HOUR)
+        with self._refresh_lock:
+            paths = self.tail.poll(first_hour, int(now // HOUR) + 1)
+            for path in paths:
+                try:
+                    self.add(self.store.read_segment(path), now)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Skipping unreadable observation segment {path}: {e}")
+            self.segments_read += len(paths)
+        return len(paths)
+
+    @staticmethod
+    def summarize(aggregates):
+        if aggregates is None:
+            return None
+        summary = {}
+        for minutes, (count, total, peak) in aggregates.items():
+            summary[f'{minutes}m'] = {
+                'observations': count,
+                'mean_delay_minutes': round(total / count / 60, 2) if count else None,
+                'max_delay_minutes': round(peak / 60, 2) if count else None,
+            }
+        return summary
+
+    def features(self, city, route=None, stop_id=None, now=None):
+        """Live aggregates for a route and/or stop: {'route': {...}, 'stop': {...}}, None if neither has data"""
+        result = {}
+        if route is not None:
+            result['route'] = self.summarize(self.routes.query(f'{city}:{route}', self.windows, now))
+        if stop_id is not None:
+            result['stop'] = self.summarize(self.stops.query(f'{city}:{stop_id}', self.windows, now))
+        if not any(result.values()):
+            return None
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Live delay refresh failed: {e}")
+            self._stop.wait(self.refresh_interval)
+
+    def start(self):
+        """Tail the store on a background thread (refresh_interval <= 0: never)"""
+        if self.refresh_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='live-delays', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {'windows_minutes': list(self.windows), 'segments_read': self.segments_read,
+                'routes': self.routes.stats(), 'stops': self.stops.stats()}
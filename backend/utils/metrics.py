@@ -0,0 +1,173 @@
+"""
+Process-local request metrics, rendered in the Prometheus text format for /metrics.
+
+- http_requests_total / http_request_duration_seconds: per endpoint (the URL
+  rule, so cardinality stays bounded), method and status
+- request_phase_duration_seconds: time inside each phase of a request
+  (gtfs_load, feature_build, model_predict, ors_call, json_serialize), recorded
+  with `with phase('model_predict'):` anywhere on the request's call path; the
+  endpoint label comes from a ContextVar, so it also works under asyncio
+- collectors: callables returning current values (model loads, cache hit
+  counts, ...) sampled at scrape time
+
+Each process keeps its own numbers: behind several gunicorn workers a scrape
+sees the worker that answered it.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; spans sub-millisecond lookups to multi-second upstream timeouts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Endpoint a phase is attributed to; work outside a request (feed preload, model watcher) is 'background'
+current_endpoint = ContextVar('current_endpoint', default='background')
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{format_labels(self.labelnames, key)} {format_value(v)}' for key, v in items]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, key, [("le", format_value(bound))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels(self.labelnames, key, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, key)} {format_value(series[-2])}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, key)} {series[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """
+        collect() -> iterable of (name, kind, help, labels dict, value), read at
+        scrape time; samples sharing a name must share kind and help
+        """
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        families = {}
+        for collect in self.collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                if value is None:
+                    continue
+                family = families.setdefault(name, (kind, help_text, []))
+                family[2].append(f'{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}')
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'Requests served, by endpoint, method and status', ['endpoint', 'method', 'status']))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint and method', ['endpoint', 'method']))
+PHASE_LATENCY = REGISTRY.register(Histogram(
+    'request_phase_duration_seconds', 'Time spent in each phase of a request', ['endpoint', 'phase']))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@contextmanager
+def phase(name):
+    """Time a block as one phase of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_LATENCY.observe(time.perf_counter() - start, endpoint=current_endpoint.get(), phase=name)
+
+
+def observe_request(endpoint, method, status, seconds):
+    REQUESTS.inc(endpoint=endpoint, method=method, status=str(status))
+    REQUEST_LATENCY.observe(seconds, endpoint=endpoint, method=method)
@@ -0,0 +1,113 @@
+"""
+Shareable model bundle written next to delay_predictor.pkl.
+
+    delay_predictor.bundle/
+        meta.json          - format version, the .pkl's (mtime, size), smoke-test expectation,
+                             digests of the route vocabulary/schedule files trained with
+        preprocessor.pkl   - the fitted ColumnTransformer only (small)
+        forest/            - FlatForest .npy arrays, opened with mmap_mode='r'
+
+Serving from the bundle never unpickles the sklearn forest, so the tree nodes
+live in file-backed pages shared by every worker instead of one private copy
+per process. The bundle is only used while its meta matches the .pkl on disk;
+otherwise the full pickle is loaded.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+
+from utils.fast_inference import CompiledPipeline
+from utils.features import build_model_input, build_model_frame
+from utils.flat_forest import FlatForest
+
+BUNDLE_VERSION = 1
+
+# Request used to validate a freshly loaded model before it goes live
+SMOKE_INPUT = {
+    'route_id': '', 'day_of_week': 'Monday', 'time_of_day': '08:30', 'weather_condition': 'Rain', 'event_type': 'None',
+    'temperature_c': 20, 'precipitation_mm': 5, 'event_attendance': 0, 'traffic_factor': 1.2
+}
+
+
+def bundle_path(model_path):
+    return os.path.splitext(model_path)[0] + '.bundle'
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def file_digest(path):
+    """sha256 of a file's contents, None if it doesn't exist"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def export_bundle(clf, model_file, bundle_dir, dtype=np.float64, max_depth=None, artifacts=None):
+    """
+    Write the bundle for a fitted Pipeline(preprocessor, forest). model_file is the
+    pickle the bundle belongs to (its stat is recorded, so keep its mtime when moving it).
+    dtype=np.float32 / max_depth export a compact forest (see flat_forest.py); the bundle
+    then serves slightly different predictions than the pickle, and records so in meta.json.
+    artifacts ({name: file_digest}) records the vocabulary/schedule files the model was trained with.
+    Returns False if the final estimator can't be flattened.
+    """
+    preprocessor = clf.steps[0][1]
+    try:
+        forest = FlatForest.from_estimator(clf.steps[-1][1], dtype=dtype, max_depth=max_depth)
+    except (AttributeError, ValueError) as e:
+        print(f"Skipping model bundle: {e}")
+        return False
+    exact = np.dtype(dtype) == np.float64 and max_depth is None
+
+    tmp_dir = bundle_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    joblib.dump(preprocessor, os.path.join(tmp_dir, 'preprocessor.pkl'))
+    forest.save(os.path.join(tmp_dir, 'forest'))
+    row = build_model_input(SMOKE_INPUT)
+    meta = {
+        'version': BUNDLE_VERSION,
+        'model_stat': file_stat(model_file),
+        # What the full pipeline (or, for a compact export, the exported forest) predicts
+        # for SMOKE_INPUT; the served bundle must reproduce it
+        'smoke_expected': float(clf.predict(build_model_frame([row]))[0]) if exact
+        else CompiledPipeline(preprocessor, forest=forest).predict_one(row),
+        'dtype': str(np.dtype(dtype)),
+        'max_depth': max_depth,
+        'artifacts': artifacts,
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Swap directories; a reader in the gap finds no bundle and falls back to the pickle
+    old_dir = bundle_dir + '.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(bundle_dir):
+        os.rename(bundle_dir, old_dir)
+    os.rename(tmp_dir, bundle_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"Model bundle saved to {bundle_dir} ({forest.n_trees} trees, {forest.n_nodes} nodes)")
+    return True
+
+
+def load_bundle(bundle_dir, model_path):
+    """Return (preprocessor, FlatForest, meta) if a bundle matching model_path exists, else None"""
+    meta_path = os.path.join(bundle_dir, 'meta.json')
+    if not os.path.exists(meta_path) or not os.path.exists(model_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != BUNDLE_VERSION or meta.get('model_stat') != file_stat(model_path):
+        return None
+    preprocessor = joblib.load(os.path.join(bundle_dir, 'preprocessor.pkl'))
+    forest = FlatForest.load(os.path.join(bundle_dir, 'forest'), mmap_mode='r')
+    return preprocessor, forest, meta
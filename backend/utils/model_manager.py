@@ -0,0 +1,261 @@
+"""
+Background loading and atomic hot-swap of the delay model.
+
+A ModelVersion bundles everything a prediction needs (sklearn pipeline, compiled
+fast path, route vocabulary, schedule feature table). It is never mutated after loading, so a request
+that grabs `manager.active` once sees one consistent model for its whole
+lifetime, even if a new version is swapped in meanwhile.
+
+The manager polls the artifact files, loads a changed model on its own thread,
+validates it with a smoke prediction and only then swaps it in. The previous
+version is kept for rollback.
+
+train.py records in the model (and its bundle) the digests of the route
+vocabulary and schedule files it was trained with, and publishes the pickle
+last. A load that finds other files next to the model (mid-publish, or a
+stray copy) fails and is retried once the files change again, so a model is
+never served with another run's route codes.
+
+When train.py has written a matching delay_predictor.bundle (see model_bundle.py)
+the forest is served from memory-mapped arrays instead of the unpickled sklearn
+model, so gunicorn workers share a single copy of it.
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+from utils.fast_inference import CompiledPipeline, compile_pipeline
+from utils.features import build_model_input, build_model_frame
+from utils.model_bundle import SMOKE_INPUT, bundle_path, file_digest, load_bundle
+from utils.route_vocab import RouteVocab
+from utils.schedule_features import ScheduleFeatures
+
+
+class ModelVersion:
+    def __init__(self, version, pipeline, fast_model, route_vocab, signature, load_seconds, source='pickle',
+                 schedule=None):
+        self.version = version
+        self.source = source
+        self.pipeline = pipeline
+        self.fast_model = fast_model
+        self.route_vocab = route_vocab
+        self.schedule = schedule
+        self.signature = signature
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now().isoformat(timespec='seconds')
+
+    def predict(self, model_inputs):
+        """Predict a list of feature dicts, through the compiled fast path when available"""
+        if self.fast_model is not None:
+            return self.fast_model.predict(model_inputs)
+        return self.pipeline.predict(build_model_frame(model_inputs))
+
+    def info(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 3),
+            'source': self.source,
+            'fast_path': self.fast_model is not None,
+            'schedule_features': self.schedule is not None,
+            'model_type': type(self.pipeline.steps[-1][1]).__name__ if self.pipeline is not None else 'FlatForest',
+        }
+
+
+class ModelManager:
+    def __init__(self, model_path, vocab_path, on_swap=None, poll_interval=5.0, schedule_path=None):
+        self.model_path = model_path
+        self.vocab_path = vocab_path
+        # Written by train.py next to the vocabulary
+        self.schedule_path = schedule_path or os.path.join(os.path.dirname(vocab_path), 'schedule_features.npz')
+        self.on_swap = on_swap
+        self.poll_interval = poll_interval
+        self.active = None
+        self.previous = None
+        self.last_error = None
+        self.loads = 0
+        self.failed_loads = 0
+        self._counter = 0
+        self._pending_signature = None
+        # Files that failed to load; not retried until they change
+        self._failed_signature = None
+        # Files of a version we rolled back from; not reloaded until they change again
+        self._ignored_signature = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def signature(self):
+        sig = []
+        bundle_meta = os.path.join(bundle_path(self.model_path), 'meta.json')
+        for path in (self.model_path, self.vocab_path, self.schedule_path, bundle_meta):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def artifact_digests(self):
+        return {'route_vocab': file_digest(self.vocab_path), 'schedule_features': file_digest(self.schedule_path)}
+
+    @staticmethod
+    def check_artifacts(expected, digests):
+        """Raise unless the vocabulary/schedule files are the ones the model was trained with"""
+        if expected is None:
+            return  # models saved before digests were recorded
+        for name, digest in digests.items():
+            if expected.get(name) != digest:
+                raise ValueError(f"{name} on disk does not belong to this model (training run still publishing?)")
+
+    def load_version(self, signature):
+        """Load and validate a model from disk; raises on any problem"""
+        start = time.perf_counter()
+        digests = self.artifact_digests()
+        if os.path.exists(self.vocab_path):
+            route_vocab = RouteVocab.load(self.vocab_path)
+        else:
+            print(f"Route vocabulary not found at {self.vocab_path}; all routes will be treated as unknown")
+            route_vocab = None
+        if os.path.exists(self.schedule_path):
+            schedule = ScheduleFeatures.load(self.schedule_path)
+        else:
+            print(f"Schedule features not found at {self.schedule_path}; schedule features will be unknown")
+            schedule = None
+        if self.artifact_digests() != digests:
+            raise ValueError('route vocabulary/schedule files changed while loading')
+        row = build_model_input(SMOKE_INPUT)
+
+        version = self.load_from_bundle(signature, route_vocab, schedule, row, start, digests)
+        if version is not None:
+            return version
+
+        pipeline = joblib.load(self.model_path)
+        self.check_artifacts(getattr(pipeline, 'artifact_digests_', None), digests)
+        fast_model = compile_pipeline(pipeline)
+
+        # Smoke prediction: the pipeline must produce a finite number, and the fast path must agree with it
+        expected = float(pipeline.predict(build_model_frame([row]))[0])
+        if not math.isfinite(expected):
+            raise ValueError(f"Smoke prediction is not finite: {expected}")
+        if fast_model is not None and fast_model.predict_one(row) != expected:
+            print("Fast path disagrees with the sklearn pipeline; serving through the pipeline")
+            fast_model = None
+
+        self._counter += 1
+        return ModelVersion(self._counter, pipeline, fast_model, route_vocab, signature, time.perf_counter() - start,
+                            schedule=schedule)
+
+    def load_from_bundle(self, signature, route_vocab, schedule, row, start, digests):
+        """Serve from the memory-mapped bundle if one matches the pickle and passes the smoke test"""
+        try:
+            bundle = load_bundle(bundle_path(self.model_path), self.model_path)
+        except Exception as e:
+            print(f"Model bundle unusable, loading the full pickle: {e}")
+            return None
+        if bundle is None:
+            return None
+        preprocessor, forest, meta = bundle
+        # Mismatched artifacts aren't a bundle problem: fail the load rather than fall back
+        self.check_artifacts(meta.get('artifacts'), digests)
+        try:
+            fast_model = CompiledPipeline(preprocessor, forest=forest)
+            if fast_model.predict_one(row) != meta.get('smoke_expected'):
+                raise ValueError('smoke prediction does not match the exported model')
+        except Exception as e:
+            print(f"Model bundle unusable, loading the full pickle: {e}")
+            return None
+        self._counter += 1
+        return ModelVersion(self._counter, None, fast_model, route_vocab, signature,
+                            time.perf_counter() - start, source='bundle', schedule=schedule)
+
+    def swap(self, version):
+        with self._lock:
+            self.previous = self.active
+            self.active = version
+        if self.on_swap:
+            self.on_swap(version)
+
+    def reload(self, force=False):
+        """
+        Load the artifact if it changed since the active version. Unless forced,
+        a change must be seen on two consecutive polls (so a model that is still
+        being written isn't picked up). Returns True if a new version went live.
+        """
+        if not os.path.exists(self.model_path):
+            return False
+        with self._load_lock:
+            signature = self.signature()
+            active = self.active
+            if not force:
+                if active is not None and signature in (active.signature, self._ignored_signature) \
+                        or signature == self._failed_signature:
+                    self._pending_signature = None
+                    return False
+                if self._pending_signature != signature:
+                    self._pending_signature = signature
+                    if active is not None:
+                        return False
+            try:
+                version = self.load_version(signature)
+            except Exception as e:
+                self.failed_loads += 1
+                self.last_error = str(e)
+                self._failed_signature = signature
+                print(f"Error loading model: {e}")
+                return False
+            self._pending_signature = None
+            self._ignored_signature = None
+            self._failed_signature = None
+            self.loads += 1
+            self.last_error = None
+            self.swap(version)
+        print(f"Model version {version.version} loaded in {version.load_seconds:.2f}s")
+        return True
+
+    def rollback(self):
+        """Swap the previous version back in; returns False if there is none"""
+        with self._lock:
+            if self.previous is None:
+                return False
+            self._ignored_signature = self.active.signature
+            self.active, self.previous = self.previous, self.active
+            active = self.active
+        if self.on_swap:
+            self.on_swap(active)
+        print(f"Rolled back to model version {active.version}")
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.reload()
+            # poll_interval <= 0: load once, don't watch for new versions
+            if self.poll_interval <= 0:
+                break
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Load (and keep polling for) the model on a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='model-manager', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        active, previous = self.active, self.previous
+        return {
+            'active': active.info() if active else None,
+            'previous_version': previous.version if previous else None,
+            'loads': self.loads,
+            'failed_loads': self.failed_loads,
+            'last_error': self.last_error,
+        }
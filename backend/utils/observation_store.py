@@ -0,0 +1,124 @@
+"""
+Append-only, time-partitioned columnar store for realtime delay observations.
+
+    data/realtime/
+        2026-10-18/
+            06/                              one partition per UTC hour of observed_at
+                <time_ns>-<pid>-<n>.npz      one segment per flush, one array per column
+
+Every flush writes new segments (to a temporary name, then renamed), and
+segments are never modified afterwards, so readers only ever see complete
+files and several processes can append at once. Reads and the live aggregates'
+tail (StoreTail) only list the partitions of the hours they ask for.
+
+Columns:
+  observed_at  int64   epoch seconds the delay was observed
+  city         str
+  route        str     GTFS route_short_name (the name the model knows routes by)
+  trip_id      str
+  stop_id      str     '' for trip-level delays
+  delay_s      int32   seconds late (negative: early)
+"""
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = {'observed_at': np.int64, 'city': str, 'route': str, 'trip_id': str, 'stop_id': str, 'delay_s': np.int32}
+HOUR = 3600
+
+
+def as_batch(columns):
+    """Dict of equal-length sequences -> dict of arrays with the store's dtypes"""
+    batch = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+    lengths = {len(values) for values in batch.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+    return batch
+
+
+class ObservationStore:
+    def __init__(self, root):
+        self.root = root
+        self.segments_written = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self._sequence = itertools.count()
+
+    def partition_dir(self, hour):
+        """Directory of the partition holding observations of epoch hour `hour` (UTC)"""
+        return os.path.join(self.root, time.strftime('%Y-%m-%d/%H', time.gmtime(hour * HOUR)))
+
+    def append(self, columns):
+        """Write a batch (dict of column sequences) as one new segment per hour it spans; returns the paths"""
+        batch = as_batch(columns)
+        n_rows = len(batch['observed_at'])
+        if not n_rows:
+            return []
+        hours = batch['observed_at'] // HOUR
+        unique_hours = np.unique(hours)
+        # Every partition is resolved before anything is written: a timestamp that can't
+        # be placed fails the whole batch instead of leaving some of it stored
+        folders = [self.partition_dir(int(hour)) for hour in unique_hours]
+        paths = []
+        for hour, folder in zip(unique_hours, folders):
+            rows = slice(None) if len(unique_hours) == 1 else np.flatnonzero(hours == hour)
+            os.makedirs(folder, exist_ok=True)
+            name = f"{time.time_ns()}-{os.getpid()}-{next(self._sequence)}.npz"
+            tmp_path = os.path.join(folder, f".{name}.tmp")
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **{column: values[rows] for column, values in batch.items()})
+            path = os.path.join(folder, name)
+            os.replace(tmp_path, path)
+            self.segments_written += 1
+            self.bytes_written += os.path.getsize(path)
+            paths.append(path)
+        self.rows_written += n_rows
+        return paths
+
+    def segments(self, hour):
+        """Complete segments of one partition, oldest first"""
+        try:
+            names = os.listdir(self.partition_dir(hour))
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.partition_dir(hour), n) for n in names if n.endswith('.npz') and n[0] != '.')
+
+    @staticmethod
+    def read_segment(path):
+        with np.load(path) as data:
+            return {column: data[column] for column in COLUMNS}
+
+    def read(self, start, end=None):
+        """Observations with start <= observed_at < end (epoch seconds; end defaults to now) as a DataFrame"""
+        end = time.time() if end is None else end
+        parts = [self.read_segment(path)
+                 for hour in range(int(start // HOUR), int(end // HOUR) + 1)
+                 for path in self.segments(hour)]
+        if not parts:
+            return pd.DataFrame({column: np.array([], dtype=dtype) for column, dtype in COLUMNS.items()})
+        frame = pd.DataFrame({column: np.concatenate([p[column] for p in parts]) for column in COLUMNS})
+        return frame[(frame['observed_at'] >= start) & (frame['observed_at'] < end)].reset_index(drop=True)
+
+
+class StoreTail:
+    """Segments appended to a store (by any process) since the last poll"""
+
+    def __init__(self, store):
+        self.store = store
+        self.seen = {}  # hour -> names already returned
+
+    def poll(self, first_hour, last_hour):
+        """New segment paths in the partitions first_hour..last_hour; forgets older partitions"""
+        new = []
+        for hour in range(first_hour, last_hour + 1):
+            seen = self.seen.setdefault(hour, set())
+            for path in self.store.segments(hour):
+                if path not in seen:
+                    seen.add(path)
+                    new.append(path)
+        for hour in [h for h in self.seen if h < first_hour]:
+            del self.seen[hour]
+        return new
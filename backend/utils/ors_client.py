@@ -0,0 +1,403 @@
+"""
+OpenRouteService directions client used by /api/route-info.
+
+- ORSClient: one pooled requests.Session (keep-alive, no per-call TLS handshake)
+- LRU + TTL cache of the decoded response, keyed on coordinates rounded to
+  `precision` decimals (~11 m at 4), optionally persisted to a JSON file
+- Concurrent identical calls share one upstream request
+- Token-bucket rate limiting to stay inside the free tier's quota
+- On timeout / network error / rate limit an expired cache entry is served (marked stale)
+  rather than failing; with nothing cached an ORSError is raised
+
+AsyncORSClient does the same on an event loop with httpx (used by asgi_app.py);
+both share BaseORSClient, which has everything but the transport.
+base_url can point at a local stub (see benchmarks/ors_stub.py) for testing.
+"""
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from polyline import decode
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import phase
+
+DEFAULT_BASE_URL = 'https://api.openrouteservice.org'
+
+# Sent with every directions request
+ALTERNATIVE_ROUTES = {
+    'share_factor': 0.6,
+    'target_count': 3,
+    'weight_factor': 1.4
+}
+# Note: Traffic consideration removed due to free tier limitations
+# 'options': {'profile_params': {'weightings': {'traffic': True}}}  # Requires premium plan
+
+
+class ORSError(Exception):
+    """Upstream failure; status is the HTTP status the API should answer with"""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `capacity` banked for bursts"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token if one is available (returns 0), else return the seconds until one will be"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, max_wait=0.0):
+        """Take a token, waiting up to max_wait seconds; returns False if none became available"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.take()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, max_wait=0.0):
+        """acquire() for the event loop"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.take()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+class _Call:
+    """An upstream request in flight, shared by every caller asking for the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BaseORSClient:
+    """
+    Cache, rate limit, stale fallback and response parsing shared by ORSClient
+    and AsyncORSClient; the subclasses add the transport.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, profile='driving-car', timeout=(3.0, 8.0),
+                 cache_size=1000, cache_ttl=3600.0, precision=4, cache_path=None,
+                 rate_per_minute=40, burst=10, max_wait=2.0, persist_interval=60.0):
+        self.api_key = api_key
+        self.url = f"{base_url.rstrip('/')}/v2/directions/{profile}"
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.precision = precision
+        self.cache_path = cache_path
+        self.persist_interval = persist_interval
+        self._last_save = time.monotonic()
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst) if rate_per_minute > 0 else None
+
+        # key -> (result, expires_at); wall-clock expiry so it survives a restart via the disk file
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.collapsed = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.rate_limited = 0
+
+        if cache_path:
+            self.load_cache()
+
+    def key(self, start_lat, start_lon, end_lat, end_lon):
+        p = self.precision
+        return (round(start_lat, p), round(start_lon, p), round(end_lat, p), round(end_lon, p))
+
+    def _lookup(self, key):
+        """(fresh cached result or None, cache entry even if expired)"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[0], entry
+            self.misses += 1
+            return None, entry
+
+    def _degrade(self, error, entry):
+        # An expired answer beats an error when ORS is slow, unreachable or rate limiting us
+        if error.status in (429, 502, 504) and entry is not None:
+            with self._lock:
+                self.stale_served += 1
+            return dict(entry[0], stale=True)
+        raise error
+
+    @staticmethod
+    def request_body(key):
+        start_lat, start_lon, end_lat, end_lon = key
+        return {
+            'coordinates': [[start_lon, start_lat], [end_lon, end_lat]],
+            'alternative_routes': ALTERNATIVE_ROUTES
+        }
+
+    def _refuse(self):
+        with self._lock:
+            self.rate_limited += 1
+        raise ORSError('Route service rate limit reached, retry shortly', 429)
+
+    def _handle_response(self, status_code, read_json):
+        if status_code == 429:
+            self._count_error()
+            raise ORSError('OpenRouteService rate limit reached, retry shortly', 429)
+        if status_code != 200:
+            self._count_error()
+            raise ORSError(f'OpenRouteService API error: {status_code}', 500)
+        return self.parse(read_json())
+
+    def _as_ors_error(self, error):
+        """ORSError for anything a fetch raised (a 200 that fails to parse becomes a 502)"""
+        if isinstance(error, ORSError):
+            return error
+        self._count_error()
+        return ORSError(f'Malformed OpenRouteService response: {error!r}', 502)
+
+    def _count_error(self):
+        with self._lock:
+            self.upstream_errors += 1
+
+    @staticmethod
+    def parse(data):
+        """ORS JSON response -> the /api/route-info payload (polylines decoded once, here)"""
+        routes_list = []
+        for idx, route in enumerate(data.get('routes') or []):
+            segments = route['segments'][0]
+            routes_list.append({
+                'id': idx,
+                'distance': round(segments['distance'] / 1000, 2),
+                'duration': round(segments['duration'] / 60, 1),
+                'coordinates': decode(route['geometry'])
+            })
+        return {'routes': routes_list, 'selectedRoute': 0}
+
+    def _store(self, key, result):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (result, time.time() + self.cache_ttl)
+            self._cache.move_to_end(key)
+            # Expired entries stay until evicted: they are the fallback for timeouts
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self._dirty = True
+        if self.cache_path and time.monotonic() - self._last_save > self.persist_interval:
+            self.save_cache()
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for key, result, expires in entries[-self.cache_size:] if self.cache_size > 0 else []:
+                self._cache[tuple(key)] = (result, expires)
+        print(f"Loaded {len(self._cache)} cached routes from {self.cache_path}")
+
+    def save_cache(self):
+        """Write the cache to cache_path (atomic rename); no-op if nothing changed"""
+        if not self.cache_path or not self._dirty:
+            return
+        self._last_save = time.monotonic()
+        with self._lock:
+            entries = [[list(key), result, expires] for key, (result, expires) in self._cache.items()]
+            self._dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        # Every worker (and request thread) may save at once: each writes its own temp file
+        tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'cache_size': len(self._cache),
+                'cache_max_size': self.cache_size,
+                'cache_ttl_seconds': self.cache_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'collapsed': self.collapsed,
+                'stale_served': self.stale_served,
+                'upstream_calls': self.upstream_calls,
+                'upstream_errors': self.upstream_errors,
+                'rate_limited': self.rate_limited,
+                'tokens_available': round(self.bucket.tokens, 2) if self.bucket else None,
+            }
+
+
+class ORSClient(BaseORSClient):
+    """Blocking client over one pooled requests.Session; the cache is saved again at exit"""
+
+    def __init__(self, api_key, pool_size=10, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Authorization': api_key, 'Content-Type': 'application/json'})
+        if self.cache_path:
+            atexit.register(self.save_cache)
+
+    def directions(self, start_lat, start_lon, end_lat, end_lon):
+        """
+        Routes between two points: {'routes': [{'id', 'distance' (km), 'duration' (min),
+        'coordinates' [[lat, lon], ...]}], 'selectedRoute': 0}, plus 'stale': True when
+        an expired cache entry had to be served. Raises ORSError.
+        """
+        key = self.key(start_lat, start_lon, end_lat, end_lon)
+        result, entry = self._lookup(key)
+        if result is not None:
+            return result
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = self._fetch(key)
+                self._store(key, call.result)
+            except Exception as e:
+                # Followers must get an error too, never a missing result
+                call.error = self._as_ors_error(e)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                call.done.set()
+
+        if call.error is None:
+            return call.result
+        return self._degrade(call.error, entry)
+
+    def _fetch(self, key):
+        if self.bucket is not None and not self.bucket.acquire(self.max_wait):
+            self._refuse()
+        with self._lock:
+            self.upstream_calls += 1
+        try:
+            with phase('ors_call'):
+                response = self.session.post(self.url, json=self.request_body(key), timeout=self.timeout)
+        except requests.exceptions.Timeout:
+            self._count_error()
+            raise ORSError('Request timeout', 504)
+        except requests.exceptions.RequestException as e:
+            self._count_error()
+            raise ORSError(f'Network error: {str(e)}', 502)
+        return self._handle_response(response.status_code, response.json)
+
+
+class AsyncORSClient(BaseORSClient):
+    """
+    ORSClient for asyncio: the same cache, rate limit and fallbacks, but requests
+    go through an httpx.AsyncClient and waiting never blocks the event loop.
+    Create and use it from a single event loop; whoever owns the loop calls
+    aclose() and save_cache() when it stops.
+    """
+
+    def __init__(self, api_key, pool_size=10, **kwargs):
+        super().__init__(api_key, **kwargs)
+        import httpx
+        connect_timeout, read_timeout = self.timeout
+        self.http = httpx.AsyncClient(
+            headers={'Authorization': api_key, 'Content-Type': 'application/json'},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+        self._pending = {}
+
+    async def directions_async(self, start_lat, start_lon, end_lat, end_lon):
+        """directions() without blocking the event loop"""
+        key = self.key(start_lat, start_lon, end_lat, end_lon)
+        result, entry = self._lookup(key)
+        if result is not None:
+            return result
+
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = asyncio.get_running_loop().create_future()
+            # Marks the exception as retrieved even if no other caller awaits it
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            try:
+                result = await self._fetch_async(key)
+                self._store(key, result)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(self._as_ors_error(e))
+            finally:
+                del self._pending[key]
+                if not future.done():
+                    # Our request was cancelled; don't leave the callers sharing it hanging
+                    future.set_exception(ORSError('Upstream request cancelled', 504))
+        else:
+            with self._lock:
+                self.collapsed += 1
+
+        try:
+            return await asyncio.shield(future)
+        except ORSError as e:
+            return self._degrade(e, entry)
+
+    async def _fetch_async(self, key):
+        import httpx
+        if self.bucket is not None and not await self.bucket.acquire_async(self.max_wait):
+            self._refuse()
+        with self._lock:
+            self.upstream_calls += 1
+        try:
+            with phase('ors_call'):
+                response = await self.http.post(self.url, json=self.request_body(key))
+        except httpx.TimeoutException:
+            self._count_error()
+            raise ORSError('Request timeout', 504)
+        except httpx.HTTPError as e:
+            self._count_error()
+            raise ORSError(f'Network error: {str(e)}', 502)
+        return self._handle_response(response.status_code, response.json)
+
+    async def aclose(self):
+        await self.http.aclose()
@@ -0,0 +1,161 @@
+"""
+Pre-serialized JSON listings for the large, rarely changing GTFS endpoints
+(/api/routes and the city-wide /api/stops).
+
+A Listing is built once per feed version from a DataFrame and keeps:
+  - the full payload in two shapes, each with its ETag and gzip (and brotli,
+    if the `brotli` package is installed) variants compressed ahead of time:
+      records   [{"stop_id": .., "stop_name": ..}, ...]   (what the endpoints always returned)
+      columnar  {"count": n, "stop_id": [..], "stop_name": [..]}   (struct of arrays; no repeated keys)
+  - the JSON text of every row and every column value, so a page
+    (offset/limit) is a byte join over a slice rather than new dicts and a
+    fresh json.dumps
+
+Serving a request is then content negotiation plus an ETag comparison;
+nothing is encoded on the request path except the (on-the-fly gzip of) pages.
+"""
+import gzip
+import hashlib
+import json
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as they are; compression would barely help
+MIN_COMPRESS_SIZE = 1024
+# Pages are compressed per request, so trade ratio for speed
+PAGE_GZIP_LEVEL = 5
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def accepted_encodings(accept_encoding):
+    """Encodings the client accepts (q > 0), from an Accept-Encoding header"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    # Weak comparison: compressed variants share the tag of the body they encode
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+class Payload:
+    """A serialized JSON body with its ETag and pre-compressed variants"""
+
+    def __init__(self, body, precompress=True):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.variants = {}
+        if precompress and len(body) >= MIN_COMPRESS_SIZE:
+            self.variants['gzip'] = gzip.compress(body, 9, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=11)
+
+    def encode(self, accept_encoding):
+        """(bytes, content encoding or None) for a request's Accept-Encoding"""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return self.variants[encoding], encoding
+        if 'gzip' in accepted and not self.variants and len(self.body) >= MIN_COMPRESS_SIZE:
+            return gzip.compress(self.body, PAGE_GZIP_LEVEL, mtime=0), 'gzip'
+        return self.body, None
+
+    def response(self, if_none_match=None, accept_encoding=None, headers=None):
+        """
+        (body bytes, status, headers) answering a GET for this payload:
+        304 with no body when If-None-Match carries its ETag.
+        """
+        headers = dict(headers or {}, ETag=self.etag, Vary='Accept-Encoding')
+        # Cache, but revalidate: a new feed version changes the ETag
+        headers['Cache-Control'] = 'no-cache'
+        if etag_matches(if_none_match, self.etag):
+            return b'', 304, headers
+        body, encoding = self.encode(accept_encoding)
+        headers['Content-Type'] = 'application/json'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return body, 200, headers
+
+
+class Listing:
+    """One table served as JSON: full payloads per format plus per-row text for pages"""
+
+    FORMATS = ('records', 'columnar')
+
+    def __init__(self, columns, values):
+        self.columns = list(columns)
+        self.count = len(values[0]) if values else 0
+        # JSON text of each value, column by column
+        self.cells = {col: [dumps(v) for v in column] for col, column in zip(self.columns, values)}
+        keys = [dumps(col) + b':' for col in self.columns]
+        self.rows = [
+            b'{' + b','.join(key + self.cells[col][i] for key, col in zip(keys, self.columns)) + b'}'
+            for i in range(self.count)
+        ]
+        self.full = {
+            'records': Payload(self.records_body(0, self.count)),
+            'columnar': Payload(self.columnar_body(0, self.count)),
+        }
+
+    @classmethod
+    def from_frame(cls, frame, fill=None):
+        """Listing of a DataFrame; missing values become `fill`"""
+        values = []
+        for col in frame.columns:
+            column = frame[col].to_numpy(dtype=object)
+            missing = frame[col].isna().to_numpy()
+            if missing.any():
+                column = column.copy()
+                column[missing] = fill
+            values.append([v.item() if isinstance(v, np.generic) else v for v in column])
+        return cls(frame.columns, values)
+
+    def records_body(self, start, end):
+        return b'[' + b','.join(self.rows[start:end]) + b']'
+
+    def columnar_body(self, start, end):
+        parts = [b'"count":' + dumps(max(0, min(end, self.count) - start))]
+        parts += [dumps(col) + b':[' + b','.join(self.cells[col][start:end]) + b']' for col in self.columns]
+        return b'{' + b','.join(parts) + b'}'
+
+    def page(self, fmt='records', offset=0, limit=None):
+        """
+        Payload for rows [offset, offset + limit) in `fmt`; the pre-built one
+        when the whole table is asked for. Raises ValueError on an unknown format.
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"format must be {' or '.join(self.FORMATS)}")
+        if offset == 0 and (limit is None or limit >= self.count):
+            return self.full[fmt]
+        end = self.count if limit is None else offset + limit
+        body = self.records_body(offset, end) if fmt == 'records' else self.columnar_body(offset, end)
+        return Payload(body, precompress=False)
+
+    def page_headers(self, offset, limit):
+        """X-Total-Count and, when rows remain, the next offset"""
+        headers = {'X-Total-Count': str(self.count)}
+        if limit is not None and offset + limit < self.count:
+            headers['X-Next-Offset'] = str(offset + limit)
+        return headers
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils.features import FEATURE_COLUMNS
+
+
+def parse_quantize(spec):
+    """'temperature_c=1,traffic_factor=0.05' -> {'temperature_c': 1.0, 'traffic_factor': 0.05}"""
+    steps = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            name, step = part.split('=', 1)
+            if float(step) > 0:
+                steps[name.strip()] = float(step)
+    return steps
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of model outputs keyed on the canonical model_input dict.
+
+    quantize maps continuous features to a bucket width; inputs are snapped to
+    the bucket before both the lookup and the prediction, so a cached value is
+    exactly what the model returns for that bucket.
+
+    Entries belong to a model generation: invalidate() (called on model reload)
+    bumps it and drops everything, and results computed against an older model
+    are not stored.
+    """
+
+    def __init__(self, max_size=10000, ttl=300.0, quantize=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.quantize = quantize or {}
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def canonicalize(self, model_input):
+        """Apply quantisation; returns the (possibly adjusted) input dict"""
+        if not self.quantize:
+            return model_input
+        canonical = dict(model_input)
+        for name, step in self.quantize.items():
+            value = canonical.get(name)
+            if isinstance(value, (int, float)) and value == value:
+                canonical[name] = round(round(value / step) * step, 6)
+        return canonical
+
+    def key(self, model_input, version=None):
+        # The model version is part of the key, so entries never outlive the model that produced them.
+        # NaN (unknown time/schedule features) never equals itself; key it as None
+        values = (model_input.get(c) for c in FEATURE_COLUMNS)
+        return (version,) + tuple(None if v != v else v for v in values)
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation):
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self.generation:
+                # Computed with a model that has since been replaced
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'quantize': self.quantize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'generation': self.generation,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,87 @@
+"""
+Opt-in sampling profiler for slow requests.
+
+While enabled, a daemon thread wakes every `interval_ms`, reads the stack of
+every thread currently serving a request (sys._current_frames) and counts it
+against that request. When a request finishes slower than `threshold_ms`, its
+samples are written as collapsed stacks - one `outer;...;inner count` line per
+distinct stack - which flamegraph.pl, speedscope and inferno read directly:
+
+    flamegraph.pl data/profiles/<file>.folded > slow.svg
+
+Requests under the threshold are dropped without touching disk. Sampling costs
+one stack walk per in-flight request per tick, so it stays off unless
+PROFILE_SLOW_MS is set.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+def collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, interval_ms=5, output_dir='data/profiles'):
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self.active = {}  # thread id -> Counter of collapsed stacks
+        self.written = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_sampler(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sample_loop, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+    def start(self):
+        """Begin sampling the calling thread; pair with finish()"""
+        with self._lock:
+            self._ensure_sampler()
+            self.active[threading.get_ident()] = Counter()
+
+    def finish(self, name, duration_ms):
+        """
+        Stop sampling the calling thread. Returns the path of the stack file
+        if the request was slower than the threshold, else None.
+        """
+        with self._lock:
+            stacks = self.active.pop(threading.get_ident(), None)
+        if not stacks or duration_ms < self.threshold_ms:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_') or 'request'
+        path = os.path.join(self.output_dir,
+                            f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_name}_{int(duration_ms)}ms_{os.getpid()}.folded")
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        self.written += 1
+        print(f"Slow request {name} took {duration_ms:.0f} ms; {sum(stacks.values())} stack samples -> {path}")
+        return path
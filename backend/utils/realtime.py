@@ -0,0 +1,385 @@
+"""
+Streaming ingestion of realtime delay observations.
+
+Sources:
+  - GTFS-Realtime TripUpdates, as protobuf (needs the optional
+    gtfs-realtime-bindings package) or in the protobuf JSON mapping
+  - plain JSON observations: [{"route_id", "trip_id", "stop_id",
+    "delay_seconds" | "delay_minutes", "observed_at", "city"}, ...]
+and they arrive from a file, by polling a feed URL (this module's CLI, or
+benchmarks/gtfs_rt_stub.py locally) or through POST /api/observations.
+
+Observations more than OBSERVED_AT_SLACK_S from now or with a delay beyond
+MAX_DELAY_S either way are rejected, one error message per item.
+
+A TripUpdate yields one observation: the delay at its first StopTimeUpdate that
+carries one (where the vehicle is now) or else the trip-level delay, observed at
+the update's timestamp (or the feed header's). The later StopTimeUpdates are the
+producer's own forecasts and are not recorded.
+
+Routes are stored by GTFS route_short_name, the name the model and the API use;
+GTFS route_ids (or, failing that, trip_ids) are resolved through the city's feed.
+
+The Ingestor buffers accepted rows and appends them to the ObservationStore
+every flush_interval seconds or flush_rows rows; LiveDelays picks them up from
+there. Usage:
+
+    python backend/utils/realtime.py --city hyderabad --file trip_updates.pb
+    python backend/utils/realtime.py --city hyderabad --url http://127.0.0.1:8095/trip_updates --interval 30
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from google.transit import gtfs_realtime_pb2
+except ImportError:
+    gtfs_realtime_pb2 = None
+
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.observation_store import ObservationStore
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                 'data', 'realtime')
+DEFAULT_CITY = 'hyderabad'
+# Raw observation columns, before routes are resolved to names
+RAW_COLUMNS = ['observed_at', 'city', 'route_id', 'trip_id', 'stop_id', 'delay_s']
+MAX_DELAY_S = 24 * 3600
+OBSERVED_AT_SLACK_S = 3 * 24 * 3600
+
+
+def empty_rows():
+    return {column: [] for column in RAW_COLUMNS}
+
+
+def check_observation(observed_at, delay, now):
+    """Raise ValueError unless observed_at (epoch seconds) and delay (seconds) are plausible"""
+    if abs(delay) > MAX_DELAY_S:
+        raise ValueError(f"delay of {delay}s is beyond {MAX_DELAY_S}s")
+    if abs(observed_at - now) > OBSERVED_AT_SLACK_S:
+        raise ValueError(f"observed_at {observed_at} is more than {OBSERVED_AT_SLACK_S // 86400} days from now")
+
+
+def plausible(observed_at, delay, now):
+    """Vectorised check_observation: mask of the rows it would accept"""
+    observed_at, delay = np.asarray(observed_at, dtype=np.float64), np.asarray(delay, dtype=np.float64)
+    return (np.abs(delay) <= MAX_DELAY_S) & (np.abs(observed_at - now) <= OBSERVED_AT_SLACK_S)
+
+
+def append_row(rows, observed_at, city, route_id, trip_id, stop_id, delay):
+    rows['observed_at'].append(observed_at)
+    rows['city'].append(city)
+    rows['route_id'].append(route_id)
+    rows['trip_id'].append(trip_id)
+    rows['stop_id'].append(stop_id)
+    rows['delay_s'].append(delay)
+
+
+def field(message, name):
+    """A field of a JSON-mapped protobuf message, by proto name or its lowerCamelCase JSON name"""
+    value = message.get(name)
+    if value is None:
+        head, *rest = name.split('_')
+        value = message.get(head + ''.join(part.title() for part in rest))
+    return value
+
+
+def trip_updates_from_pb(data, city, now=None):
+    """Observation columns from a serialized GTFS-Realtime FeedMessage; returns (rows, errors)"""
+    if gtfs_realtime_pb2 is None:
+        raise ValueError('Protobuf feeds need the gtfs-realtime-bindings package')
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(data)
+    now = time.time() if now is None else now
+    header_time = feed.header.timestamp or int(now)
+    rows, errors = empty_rows(), []
+    for entity in feed.entity:
+        if not entity.HasField('trip_update'):
+            continue
+        update = entity.trip_update
+        stop_id, delay = '', update.delay if update.HasField('delay') else None
+        for stop_update in update.stop_time_update:
+            event = stop_update.arrival if stop_update.arrival.HasField('delay') else stop_update.departure
+            if event.HasField('delay'):
+                stop_id, delay = stop_update.stop_id, event.delay
+                break
+        if delay is None:
+            continue
+        observed_at = update.timestamp or header_time
+        try:
+            check_observation(observed_at, delay, now)
+        except ValueError as e:
+            errors.append(f"entity {entity.id}: {e}")
+            continue
+        append_row(rows, observed_at, city, update.trip.route_id, update.trip.trip_id, stop_id, delay)
+    return rows, errors
+
+
+def trip_updates_from_json(message, city, now=None):
+    """Observation columns from a GTFS-Realtime FeedMessage in the protobuf JSON mapping; returns (rows, errors)"""
+    now = time.time() if now is None else now
+    header_time = int(field(message.get('header') or {}, 'timestamp') or now)
+    rows, errors = empty_rows(), []
+    for i, entity in enumerate(message.get('entity') or []):
+        try:
+            update = field(entity, 'trip_update')
+            if not update:
+                continue
+            trip = update.get('trip') or {}
+            stop_id, delay = '', update.get('delay')
+            for stop_update in field(update, 'stop_time_update') or []:
+                event = next((e for e in (stop_update.get('arrival'), stop_update.get('departure'))
+                              if e and e.get('delay') is not None), None)
+                if event is not None:
+                    stop_id, delay = field(stop_update, 'stop_id') or '', event['delay']
+                    break
+            if delay is None:
+                continue
+            observed_at, delay = int(update.get('timestamp') or header_time), int(delay)
+            check_observation(observed_at, delay, now)
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append(f"entity {entity.get('id', i) if isinstance(entity, dict) else i}: {e}")
+            continue
+        append_row(rows, observed_at, city, str(field(trip, 'route_id') or ''), str(field(trip, 'trip_id') or ''),
+                   str(stop_id), delay)
+    return rows, errors
+
+
+def parse_observed_at(value, now):
+    if value is None or value == '':
+        return int(now)
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp())
+
+
+def observations_from_json(items, city, now=None):
+    """
+    Observation columns from a list of plain JSON observations. Returns
+    (rows, errors): invalid items are skipped, with one message per item.
+    """
+    now = time.time() if now is None else now
+    rows, errors = empty_rows(), []
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('each observation must be an object')
+            if item.get('delay_seconds') is not None:
+                delay = int(round(float(item['delay_seconds'])))
+            elif item.get('delay_minutes') is not None:
+                delay = int(round(float(item['delay_minutes']) * 60))
+            else:
+                raise ValueError('delay_seconds or delay_minutes is required')
+            if not item.get('route_id') and not item.get('trip_id'):
+                raise ValueError('route_id or trip_id is required')
+            observed_at = parse_observed_at(item.get('observed_at'), now)
+            check_observation(observed_at, delay, now)
+        except (ValueError, TypeError, OverflowError) as e:
+            errors.append(f"observation {i}: {e}")
+            continue
+        append_row(rows, observed_at, str(item.get('city') or city), str(item.get('route_id') or ''),
+                   str(item.get('trip_id') or ''), str(item.get('stop_id') or ''), delay)
+    return rows, errors
+
+
+class RouteNames:
+    """GTFS route_id / trip_id -> route_short_name for a city, rebuilt when its feed is reloaded"""
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def maps(self, city, load=True):
+        """(names, {route_id: name}, {trip_id: route_id}) of the city's feed, None if unknown (or not resident and not load)"""
+        feed = self.loader.get_feed(city) if load else self.loader.feeds.get(city)
+        if feed is None:
+            return None
+        with self._lock:
+            cached = self._maps.get(city)
+            if cached is None or cached[0] is not feed:
+                names = feed.routes['route_short_name'].astype(str)
+                cached = (feed, set(names),
+                          dict(zip(feed.routes['route_id'].astype(str), names)),
+                          dict(zip(feed.trip_id_values.astype(str), feed.trip_route_values.astype(str))))
+                self._maps[city] = cached
+        return cached[1:]
+
+    def name(self, city, route_id):
+        """Route name for what a client sent as route_id (a name already, or a GTFS route_id); never loads a feed"""
+        route_id = str(route_id)
+        maps = self.maps(city, load=False)
+        if maps is None or route_id in maps[0]:
+            return route_id
+        return maps[1].get(route_id, route_id)
+
+    def resolve(self, city, route_ids, trip_ids):
+        """Vectorised route names for one city's observations; trip_ids fill in missing route_ids"""
+        route_ids = pd.Series(route_ids, dtype=object).astype(str)
+        maps = self.maps(city)
+        if maps is None:
+            return route_ids.to_numpy(dtype=str)
+        names, by_route, trip_route = maps
+        missing = (route_ids == '').to_numpy()
+        if missing.any():
+            route_ids[missing] = pd.Series(trip_ids, dtype=object)[missing].astype(str).map(trip_route).fillna('')
+        resolved = route_ids.map(by_route).fillna(route_ids)
+        return np.where(route_ids.isin(names), route_ids, resolved).astype(str)
+
+
+class Ingestor:
+    """Validates observation batches, resolves their routes and appends them to the store in buffered segments"""
+
+    def __init__(self, store, route_names=None, flush_rows=10_000, flush_interval=1.0):
+        self.store = store
+        self.route_names = route_names
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.buffered = 0
+        self.accepted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def ingest(self, rows, rejected=0):
+        """Buffer raw observation columns (see RAW_COLUMNS); returns the number of rows accepted"""
+        frame = pd.DataFrame({column: rows[column] for column in RAW_COLUMNS})
+        keep = ((frame['route_id'].astype(str) != '') | (frame['trip_id'].astype(str) != '')) & \
+            plausible(frame['observed_at'], frame['delay_s'], time.time())
+        rejected += int((~keep).sum())
+        frame = frame[keep]
+        routes = np.empty(len(frame), dtype=object)
+        for city, index in frame.groupby('city', sort=False).indices.items():
+            if self.route_names is not None:
+                routes[index] = self.route_names.resolve(city, frame['route_id'].to_numpy()[index],
+                                                         frame['trip_id'].to_numpy()[index])
+            else:
+                routes[index] = frame['route_id'].to_numpy()[index]
+        batch = {
+            'observed_at': frame['observed_at'].to_numpy(dtype=np.int64),
+            'city': frame['city'].to_numpy(dtype=str),
+            'route': routes.astype(str),
+            'trip_id': frame['trip_id'].to_numpy(dtype=str),
+            'stop_id': frame['stop_id'].to_numpy(dtype=str),
+            'delay_s': frame['delay_s'].to_numpy(dtype=np.int32),
+        }
+        with self._lock:
+            self.buffer.append(batch)
+            self.buffered += len(frame)
+            self.accepted += len(frame)
+            self.rejected += rejected
+            full = self.buffered >= self.flush_rows
+        if full:
+            self.flush()
+        return len(frame)
+
+    def flush(self):
+        """
+        Append everything buffered to the store as new segments; returns the rows
+        written. If the store fails, the rows go back to the front of the buffer
+        for the next flush and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batches, self.buffer, self.buffered = self.buffer, [], 0
+            if not batches:
+                return 0
+            batch = {column: np.concatenate([b[column] for b in batches]) for column in batches[0]}
+            try:
+                self.store.append(batch)
+            except Exception:
+                with self._lock:
+                    self.buffer.insert(0, batch)
+                    self.buffered += len(batch['observed_at'])
+                raise
+            return len(batch['observed_at'])
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Observation flush failed: {e}")
+
+    def start(self):
+        """Flush on a background thread every flush_interval seconds"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='observation-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            buffered = self.buffered
+        return {'accepted': self.accepted, 'rejected': self.rejected, 'buffered': buffered,
+                'segments_written': self.store.segments_written, 'rows_written': self.store.rows_written,
+                'bytes_written': self.store.bytes_written}
+
+
+def parse_feed(data, city, is_json=None):
+    """(rows, errors) from GTFS-Realtime bytes (protobuf, or JSON if is_json or it looks like JSON)"""
+    if is_json is None:
+        is_json = data.lstrip()[:1] in (b'{', b'[')
+    if is_json:
+        return trip_updates_from_json(json.loads(data), city)
+    return trip_updates_from_pb(data, city)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest GTFS-Realtime TripUpdates into the observation store")
+    parser.add_argument('--city', default=DEFAULT_CITY)
+    parser.add_argument('--file', help='A FeedMessage file (.pb, or .json in the protobuf JSON mapping)')
+    parser.add_argument('--url', help='Feed URL to poll')
+    parser.add_argument('--interval', type=float, default=30.0, help='Seconds between polls of --url')
+    parser.add_argument('--store', default=os.environ.get('REALTIME_DIR') or DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+    if not args.file and not args.url:
+        parser.error('pass --file or --url')
+
+    from utils.gtfs_loader import GTFSLoader
+    loader = GTFSLoader(os.path.dirname(os.path.abspath(__file__)))
+    ingestor = Ingestor(ObservationStore(args.store), RouteNames(loader))
+
+    if args.file:
+        with open(args.file, 'rb') as f:
+            rows, errors = parse_feed(f.read(), args.city, args.file.endswith('.json') or None)
+        for error in errors:
+            print(f"Skipped {error}")
+        ingestor.ingest(rows, rejected=len(errors))
+        print(f"Ingested {ingestor.flush()} observations from {args.file} into {args.store}")
+        return
+
+    import requests
+    session = requests.Session()
+    while True:
+        start = time.perf_counter()
+        try:
+            response = session.get(args.url, timeout=10)
+            response.raise_for_status()
+            is_json = 'json' in response.headers.get('Content-Type', '') or None
+            rows, errors = parse_feed(response.content, args.city, is_json)
+            ingestor.ingest(rows, rejected=len(errors))
+            print(f"Ingested {ingestor.flush()} observations ({len(errors)} skipped) in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"Feed poll failed: {e}")
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - start)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Persisted route vocabulary shared by training (model/train.py) and serving (app.py).
+
+Routes are identified by their GTFS route_short_name (what the data generator
+writes and what the frontend sends as route_id). Every known name gets a stable
+integer code; GTFS route_ids are kept as aliases ("city:route_id", and the bare
+route_id when it is unambiguous) so either form encodes to the same code.
+
+The vocabulary is written next to delay_predictor.pkl and must be used
+together with the model it was trained with.
+"""
+import json
+import os
+import threading
+
+import pandas as pd
+
+VOCAB_VERSION = 1
+UNKNOWN_ROUTE = -1
+
+
+class RouteVocab:
+    def __init__(self, tokens, aliases=None):
+        self.tokens = list(tokens)
+        self.index = {token: code for code, token in enumerate(self.tokens)}
+        self.aliases = dict(aliases or {})
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.unknown = 0
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def encode(self, route_id, city=None):
+        """O(1) route -> code; unknown routes map to UNKNOWN_ROUTE and are counted"""
+        route_id = '' if route_id is None else str(route_id)
+        code = self.index.get(route_id)
+        if code is None:
+            alias = self.aliases.get(f"{city}:{route_id}") if city else None
+            if alias is None:
+                alias = self.aliases.get(route_id)
+            code = self.index.get(alias, UNKNOWN_ROUTE) if alias is not None else UNKNOWN_ROUTE
+        with self._lock:
+            self.lookups += 1
+            if code == UNKNOWN_ROUTE:
+                self.unknown += 1
+        return code
+
+    def encode_series(self, route_ids):
+        """Vectorised encode for training data (no alias lookup, no counters)"""
+        return route_ids.astype(str).map(self.index).fillna(UNKNOWN_ROUTE).astype('int64')
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self.tokens), 'lookups': self.lookups, 'unknown': self.unknown}
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': VOCAB_VERSION, 'tokens': self.tokens, 'aliases': self.aliases}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != VOCAB_VERSION:
+            raise ValueError(f"Unsupported route vocabulary version: {data.get('version')}")
+        return cls(data['tokens'], data.get('aliases'))
+
+
+def build_route_vocab(loader, cities, extra_routes=()):
+    """
+    Build a vocabulary from the GTFS feeds' route_short_names plus any extra
+    route names (e.g. the training CSV's route_id column). Codes follow sorted
+    order, so the same inputs always give the same codes.
+    """
+    tokens = set(str(r) for r in extra_routes if not pd.isna(r))
+    city_aliases = {}
+    for city in cities:
+        feed = loader.get_feed(city)
+        if feed is None:
+            continue
+        for route_id, short_name in zip(feed.routes['route_id'], feed.routes['route_short_name']):
+            if pd.isna(short_name):
+                continue
+            tokens.add(str(short_name))
+            city_aliases[f"{city}:{route_id}"] = str(short_name)
+
+    aliases = dict(city_aliases)
+    # Bare route_id aliases only where they are unambiguous across cities and not a name themselves
+    bare = {}
+    for key, token in city_aliases.items():
+        route_id = key.split(':', 1)[1]
+        bare.setdefault(route_id, set()).add(token)
+    for route_id, targets in bare.items():
+        if len(targets) == 1 and route_id not in tokens:
+            aliases[route_id] = next(iter(targets))
+
+    return RouteVocab(sorted(tokens), aliases)
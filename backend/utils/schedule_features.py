@@ -0,0 +1,125 @@
+"""
+Schedule-derived model features, precomputed from the GTFS feeds into one
+lookup array keyed by (route, time bucket of the day).
+
+For every route (GTFS route_short_name, the name the model knows routes by;
+routes sharing a name across feeds are pooled) and every BUCKET_MINUTES slot
+of the day, the table holds:
+  scheduled_headway_min  gap between the scheduled departures on either side of
+                         the slot's midpoint, wrapping around midnight (a route
+                         with one trip a day has a 1440 minute headway)
+  scheduled_stops        number of stops of the last trip departing at or before
+                         the slot's midpoint
+  scheduled_trip_min     scheduled duration of that trip, origin to last stop
+
+Trips are taken from the whole feed, regardless of the day they run on.
+
+The table is built once by model/train.py and written next to the model
+(schedule_features.npz), so serving joins exactly the values the model was
+trained on; a request then costs one dict lookup and one array index.
+Unknown routes and missing times get NaN, which the pipeline's imputer fills.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+SCHEDULE_VERSION = 1
+BUCKET_MINUTES = 30
+N_BUCKETS = 24 * 60 // BUCKET_MINUTES
+DAY_SECONDS = 24 * 3600
+SCHEDULE_COLUMNS = ['scheduled_headway_min', 'scheduled_stops', 'scheduled_trip_min']
+
+
+def feed_trips(feed):
+    """(route name, start secs, stops, duration secs) per timed trip of a loaded GTFSFeed"""
+    schedule = feed.schedule
+    first, last = schedule.offsets[:-1], schedule.offsets[1:] - 1
+    start = np.where(schedule.departure[first] >= 0, schedule.departure[first], schedule.arrival[first])
+    end = np.where(schedule.arrival[last] >= 0, schedule.arrival[last], schedule.departure[last])
+
+    trips_row = feed.schedule_trips_row
+    route_ids = pd.Series(np.where(trips_row >= 0, feed.trip_route_values[np.maximum(trips_row, 0)], None))
+    names = dict(zip(feed.routes['route_id'].astype(str), feed.routes['route_short_name']))
+    route_names = route_ids.map(names)
+
+    timed = (trips_row >= 0) & (start >= 0) & route_names.notna().to_numpy()
+    return (route_names[timed].astype(str).to_numpy(), start[timed] % DAY_SECONDS,
+            np.diff(schedule.offsets)[timed], np.maximum(end - start, 0)[timed])
+
+
+class ScheduleFeatures:
+    def __init__(self, tokens, values):
+        self.tokens = list(tokens)
+        self.index = {token: row for row, token in enumerate(self.tokens)}
+        # (routes + 1, N_BUCKETS, len(SCHEDULE_COLUMNS)); the extra last row is all NaN,
+        # so row -1 (unknown route) needs no special case
+        self.values = values
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @classmethod
+    def from_feeds(cls, feeds):
+        """Build the table from loaded GTFSFeeds (None entries are skipped)"""
+        parts = [feed_trips(feed) for feed in feeds if feed is not None and feed.schedule is not None]
+        names, start, stops, duration = (np.concatenate(cols) for cols in zip(*parts)) if parts else \
+            (np.array([], dtype=object), np.array([], dtype=np.int64), np.array([]), np.array([]))
+        tokens, route = np.unique(names.astype(str), return_inverse=True)
+        n_routes = len(tokens)
+
+        # Trips sorted by (route, start): each route is one contiguous run
+        order = np.lexsort((start, route))
+        route, start, stops, duration = route[order], start[order].astype(np.int64), stops[order], duration[order]
+        key = route.astype(np.int64) * DAY_SECONDS + start
+        counts = np.bincount(route, minlength=n_routes)
+        route_first = np.r_[0, np.cumsum(counts)[:-1]]
+
+        # One query per (route, bucket midpoint)
+        q_route = np.repeat(np.arange(n_routes), N_BUCKETS)
+        q_time = np.tile(np.arange(N_BUCKETS) * BUCKET_MINUTES * 60 + BUCKET_MINUTES * 30, n_routes)
+        pos = np.searchsorted(key, q_route * DAY_SECONDS + q_time, side='right')
+        lo, hi = route_first[q_route], route_first[q_route] + counts[q_route]
+        # Previous/next departure of the same route; wrap around midnight at either end
+        has_prev, has_next = pos > lo, pos < hi
+        prev = np.where(has_prev, pos - 1, hi - 1)
+        nxt = np.where(has_next, pos, lo)
+        headway = (start[nxt] + np.where(has_next, 0, DAY_SECONDS)) - (start[prev] - np.where(has_prev, 0, DAY_SECONDS))
+
+        values = np.full((n_routes + 1, N_BUCKETS, len(SCHEDULE_COLUMNS)), np.nan, dtype=np.float32)
+        if n_routes:
+            values[:-1] = np.stack([headway / 60, stops[prev], duration[prev] / 60], axis=1) \
+                .reshape(n_routes, N_BUCKETS, len(SCHEDULE_COLUMNS))
+        return cls(tokens.tolist(), values)
+
+    def rows(self, route_names):
+        """Vectorised route name -> table row (-1 if unknown)"""
+        return pd.Series(route_names).astype(str).map(self.index).fillna(-1).to_numpy(dtype=np.int64)
+
+    def lookup(self, rows, buckets):
+        """(n, len(SCHEDULE_COLUMNS)) float64 features; NaN where the bucket is NaN or the row -1"""
+        buckets = np.asarray(buckets, dtype=np.float64)
+        known = ~np.isnan(buckets)
+        out = self.values[np.asarray(rows), np.where(known, buckets, 0).astype(np.int64)].astype(np.float64)
+        out[~known] = np.nan
+        return out
+
+    def lookup_one(self, route_name, bucket):
+        """Features of one route name (None: unknown) at one bucket (None: time unknown)"""
+        if bucket is None:
+            return [float('nan')] * len(SCHEDULE_COLUMNS)
+        row = self.index.get(route_name, -1) if route_name is not None else -1
+        return [float(v) for v in self.values[row, bucket]]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, version=SCHEDULE_VERSION, bucket_minutes=BUCKET_MINUTES,
+                 tokens=np.array(self.tokens, dtype=str), values=self.values)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != SCHEDULE_VERSION or int(data['bucket_minutes']) != BUCKET_MINUTES:
+                raise ValueError(f"Unsupported schedule features file: {path}")
+            return cls(data['tokens'].tolist(), data['values'])
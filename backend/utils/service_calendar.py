@@ -0,0 +1,111 @@
+"""
+Service calendar of a GTFS feed: which service_ids run on which dates.
+
+calendar.txt (weekly pattern between start_date and end_date) and
+calendar_dates.txt exceptions (1 = added, 2 = removed) are resolved once into
+a bitmap with one row per day of the feed's date range and one bit per
+service_id (np.packbits, so 4 services take 1 byte a day). Asking which trips
+run on a date is then a row lookup plus a vectorised bit test per trip.
+"""
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def parse_date(value):
+    """'YYYY-MM-DD', 'YYYYMMDD' or a date -> numpy datetime64[D]; raises ValueError"""
+    if isinstance(value, (date, np.datetime64)):
+        return np.datetime64(value, 'D')
+    text = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%Y%m%d'):
+        try:
+            return np.datetime64(datetime.strptime(text, fmt).date(), 'D')
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def gtfs_dates(values):
+    """Column of GTFS YYYYMMDD values -> datetime64[D] array"""
+    text = pd.Series(values).astype('string').str.strip().str.slice(0, 8)
+    return pd.to_datetime(text, format='%Y%m%d').to_numpy().astype('datetime64[D]')
+
+
+class ServiceCalendar:
+    def __init__(self, calendar=None, calendar_dates=None):
+        calendar = calendar if calendar is not None else pd.DataFrame(columns=['service_id'])
+        calendar_dates = calendar_dates if calendar_dates is not None else pd.DataFrame(columns=['service_id', 'date', 'exception_type'])
+
+        service_ids = pd.unique(pd.concat([calendar['service_id'], calendar_dates['service_id']]).astype(str))
+        self.service_ids = np.asarray(service_ids, dtype=object)
+        self.service_index = {s: i for i, s in enumerate(self.service_ids)}
+
+        starts = gtfs_dates(calendar['start_date']) if len(calendar) else np.array([], dtype='datetime64[D]')
+        ends = gtfs_dates(calendar['end_date']) if len(calendar) else np.array([], dtype='datetime64[D]')
+        exception_dates = gtfs_dates(calendar_dates['date']) if len(calendar_dates) else np.array([], dtype='datetime64[D]')
+        all_dates = np.concatenate([starts, ends, exception_dates])
+        if len(all_dates) == 0:
+            self.first_day = np.datetime64('1970-01-01', 'D')
+            self.bitmap = np.zeros((0, 1), dtype=np.uint8)
+            return
+        self.first_day = all_dates.min()
+        n_days = int((all_dates.max() - self.first_day).astype(int)) + 1
+        days = self.first_day + np.arange(n_days)
+
+        active = np.zeros((n_days, len(self.service_ids)), dtype=bool)
+        if len(calendar):
+            # Monday = 0, as in the calendar.txt column order (1970-01-01 was a Thursday)
+            weekday = (days.view('int64') + 3) % 7
+            pattern = calendar[WEEKDAYS].fillna(0).to_numpy().astype(bool)  # services x 7
+            columns = np.array([self.service_index[s] for s in calendar['service_id'].astype(str)])
+            in_range = (days[:, None] >= starts[None, :]) & (days[:, None] <= ends[None, :])
+            active[:, columns] = in_range & pattern[:, weekday].T
+
+        if len(calendar_dates):
+            rows = (exception_dates - self.first_day).astype(int)
+            columns = np.array([self.service_index[s] for s in calendar_dates['service_id'].astype(str)])
+            exception_type = calendar_dates['exception_type'].to_numpy()
+            added = exception_type == 1
+            removed = exception_type == 2
+            active[rows[added], columns[added]] = True
+            active[rows[removed], columns[removed]] = False
+
+        self.bitmap = np.packbits(active, axis=1)
+
+    @property
+    def n_days(self):
+        return self.bitmap.shape[0]
+
+    def day_row(self, day):
+        """Bitmap row of a date, or None if it is outside the feed's calendar"""
+        offset = int((parse_date(day) - self.first_day).astype(int))
+        if 0 <= offset < self.n_days:
+            return self.bitmap[offset]
+        return None
+
+    def active_services(self, day):
+        """Bool array over service_ids: which run on `day`"""
+        row = self.day_row(day)
+        if row is None:
+            return np.zeros(len(self.service_ids), dtype=bool)
+        return np.unpackbits(row, count=len(self.service_ids)).astype(bool)
+
+    def is_active(self, service_indices, day):
+        """
+        Vectorised test of many service indices (e.g. one per trip) against one
+        date; negative indices (unknown service_id) are never active.
+        """
+        service_indices = np.asarray(service_indices)
+        row = self.day_row(day)
+        if row is None:
+            return np.zeros(len(service_indices), dtype=bool)
+        safe = np.maximum(service_indices, 0)
+        bits = (row[safe >> 3] >> (7 - (safe & 7))) & 1
+        return (bits == 1) & (service_indices >= 0)
+
+    def encode(self, service_ids):
+        """service_id values -> int32 indices into service_ids (-1 if not in the calendar)"""
+        return pd.Index(self.service_ids).get_indexer(pd.Series(service_ids).astype(str)).astype(np.int32)
@@ -0,0 +1,81 @@
+"""
+Spatial index over a feed's stops, built once per load.
+
+k-nearest and radius queries use a KD-tree (scipy's cKDTree) over the stops'
+3D unit-sphere coordinates; the straight-line (chord) distance between two
+points on the sphere grows with the great-circle distance, so nearest
+neighbours and radius cut-offs are exact, not a flat-map approximation.
+Bounding boxes use the stops sorted by longitude: a binary search finds the
+longitude band and a vectorised mask keeps the rows inside the latitude band.
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def to_unit_xyz(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_meters(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+
+def meters_to_chord(meters):
+    return 2 * np.sin(min(meters / EARTH_RADIUS_M, np.pi) / 2)
+
+
+class StopIndex:
+    def __init__(self, stops):
+        cols = ['stop_id', 'stop_name', 'stop_lat', 'stop_lon']
+        located = stops[cols].dropna(subset=['stop_lat', 'stop_lon'])
+        self.records = located.fillna('').to_dict('records')
+        self.lat = located['stop_lat'].to_numpy(dtype=np.float64)
+        self.lon = located['stop_lon'].to_numpy(dtype=np.float64)
+        self.tree = cKDTree(to_unit_xyz(self.lat, self.lon)) if len(self.records) else None
+        self.lon_order = np.argsort(self.lon, kind='stable')
+        self.sorted_lon = self.lon[self.lon_order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def bbox(self, min_lon, min_lat, max_lon, max_lat, limit=None):
+        """Indices of stops inside the box, in longitude order"""
+        lo = np.searchsorted(self.sorted_lon, min_lon, side='left')
+        hi = np.searchsorted(self.sorted_lon, max_lon, side='right')
+        candidates = self.lon_order[lo:hi]
+        lat = self.lat[candidates]
+        found = candidates[(lat >= min_lat) & (lat <= max_lat)]
+        return found[:limit] if limit else found
+
+    def nearest(self, lat, lon, k=10, radius_m=None):
+        """(indices, distances in meters) of the k nearest stops, optionally only within radius_m, closest first"""
+        if self.tree is None or k <= 0:
+            return np.array([], dtype=np.int64), np.array([])
+        k = min(k, len(self.records))
+        upper = meters_to_chord(radius_m) if radius_m is not None else np.inf
+        chord, idx = self.tree.query(to_unit_xyz([lat], [lon])[0], k=k, distance_upper_bound=upper)
+        chord, idx = np.atleast_1d(chord), np.atleast_1d(idx)
+        # Missing neighbours (beyond the radius) come back as index == n
+        keep = idx < len(self.records)
+        return idx[keep], chord_to_meters(chord[keep])
+
+    def within(self, lat, lon, radius_m, limit=None):
+        """(indices, distances in meters) of all stops within radius_m, closest first"""
+        if self.tree is None:
+            return np.array([], dtype=np.int64), np.array([])
+        centre = to_unit_xyz([lat], [lon])[0]
+        idx = np.asarray(self.tree.query_ball_point(centre, meters_to_chord(radius_m)), dtype=np.int64)
+        distances = chord_to_meters(np.linalg.norm(self.tree.data[idx] - centre, axis=1)) if len(idx) else np.array([])
+        order = np.argsort(distances, kind='stable')[:limit] if limit else np.argsort(distances, kind='stable')
+        return idx[order], distances[order]
+
+    def take(self, indices, distances=None):
+        """Stop records for query results, with distance_m when given"""
+        if distances is None:
+            return [self.records[i] for i in indices]
+        return [dict(self.records[i], distance_m=round(float(d), 1)) for i, d in zip(indices, distances)]
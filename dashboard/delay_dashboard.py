@@ -1,21 +1,54 @@
-import streamlit as st
+import os
+import sys
+
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+import streamlit as st
+
+# Reads the materialized aggregates (backend/utils/delay_stats.py), not the raw rows
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+from utils.delay_stats import DATA_PATH, STATS_PATH, StatsStore
+
+
+@st.cache_resource
+def stats_store():
+    # One store per Streamlit server; get() folds in rows appended to the CSV since the last check
+    return StatsStore(DATA_PATH, STATS_PATH, refresh_interval=30)
 
-df = pd.read_csv("data/raw/transport_delay_data.csv")
+
+def breakdown(stats, dimension, **filters):
+    groups = stats.query(group_by=[dimension], **filters)['groups']
+    column = {'route': 'route_id', 'day': 'day_of_week', 'hour': 'hour', 'weather': 'weather_condition'}[dimension]
+    return pd.DataFrame(groups).set_index(column) if groups else pd.DataFrame()
+
+
+stats = stats_store().get()
 
 st.title("Public Transport Delay Analytics Dashboard")
+overall = stats.query()
+if not overall['count']:
+    st.warning(f"No delay data found at {DATA_PATH}")
+    st.stop()
 
-st.subheader("Delay Distribution")
-sns.histplot(df['actual_arrival_delay_min'])
-st.pyplot()
+cols = st.columns(3)
+cols[0].metric("Observations", f"{overall['count']:,}")
+cols[1].metric("Average delay (min)", overall['avg_delay'])
+cols[2].metric("Std. deviation (min)", overall['std_delay'])
+
+st.subheader("Delay by Hour of Day")
+st.line_chart(breakdown(stats, 'hour')[['avg_delay', 'max_delay']])
 
 st.subheader("Weather Impact")
-sns.boxplot(x=df['weather_condition'], y=df['actual_arrival_delay_min'])
-st.pyplot()
+weather = breakdown(stats, 'weather')
+st.bar_chart(weather['avg_delay'])
+st.dataframe(weather)
+
+st.subheader("Most Delayed Routes")
+top = stats.query(group_by=['route'], sort='avg_delay', limit=15)['groups']
+st.bar_chart(pd.DataFrame(top).set_index('route_id')['avg_delay'])
 
 st.subheader("Route Delay Comparison")
-route = st.selectbox("Select Route", df['route_id'].unique())
-route_df = df[df['route_id']==route]
-st.line_chart(route_df[['actual_arrival_delay_min']])
+route = st.selectbox("Select Route", stats.values('route'))
+weather_filter = st.multiselect("Weather", stats.values('weather'))
+filters = {'route_id': route, 'weather_condition': weather_filter or None}
+st.line_chart(breakdown(stats, 'hour', **filters)['avg_delay'])
+st.bar_chart(breakdown(stats, 'day', **filters)['avg_delay'])
@@ -1,14 +1,48 @@
+import argparse
+import os
+import sys
+
 import folium
 from folium.plugins import HeatMap
-import pandas as pd
 
-df = pd.read_csv("data/raw/transport_delay_data.csv")
+# Points are pre-binned by backend/utils/heatmap.py; the HTML embeds one point per grid
+# cell of the chosen zoom, so its size doesn't grow with the number of observations
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+from utils.heatmap import HEATMAP_PATH, Heatmap, build_from_points, build_from_routes
+
+parser = argparse.ArgumentParser(description="Render the delay heatmap to HTML")
+parser.add_argument('--points', help='CSV of raw observations with lat/lon (default: reuse or build the artifact)')
+parser.add_argument('--lat-col', default='lat')
+parser.add_argument('--lon-col', default='lon')
+parser.add_argument('--delay-col', default='delay_minutes')
+parser.add_argument('--rebuild', action='store_true', help='Rebuild the artifact even if it exists')
+parser.add_argument('--zoom', type=int, default=12, help='Grid zoom level embedded in the HTML')
+parser.add_argument('--output', default="dashboard/delay_heatmap.html")
+args = parser.parse_args()
 
-m = folium.Map(location=[20.59,78.96], zoom_start=5)
+if args.points:
+    heatmap = build_from_points(args.points, args.lat_col, args.lon_col, args.delay_col)
+    heatmap.save(HEATMAP_PATH)
+elif args.rebuild or not os.path.exists(HEATMAP_PATH):
+    heatmap = build_from_routes()
+    heatmap.save(HEATMAP_PATH)
+else:
+    heatmap = Heatmap.load(HEATMAP_PATH)
 
-heat_data = [[row['lat'],row['lon'],row['actual_arrival_delay_min']] for index,row in df.iterrows()]
+info = heatmap.info()
+zoom = min(max(args.zoom, info['min_zoom']), info['max_zoom'])
+# Heat weight in [0, 1]: the cell's mean delay relative to the worst cell at this zoom
+cells = heatmap.points(zoom)
+top = max((delay for _, _, delay in cells), default=0) or 1
+heat_data = [[lat, lon, delay / top] for lat, lon, delay in cells]
+if info['bounds']:
+    min_lon, min_lat, max_lon, max_lat = info['bounds']
+    center = [(min_lat + max_lat) / 2, (min_lon + max_lon) / 2]
+else:
+    center = [20.59, 78.96]
 
+m = folium.Map(location=center, zoom_start=min(zoom, 11))
 HeatMap(heat_data).add_to(m)
 
-m.save("dashboard/delay_heatmap.html")
-print("Heatmap Generated")
+m.save(args.output)
+print(f"Heatmap Generated: {len(heat_data)} cells at zoom {zoom} -> {args.output}")
@@ -22,9 +22,20 @@ export const predictDelay = async (data) => {
     }
 };
 
-export const getStats = async () => {
+export const predictDelayBatch = async (body) => {
     try {
-        const response = await axios.get(`${API_BASE_URL}/stats`);
+        const response = await axios.post(`${API_BASE_URL}/predict/batch`, body);
+        return response.data;
+    } catch (error) {
+        console.error("Batch prediction failed", error);
+        throw error;
+    }
+};
+
+// params: { route_id, day, hour, weather, group_by, sort, limit }, all optional
+export const getStats = async (params = {}) => {
+    try {
+        const response = await axios.get(`${API_BASE_URL}/stats`, { params });
         return response.data;
     } catch (error) {
         console.error("Stats fetch failed", error);
@@ -42,9 +53,11 @@ export const getRoutes = async (city) => {
     }
 }
 
-export const getTrips = async (city, routeId) => {
+export const getTrips = async (city, routeId, date = null) => {
     try {
-        const response = await axios.get(`${API_BASE_URL}/trips?city=${city}&route_id=${routeId}`);
+        let url = `${API_BASE_URL}/trips?city=${city}&route_id=${routeId}`;
+        if (date) url += `&date=${date}`;
+        const response = await axios.get(url);
         return response.data;
     } catch (error) {
         console.error("Trip fetch failed", error);
@@ -52,11 +65,12 @@ export const getTrips = async (city, routeId) => {
     }
 }
 
-export const getStops = async (city, routeId = null, headsign = null) => {
+export const getStops = async (city, routeId = null, headsign = null, date = null) => {
     try {
         let url = `${API_BASE_URL}/stops?city=${city}`;
         if (routeId) url += `&route_id=${routeId}`;
         if (headsign) url += `&headsign=${headsign}`;
+        if (date) url += `&date=${date}`;
 
         const response = await axios.get(url);
         return response.data;
@@ -66,6 +80,32 @@ export const getStops = async (city, routeId = null, headsign = null) => {
     }
 }
 
+// Stops inside the map viewport; bounds is a Leaflet LatLngBounds
+export const getStopsInBounds = async (city, bounds, limit = 500) => {
+    try {
+        const bbox = [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()]
+            .map(v => v.toFixed(6)).join(',');
+        const response = await axios.get(`${API_BASE_URL}/stops`, { params: { city, bbox, limit } });
+        return response.data;
+    } catch (error) {
+        console.error("Viewport stop fetch failed", error);
+        return [];
+    }
+}
+
+// k nearest stops to a point, optionally within radius meters; each has distance_m
+export const getNearestStops = async (city, lat, lon, k = 5, radius = null) => {
+    try {
+        const params = { city, lat, lon, k };
+        if (radius) params.radius = radius;
+        const response = await axios.get(`${API_BASE_URL}/stops`, { params });
+        return response.data;
+    } catch (error) {
+        console.error("Nearest stop fetch failed", error);
+        return [];
+    }
+}
+
 export const getRouteInfo = async (startLat, startLon, endLat, endLon) => {
     try {
         const response = await axios.get(`${API_BASE_URL}/route-info`, {
@@ -24,6 +24,7 @@ const scenarioData = [
 const Dashboard = () => {
     const [prediction, setPrediction] = useState(null);
     const [mapParams, setMapParams] = useState({ 
+        city: 'hyderabad',
         origin: '', 
         destination: '',
         sourceCoords: null,
@@ -36,6 +37,7 @@ const Dashboard = () => {
     const handlePrediction = (delay, formData) => {
         setPrediction(delay);
         setMapParams({ 
+            city: formData.city,
             origin: formData.source, 
             destination: formData.destination,
             sourceCoords: formData.sourceCoords,
@@ -97,6 +99,7 @@ const Dashboard = () => {
                 <h2>Route Visualization & Traffic</h2>
                 <MapViz 
                     key={mapParams.routeInfo ? `map-${mapParams.routeInfo.routes?.length || 0}-${JSON.stringify(mapParams.routeInfo.routes?.map(r => r.summary?.distance))}` : 'map-empty'}
+                    city={mapParams.city}
                     origin={mapParams.origin} 
                     destination={mapParams.destination}
                     sourceCoords={mapParams.sourceCoords}
@@ -1,7 +1,8 @@
 import React, { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, Marker, Popup, Polyline, useMap } from 'react-leaflet';
+import { MapContainer, TileLayer, Marker, Popup, Polyline, CircleMarker, useMap, useMapEvents } from 'react-leaflet';
 import L from 'leaflet';
 import 'leaflet/dist/leaflet.css';
+import { getStopsInBounds } from '../api';
 
 // Fix for default marker icons in React-Leaflet
 import icon from 'leaflet/dist/images/marker-icon.png';
@@ -32,7 +33,37 @@ const MapBounds = ({ sourceCoords, destCoords }) => {
     return null;
 };
 
-const MapViz = ({ origin, destination, sourceCoords, destCoords, routeInfo, onRouteSelect }) => {
+// Stops are fetched for the visible area only, once zoomed in far enough to be useful
+const MIN_STOPS_ZOOM = 14;
+
+const ViewportStops = ({ city }) => {
+    const [stops, setStops] = useState([]);
+    const map = useMap();
+
+    const refresh = async () => {
+        if (!city || map.getZoom() < MIN_STOPS_ZOOM) {
+            setStops([]);
+            return;
+        }
+        setStops(await getStopsInBounds(city, map.getBounds()));
+    };
+
+    useMapEvents({ moveend: refresh });
+    useEffect(() => { refresh(); }, [city]);
+
+    return stops.map(stop => (
+        <CircleMarker
+            key={stop.stop_id}
+            center={[stop.stop_lat, stop.stop_lon]}
+            radius={4}
+            pathOptions={{ color: '#4b5563', weight: 1, fillOpacity: 0.6 }}
+        >
+            <Popup>{stop.stop_name}</Popup>
+        </CircleMarker>
+    ));
+};
+
+const MapViz = ({ city, origin, destination, sourceCoords, destCoords, routeInfo, onRouteSelect }) => {
     const [selectedRouteIndex, setSelectedRouteIndex] = useState(0);
     
     // Handle route selection with immediate callback
@@ -76,6 +107,8 @@ const MapViz = ({ origin, destination, sourceCoords, destCoords, routeInfo, onRo
                 />
                 
                 <MapBounds sourceCoords={sourceCoords} destCoords={destCoords} />
+
+                <ViewportStops city={city} />
                 
                 {/* Display all route polylines if available */}
                 {routeInfo?.routes && routeInfo.routes.map((route, idx) => {